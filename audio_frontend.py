@@ -0,0 +1,213 @@
+# audio_frontend.py
+#
+# In-memory preparation of recorded speech for Whisper:
+#   - decode (WAV with the standard library, anything else through pydub/ffmpeg)
+#     and resample to 16 kHz mono float32, the rate Whisper works at
+#   - energy-based voice activity detection over 30 ms frames, vectorized with
+#     NumPy: the threshold sits a margin above the recording's own noise floor,
+#     short pauses are bridged and each speech region gets a little padding
+#   - leading/trailing silence is trimmed, and recordings longer than
+#     AUDIO_MAX_SEGMENT_SECONDS are split at pauses into segments
+#   - each segment is encoded in memory (FLAC when soundfile is installed,
+#     otherwise 16-bit WAV) and the segments are transcribed concurrently
+# Nothing is written to disk; a recording with no speech is never uploaded.
+
+import io
+import wave
+import time
+import logging
+import numpy as np
+import config
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+
+# VAD tuning
+frame_ms = 30
+margin_db = 12.0          # speech is this far above the noise floor...
+min_speech_db = -50.0     # ...and at least this loud (dBFS)
+noise_percentile = 10     # frame energy percentile taken as the noise floor
+min_pause_ms = 300        # shorter gaps between speech frames are bridged
+pad_ms = 200              # kept around each speech region so word edges aren't clipped
+min_region_ms = 120       # shorter blips (clicks, bumps) are dropped
+
+
+class PreparedAudio:
+    """
+    Speech segments of one recording, each encoded for upload, and what preparing them did.
+    """
+
+    __slots__ = ("segments", "mime", "bytes_in", "bytes_out", "seconds_in", "seconds_out", "prep_seconds")
+
+    def __init__(self, segments, mime, bytes_in, bytes_out, seconds_in, seconds_out, prep_seconds):
+        self.segments = segments  # list of (file name, encoded bytes)
+        self.mime = mime
+        self.bytes_in = bytes_in
+        self.bytes_out = bytes_out
+        self.seconds_in = seconds_in
+        self.seconds_out = seconds_out
+        self.prep_seconds = prep_seconds
+
+
+def decode(data):
+    """
+    Audio bytes -> (float32 samples in [-1, 1], mono, sample rate).
+    PCM WAV is read directly; other formats (webm, mp3, float WAV) go through pydub/ffmpeg.
+    """
+    try:
+        with wave.open(io.BytesIO(data)) as wav:
+            channels, width, rate = wav.getnchannels(), wav.getsampwidth(), wav.getframerate()
+            frames = wav.readframes(wav.getnframes())
+        if width not in (1, 2, 4):
+            raise wave.Error(f"unsupported sample width {width}")
+    except (wave.Error, EOFError):
+        from pydub import AudioSegment
+        segment = AudioSegment.from_file(io.BytesIO(data))
+        channels, width, rate = segment.channels, segment.sample_width, segment.frame_rate
+        frames = segment.raw_data
+        if width not in (1, 2, 4):
+            segment = segment.set_sample_width(2)
+            width, frames = 2, segment.raw_data
+
+    if width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128) / 128
+    else:
+        dtype = np.int16 if width == 2 else np.int32
+        samples = np.frombuffer(frames, dtype=dtype).astype(np.float32) / np.iinfo(dtype).max
+    if channels > 1:
+        samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels).mean(axis=1)
+    return samples, rate
+
+
+def resample(samples, rate, target=SAMPLE_RATE):
+    """
+    Resample with a windowed-sinc low-pass (when downsampling) and linear interpolation.
+    """
+    if rate == target or not len(samples):
+        return samples.astype(np.float32, copy=False)
+    if rate > target:
+        cutoff = 0.5 * target / rate  # new Nyquist, as a fraction of the old sample rate
+        taps = np.arange(-32, 33)
+        kernel = 2 * cutoff * np.sinc(2 * cutoff * taps) * np.hamming(len(taps))
+        samples = np.convolve(samples, kernel / kernel.sum(), mode="same")
+    positions = np.arange(int(len(samples) * target / rate)) * (rate / target)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def frame_energy_db(samples, frame):
+    count = len(samples) // frame
+    frames = samples[:count * frame].reshape(count, frame)
+    return 10 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+
+
+def speech_regions(samples, rate=SAMPLE_RATE):
+    """
+    (start, end) sample ranges containing speech, in order.
+    """
+    frame = rate * frame_ms // 1000
+    energy = frame_energy_db(samples, frame)
+    if not len(energy):
+        return []
+    threshold = max(np.percentile(energy, noise_percentile) + margin_db, min_speech_db)
+    speech = energy > threshold
+    if not speech.any() and np.max(energy) > min_speech_db:
+        # No quiet stretch to measure a noise floor against: treat everything audible as speech
+        speech = energy > min_speech_db
+
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], speech.astype(np.int8), [0]))))
+    runs = []
+    for start, end in zip(edges[::2], edges[1::2]):
+        # Bridge short pauses, e.g. between words
+        if runs and (start - runs[-1][1]) * frame_ms < min_pause_ms:
+            runs[-1][1] = end
+        else:
+            runs.append([start, end])
+
+    pad = pad_ms // frame_ms
+    regions = []
+    for start, end in runs:
+        if (end - start) * frame_ms < min_region_ms:
+            continue
+        start, end = max(0, start - pad) * frame, min(len(energy), end + pad) * frame
+        if regions and start <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+    return regions
+
+
+def split_segments(samples, regions, max_seconds=None, rate=SAMPLE_RATE):
+    """
+    Group speech regions into segments of at most max_seconds, cutting only at pauses
+    (or, inside a single region longer than that, at its quietest frame).
+    """
+    limit = int((max_seconds or config.AUDIO_MAX_SEGMENT_SECONDS) * rate)
+    pieces = []
+    for start, end in regions:
+        while end - start > limit:
+            # Cut at the quietest frame of the last third of the allowed window
+            frame = rate * frame_ms // 1000
+            window = samples[start + 2 * limit // 3:start + limit]
+            cut = start + 2 * limit // 3 + int(np.argmin(frame_energy_db(window, frame))) * frame
+            pieces.append((start, cut))
+            start = cut
+        pieces.append((start, end))
+
+    segments = []
+    for start, end in pieces:
+        if segments and end - segments[-1][0] <= limit:
+            segments[-1] = (segments[-1][0], end)
+        else:
+            segments.append((start, end))
+    # Silence between regions inside a segment is kept short: concatenate the regions only
+    return [np.concatenate([samples[s:e] for s, e in pieces if s >= start and e <= end])
+            for start, end in segments]
+
+
+def encode(samples, rate=SAMPLE_RATE, audio_format=None):
+    """
+    Samples -> (bytes, mime, extension). FLAC needs soundfile; otherwise 16-bit PCM WAV.
+    """
+    pcm = (np.clip(samples, -1, 1) * 32767).astype(np.int16)
+    if (audio_format or config.AUDIO_UPLOAD_FORMAT) == "flac":
+        try:
+            import soundfile
+            out = io.BytesIO()
+            soundfile.write(out, pcm, rate, format="FLAC", subtype="PCM_16")
+            return out.getvalue(), "audio/flac", "flac"
+        except ImportError:
+            pass
+    out = io.BytesIO()
+    with wave.open(out, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(pcm.tobytes())
+    return out.getvalue(), "audio/wav", "wav"
+
+
+def prepare(data, max_seconds=None, audio_format=None):
+    """
+    Raw recording bytes -> PreparedAudio with one encoded upload per speech segment.
+    """
+    start = time.perf_counter()
+    samples, rate = decode(data)
+    samples = resample(samples, rate)
+    segments = split_segments(samples, speech_regions(samples), max_seconds)
+    encoded = [encode(segment, audio_format=audio_format) for segment in segments]
+    mime = encoded[0][1] if encoded else None
+    uploads = [(f"segment{i}.{ext}", payload) for i, (payload, _, ext) in enumerate(encoded)]
+    prepared = PreparedAudio(uploads, mime, len(data), sum(len(payload) for _, payload in uploads),
+                             len(samples) / SAMPLE_RATE, sum(len(s) for s in segments) / SAMPLE_RATE,
+                             time.perf_counter() - start)
+    logger.info(f"🎚 Audio {prepared.seconds_in:.1f}s / {prepared.bytes_in / 1024:.0f} KB -> {len(uploads)} "
+                f"segment(s), {prepared.seconds_out:.1f}s / {prepared.bytes_out / 1024:.0f} KB {mime or ''} "
+                f"in {prepared.prep_seconds * 1000:.0f} ms")
+    return prepared
+
+
+def prepare_file(path, **kwargs):
+    with open(path, "rb") as f:
+        return prepare(f.read(), **kwargs)
+
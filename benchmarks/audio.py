@@ -0,0 +1,123 @@
+# benchmarks/audio.py
+#
+# The audio front-end (audio_frontend.py) on synthetic recordings: speech-like
+# voiced bursts grouped into utterances, with pauses, leading/trailing silence
+# and background noise, at 48 kHz stereo like a browser microphone capture.
+# For each recording length it reports
+#   - bytes uploaded and seconds of audio sent, raw file vs front-end
+#   - preparation time, and how much of the true speech the VAD kept
+#   - transcription latency against the mock Groq server, whose latency grows
+#     with the upload size: the raw file in one request vs the segments concurrently
+#
+#   python -m benchmarks.audio --lengths 10 60 300
+
+import io
+import os
+import time
+import wave
+import asyncio
+import argparse
+import tempfile
+import numpy as np
+import config
+import audio_frontend
+from benchmarks.mock_groq_server import start_server
+
+RECORDING_RATE = 48000
+
+
+def synthetic_recording(seconds, seed=0, rate=RECORDING_RATE):
+    """
+    WAV bytes of a stereo recording and the (start, end) seconds where speech was placed.
+    """
+    rng = np.random.default_rng(seed)
+    total = int(seconds * rate)
+    signal = rng.normal(scale=10 ** (-60 / 20), size=total)  # -60 dBFS background noise
+    speech = []
+    t = 1.5  # leading silence
+    while t < seconds - 2.0:
+        utterance_start = t
+        for _ in range(rng.integers(3, 12)):
+            length = rng.uniform(0.15, 0.35)
+            if t + length > seconds - 2.0:
+                break
+            n = np.arange(int(length * rate))
+            f0 = rng.uniform(100, 220)
+            voiced = sum(np.sin(2 * np.pi * f0 * h * n / rate) / h for h in range(1, 8))
+            envelope = np.sin(np.pi * n / len(n)) * rng.uniform(0.1, 0.4)
+            start = int(t * rate)
+            signal[start:start + len(n)] += voiced * envelope
+            t += length + rng.uniform(0.03, 0.2)  # gaps between syllables
+        speech.append((utterance_start, t))
+        t += rng.uniform(1.0, 3.0)  # pause between utterances
+
+    pcm = (np.clip(signal, -1, 1) * 32767).astype(np.int16)
+    out = io.BytesIO()
+    with wave.open(out, "wb") as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(np.repeat(pcm, 2).tobytes())
+    return out.getvalue(), speech
+
+
+def speech_kept(truth, data):
+    """
+    Fraction of the true speech time covered by the VAD's regions.
+    """
+    samples, rate = audio_frontend.decode(data)
+    samples = audio_frontend.resample(samples, rate)
+    regions = [(s / audio_frontend.SAMPLE_RATE, e / audio_frontend.SAMPLE_RATE)
+               for s, e in audio_frontend.speech_regions(samples)]
+    covered = sum(max(0.0, min(e, re) - max(s, rs)) for s, e in truth for rs, re in regions)
+    return covered / sum(e - s for s, e in truth)
+
+
+async def transcribe(manager, uploads):
+    from voice_of_the_patient import _create_transcription
+    start = time.perf_counter()
+    await asyncio.gather(*(manager.acall(_create_transcription, model="whisper-large-v3", file=upload,
+                                         language="en") for upload in uploads))
+    return time.perf_counter() - start
+
+
+async def run(manager, lengths):
+    print(f"\n{'length':>7} {'raw KB':>8} {'sent KB':>8} {'sent s':>7} {'segs':>5} {'prep ms':>8} "
+          f"{'speech kept':>12} {'raw stt s':>10} {'new stt s':>10}")
+    for seconds in lengths:
+        data, truth = synthetic_recording(seconds)
+        prepared = audio_frontend.prepare(data)
+        kept = speech_kept(truth, data)
+        raw_latency = await transcribe(manager, [("recording.wav", data)])
+        new_latency = await transcribe(manager, prepared.segments)
+        print(f"{seconds:>7.0f} {len(data) / 1024:>8.0f} {prepared.bytes_out / 1024:>8.0f} "
+              f"{prepared.seconds_out:>7.1f} {len(prepared.segments):>5} {prepared.prep_seconds * 1000:>8.0f} "
+              f"{kept:>12.1%} {raw_latency:>10.2f} {new_latency:>10.2f}")
+
+    # The whole path through voice_of_the_patient, from a temporary file like Gradio's
+    from voice_of_the_patient import transcribe_with_groq_async
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
+        f.write(synthetic_recording(lengths[0])[0])
+    start = time.perf_counter()
+    text = await transcribe_with_groq_async(f.name)
+    print(f"\ntranscribe_with_groq_async: {time.perf_counter() - start:.2f}s, file removed: "
+          f"{not os.path.exists(f.name)}, text: {text[:60]!r}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the audio front-end on synthetic recordings.")
+    parser.add_argument("--lengths", type=float, nargs="+", default=[10, 60, 300], help="Recording lengths in seconds")
+    parser.add_argument("--latency", type=float, default=0.3, help="Mock transcription latency per request")
+    parser.add_argument("--seconds-per-mb", type=float, default=1.0, help="Mock latency per MB uploaded")
+    args = parser.parse_args()
+
+    server = start_server(latency=args.latency, rpm=0, seconds_per_mb=args.seconds_per_mb)
+    config.GROQ_API_KEY, config.GROQ_BASE_URL = "mock", server.url
+    config.GROQ_REQUESTS_PER_MINUTE = 10000
+    from groq_client import get_client_manager
+    asyncio.run(run(get_client_manager(), args.lengths))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
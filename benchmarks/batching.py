@@ -0,0 +1,95 @@
+# benchmarks/batching.py
+#
+# Load generator for retrieval: N client threads fire retrieve() calls for a fixed
+# duration, once without batching and once per micro-batching window, and report
+# throughput and latency. Uses the configured index (see config.py):
+#
+#   python -m benchmarks.batching --concurrency 16 --duration 10 --windows 0 1 2 5 10
+
+import time
+import random
+import argparse
+import threading
+import numpy as np
+from rag_utils import Retriever, MicroBatcher
+
+SAMPLE_QUERIES = [
+    "headache and fever",
+    "chest pain when breathing",
+    "persistent dry cough for two weeks",
+    "itchy red rash on arms",
+    "stomach pain after eating",
+    "shortness of breath at night",
+    "joint pain and swelling in the knees",
+    "frequent urination and thirst",
+    "dizziness when standing up",
+    "sore throat and swollen glands",
+    "lower back pain radiating to leg",
+    "blurred vision and headaches",
+]
+
+
+def run_load(retrieve, queries, concurrency, duration):
+    latencies = []
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client(seed):
+        rng = random.Random(seed)
+        local = []
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            retrieve(rng.choice(queries))
+            local.append((time.perf_counter() - start) * 1000)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array(latencies)
+    return {
+        "requests": len(latencies),
+        "qps": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure retrieval QPS and latency vs. micro-batching window.")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per configuration")
+    parser.add_argument("--windows", type=float, nargs="+", default=[0, 1, 2, 5, 10],
+                        help="Batching windows in ms; 0 means no batching")
+    args = parser.parse_args()
+
+    retriever = Retriever()
+    print("🔵 Warming up retriever...")
+    retriever.warm_up()
+
+    print(f"\n{'window ms':>10}{'requests':>10}{'QPS':>10}{'p50 ms':>10}{'p99 ms':>10}{'avg batch':>11}")
+    for window in args.windows:
+        batcher = None
+        if window > 0:
+            batcher = MicroBatcher(retriever, window_ms=window)
+            retrieve = batcher.retrieve
+        else:
+            retrieve = retriever.retrieve
+
+        result = run_load(retrieve, SAMPLE_QUERIES, args.concurrency, args.duration)
+        avg_batch = 1.0
+        if batcher is not None:
+            avg_batch = batcher.stats["queries"] / max(1, batcher.stats["batches"])
+            batcher.close()
+        print(f"{window:>10g}{result['requests']:>10}{result['qps']:>10.1f}"
+              f"{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}{avg_batch:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
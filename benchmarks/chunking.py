@@ -0,0 +1,97 @@
+# benchmarks/chunking.py
+#
+# Compares the fixed 700-character chunker with the structured chunker on the
+# same PDFs: chunk count, average chunk length, index + passage store size on
+# disk, build time, and recall@k on a held-out question set (a question counts
+# as answered when one of the top-k passages contains its answer phrase). Also
+# reports recall per 1000 context tokens, i.e. how much of the LLM prompt the
+# retrieved passages cost for the answers they contain.
+#
+#   python -m benchmarks.chunking path/to/encyclopedia.pdf --k 3
+#
+# Questions are JSON lines with "question" and "answer" (default: benchmarks/data/heldout_questions.jsonl).
+
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import config
+import embedding_backend
+import build_rag_database_from_pdf as builder
+from tokens import count_tokens
+from rag_utils import Retriever
+
+DEFAULT_QUESTIONS = os.path.join(os.path.dirname(__file__), "data", "heldout_questions.jsonl")
+
+
+def load_questions(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def folder_size(folder):
+    return sum(os.path.getsize(os.path.join(folder, name)) for name in os.listdir(folder))
+
+
+def contains_answer(passage, answer):
+    return " ".join(answer.lower().split()) in " ".join(passage.lower().split())
+
+
+def evaluate(folder, questions, k):
+    retriever = Retriever(db_folder=folder)
+    found, context_tokens = 0, 0
+    for question in questions:
+        passages = retriever.retrieve_passages_many([question["question"]], k)[0]
+        context_tokens += sum(count_tokens(text) for text, _ in passages)
+        found += any(contains_answer(text, question["answer"]) for text, _ in passages)
+    recall = found / len(questions)
+    return {"recall": recall, "context_tokens": context_tokens / len(questions),
+            "recall_per_1k_tokens": 1000 * recall / max(context_tokens / len(questions), 1)}
+
+
+def run(pdfs, questions, k, embedder, workdir):
+    results = {}
+    for method in builder.CHUNKERS:
+        folder = os.path.join(workdir, method)
+        start = time.perf_counter()
+        faiss_index, passages, manifest, stats = builder.build_index(pdfs, embedder, method=method)
+        builder.save_index(folder, faiss_index, passages, manifest)
+        results[method] = dict(
+            evaluate(folder, questions, k),
+            chunks=stats["chunks"],
+            avg_tokens=stats["chunk_tokens"] / max(stats["chunks"], 1),
+            size_mb=folder_size(folder) / 1e6,
+            build_seconds=time.perf_counter() - start,
+        )
+    return results
+
+
+def print_results(results, k):
+    print(f"\n{'chunker':<11} {'chunks':>8} {'avg tok':>8} {'size MB':>8} {'build s':>8} "
+          f"{'recall@' + str(k):>9} {'ctx tok':>8} {'recall/1k tok':>14}")
+    for method, r in results.items():
+        print(f"{method:<11} {r['chunks']:>8} {r['avg_tokens']:>8.0f} {r['size_mb']:>8.2f} {r['build_seconds']:>8.1f} "
+              f"{r['recall']:>9.2f} {r['context_tokens']:>8.0f} {r['recall_per_1k_tokens']:>14.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare fixed and structured chunking.")
+    parser.add_argument("pdfs", nargs="*", default=config.PDF_PATHS, help="Source PDF files")
+    parser.add_argument("--questions", default=DEFAULT_QUESTIONS, help="JSON lines with question and answer")
+    parser.add_argument("--k", type=int, default=config.TOP_K)
+    args = parser.parse_args()
+
+    questions = load_questions(args.questions)
+    embedder = embedding_backend.load_embedder()
+    workdir = tempfile.mkdtemp(prefix="medibot_chunking_")
+    try:
+        results = run(args.pdfs, questions, args.k, embedder, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print_results(results, args.k)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# benchmarks/groq_load.py
+#
+# Drives GroqClientManager against the local mock server with many concurrent
+# consultations and reports throughput, latency, retries and time spent waiting
+# on the rate limiter. The mock's quota is set tighter than the client's so that
+# 429 handling is exercised as well:
+#
+#   python -m benchmarks.groq_load --requests 40 --concurrency 10 --server-rpm 30 --client-rpm 25
+
+import time
+import asyncio
+import argparse
+import numpy as np
+from groq_client import GroqClientManager
+from benchmarks.mock_groq_server import start_server
+
+MESSAGES = [{"role": "user", "content": "I have a headache and a fever. What should I do?"}]
+
+
+async def _create_completion(client, **kwargs):
+    return await client.chat.completions.create(**kwargs)
+
+
+async def run(manager, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, failures = [], 0
+
+    async def consult():
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await manager.acall(_create_completion, model="mock", messages=MESSAGES, estimated_tokens=150)
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(consult() for _ in range(requests)))
+    return time.perf_counter() - start, np.array(latencies), failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the shared Groq client against a mock server.")
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.2, help="Mock response latency in seconds")
+    parser.add_argument("--server-rpm", type=int, default=30, help="Mock quota before it answers 429")
+    parser.add_argument("--client-rpm", type=int, default=25, help="Client-side request budget")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="Fraction of mock 503 responses")
+    args = parser.parse_args()
+
+    server = start_server(latency=args.latency, rpm=args.server_rpm, error_rate=args.error_rate)
+    manager = GroqClientManager(api_key="mock", base_url=server.url, requests_per_minute=args.client_rpm,
+                                tokens_per_minute=1_000_000)
+    elapsed, latencies, failures = asyncio.run(run(manager, args.requests, args.concurrency))
+    server.shutdown()
+
+    print(f"{len(latencies)}/{args.requests} succeeded in {elapsed:.1f}s ({len(latencies) / elapsed:.2f} req/s)")
+    if len(latencies):
+        print(f"latency p50 {np.percentile(latencies, 50):.2f}s  p95 {np.percentile(latencies, 95):.2f}s")
+    print(f"client: {manager.stats['retries']} retries, {failures} failures, "
+          f"{manager.stats['throttled_seconds']:.1f}s waiting on the rate limiter")
+    print(f"server: {server.counts}")
+
+
+if __name__ == "__main__":
+    main()
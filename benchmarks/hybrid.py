@@ -0,0 +1,97 @@
+# benchmarks/hybrid.py
+#
+# Dense-only vs BM25-only vs hybrid (RRF) retrieval on a built index: hit rate@k
+# on the held-out question set (see benchmarks/chunking.py) and per-query latency
+# with the retrieval caches cleared between queries.
+#
+#   python -m benchmarks.hybrid --folder path/to/db_faiss --k 3
+#
+# --synthetic N instead times BM25 alone on an N-chunk synthetic corpus, to check
+# lexical search stays within a few milliseconds per query at that scale:
+#
+#   python -m benchmarks.hybrid --synthetic 50000
+
+import time
+import random
+import argparse
+import numpy as np
+import config
+import bm25_index
+from rag_utils import Retriever
+from benchmarks.chunking import DEFAULT_QUESTIONS, load_questions, contains_answer
+
+
+def latency_summary(latencies):
+    latencies = np.array(latencies) * 1000
+    return {"p50_ms": float(np.percentile(latencies, 50)), "p99_ms": float(np.percentile(latencies, 99))}
+
+
+def evaluate(retriever, questions, k, search):
+    hits, latencies = 0, []
+    for question in questions:
+        retriever.result_cache.clear()
+        retriever.embedding_cache.clear()
+        start = time.perf_counter()
+        ids = search(question["question"])
+        latencies.append(time.perf_counter() - start)
+        passages = [retriever.lookup_passage(idx) or "" for idx in ids[:k]]
+        hits += any(contains_answer(text, question["answer"]) for text in passages)
+    return dict(latency_summary(latencies), hit_rate=hits / len(questions))
+
+
+def compare(folder, questions, k):
+    dense = Retriever(db_folder=folder, hybrid=False)
+    hybrid = Retriever(db_folder=folder, hybrid=True)
+    dense.warm_up()
+    hybrid.warm_up()
+    if hybrid.bm25 is None:
+        raise SystemExit(f"No BM25 index in {folder}; rebuild it with build_rag_database_from_pdf.py")
+    return {
+        "dense": evaluate(dense, questions, k, lambda q: dense.search_ids([q], [k])[0]),
+        "bm25": evaluate(hybrid, questions, k, lambda q: hybrid.bm25.search(q, k)[0].tolist()),
+        "hybrid": evaluate(hybrid, questions, k, lambda q: hybrid.search_ids([q], [k])[0]),
+    }
+
+
+def synthetic(chunks, queries=500, vocabulary=30000, words_per_chunk=120, seed=0):
+    """
+    BM25 build time and query latency on random Zipf-distributed text.
+    """
+    rng = random.Random(seed)
+    words = [f"term{i}" for i in range(vocabulary)]
+    weights = [1 / (i + 1) for i in range(vocabulary)]
+    passages = {i: " ".join(rng.choices(words, weights=weights, k=words_per_chunk)) for i in range(chunks)}
+    start = time.perf_counter()
+    index = bm25_index.build(passages)
+    build_seconds = time.perf_counter() - start
+    latencies = []
+    for _ in range(queries):
+        query = " ".join(rng.choices(words[:5000], k=rng.randint(2, 8)))
+        start = time.perf_counter()
+        index.search(query, config.HYBRID_CANDIDATES)
+        latencies.append(time.perf_counter() - start)
+    return dict(latency_summary(latencies), build_seconds=build_seconds, postings=len(index.docs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare dense, BM25 and hybrid retrieval.")
+    parser.add_argument("--folder", default=config.DB_FOLDER)
+    parser.add_argument("--questions", default=DEFAULT_QUESTIONS)
+    parser.add_argument("--k", type=int, default=config.TOP_K)
+    parser.add_argument("--synthetic", type=int, default=0, help="Time BM25 alone on N synthetic chunks")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        r = synthetic(args.synthetic)
+        print(f"BM25 on {args.synthetic} chunks ({r['postings']} postings, built in {r['build_seconds']:.1f}s): "
+              f"p50 {r['p50_ms']:.2f} ms, p99 {r['p99_ms']:.2f} ms per query")
+        return
+
+    results = compare(args.folder, load_questions(args.questions), args.k)
+    print(f"\n{'search':<8} {'hit@' + str(args.k):>7} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, r in results.items():
+        print(f"{name:<8} {r['hit_rate']:>7.2f} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
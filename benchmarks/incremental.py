@@ -0,0 +1,209 @@
+# benchmarks/incremental.py
+#
+# Correctness check for updating an index in place (index_factory.remove_ids, used
+# by incremental builds). For each index type, synthetic vectors are added under
+# chunk ids, two batches of ids are removed one after the other, and the run
+# verifies that:
+#   - searching for a kept vector finds its own chunk id, so results still map
+#     back to the right passages
+#   - removed ids are never returned
+#   - ntotal matches the number of kept vectors
+# With PyMuPDF installed it also runs real --incremental builds on generated PDFs:
+# a first build, one that changes a source and one that drops a source, each
+# saved and reloaded, checking after every step that the index, the passage store
+# and the manifest agree and that every passage is found by its own embedding.
+# Texts are embedded with a content hash instead of a model, so no download is needed.
+# Exits with status 1 if any check fails.
+#
+#   python -m benchmarks.incremental --size 5000
+
+import os
+import sys
+import json
+import random
+import hashlib
+import argparse
+import tempfile
+import importlib.util
+import faiss
+import numpy as np
+import index_factory
+import passage_store
+import build_rag_database_from_pdf as builder
+from benchmarks.micro import synthetic_vectors
+
+# Approximate types must still find the vector itself for this share of queries
+min_self_recall = 0.95
+
+
+def check_removal(index_type, vectors, first_id=1000, rounds=2, batch=100, k=10, queries=200, seed=0):
+    """
+    Add vectors under ids first_id.., remove `rounds` batches of ids, and return the failed checks.
+    """
+    errors = []
+    ids = np.arange(first_id, first_id + len(vectors), dtype=np.int64)
+    passages = {int(chunk_id): f"passage {chunk_id}" for chunk_id in ids}
+    train = vectors[:index_factory.train_size] if index_factory.needs_training(index_type) else None
+    index = index_factory.make_index(index_type, vectors.shape[1], train)
+    index.add_with_ids(vectors, ids)
+    # Probe every IVF cell / search wide in HNSW so approximation doesn't hide wrong ids
+    index_factory.set_search_params(index, nprobe=index_factory.nlist, ef_search=256)
+
+    rng = np.random.default_rng(seed)
+    removed = np.empty(0, dtype=np.int64)
+    for _ in range(rounds):
+        batch_ids = rng.choice(np.setdiff1d(ids, removed), size=batch, replace=False)
+        index = index_factory.remove_ids(index, batch_ids, index_type)
+        index_factory.set_search_params(index, nprobe=index_factory.nlist, ef_search=256)
+        for chunk_id in batch_ids:
+            passages.pop(int(chunk_id))
+        removed = np.concatenate([removed, batch_ids])
+
+    if index.ntotal != len(passages):
+        errors.append(f"{index_type}: ntotal {index.ntotal}, expected {len(passages)}")
+
+    kept = np.flatnonzero(~np.isin(ids, removed))
+    rows = rng.choice(kept, size=min(queries, len(kept)), replace=False)
+    _, found = index.search(vectors[rows], k)
+    hits = sum(1 for row, result in zip(rows, found)
+               if any(passages.get(int(chunk_id)) == passages[int(ids[row])] for chunk_id in result))
+    if hits < min_self_recall * len(rows):
+        errors.append(f"{index_type}: only {hits}/{len(rows)} kept vectors found their own passage")
+    returned_removed = np.intersect1d(found[found >= 0], removed)
+    if len(returned_removed):
+        errors.append(f"{index_type}: removed ids returned by search: {returned_removed[:5].tolist()}")
+    unknown = [int(i) for i in found[found >= 0].ravel() if int(i) not in passages]
+    if unknown:
+        errors.append(f"{index_type}: search returned ids without a passage: {unknown[:5]}")
+    return errors
+
+
+class HashEmbedder:
+    """
+    Stands in for the embedding model: a fixed pseudo-random vector per text.
+    """
+
+    def __init__(self, dimension=384):
+        self.dimension = dimension
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def encode(self, texts, **kwargs):
+        seeds = (int(hashlib.sha1(text.encode("utf-8")).hexdigest()[:12], 16) for text in texts)
+        return np.array([np.random.default_rng(seed).normal(size=self.dimension) for seed in seeds],
+                        dtype=np.float32).reshape(len(texts), self.dimension)
+
+
+def write_pdf(path, pages):
+    import fitz
+    doc = fitz.open()
+    for text in pages:
+        page = doc.new_page()
+        page.insert_textbox(page.rect + (36, 36, -36, -36), text, fontsize=8)
+    doc.save(path)
+    doc.close()
+
+
+def synthetic_pages(count, seed):
+    rng = random.Random(seed)
+    words = [f"term{i}" for i in range(2000)]
+
+    def sentence():
+        return " ".join(rng.choices(words, k=rng.randint(6, 14))).capitalize() + "."
+    return [" ".join(sentence() for _ in range(40)) for _ in range(count)]
+
+
+def check_build_state(index_type, folder, embedder, label):
+    """
+    Reload a saved build and return the failed checks.
+    """
+    errors = []
+    index = faiss.read_index(os.path.join(folder, "index.faiss"))
+    index_factory.set_search_params(index, nprobe=index_factory.nlist, ef_search=256)
+    store = passage_store.load_passages(folder)
+    passages = dict(store.items())
+    store.close()
+    with open(os.path.join(folder, builder.manifest_name), encoding="utf-8") as f:
+        manifest = json.load(f)
+    chunk_ids = {entry[1] for info in manifest["sources"].values() for entry in info["chunks"]}
+
+    if not index_factory.supports_ids(index, index_type):
+        errors.append(f"{index_type} {label}: saved index can't be updated by chunk id")
+    if index.ntotal != len(chunk_ids):
+        errors.append(f"{index_type} {label}: ntotal {index.ntotal}, manifest lists {len(chunk_ids)} chunks")
+    if set(passages) != chunk_ids:
+        errors.append(f"{index_type} {label}: passage store and manifest disagree on "
+                      f"{len(set(passages) ^ chunk_ids)} chunk ids")
+    ids = sorted(passages)
+    _, found = index.search(index_factory.normalize(embedder.encode([passages[i] for i in ids])), 10)
+    hits = sum(1 for chunk_id, result in zip(ids, found)
+               if any(passages.get(int(i)) == passages[chunk_id] for i in result))
+    if hits < min_self_recall * len(ids):
+        errors.append(f"{index_type} {label}: only {hits}/{len(ids)} passages found by their own embedding")
+    return errors
+
+
+def check_incremental_build(index_type, pages_per_source=12):
+    """
+    Build three generated PDFs, change one, then drop another, reloading and checking after each build.
+    """
+    embedder = HashEmbedder()
+    errors = []
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = os.path.join(tmp, "db")
+        paths = [os.path.join(tmp, f"source{i}.pdf") for i in range(3)]
+        for i, path in enumerate(paths):
+            write_pdf(path, synthetic_pages(pages_per_source, seed=i))
+
+        def build(sources, label):
+            index, passages, manifest, stats = builder.build_index(
+                sources, embedder, folder=folder, incremental=True, index_type=index_type, workers=1)
+            builder.save_index(folder, index, passages, manifest)
+            errors.extend(check_build_state(index_type, folder, embedder, label))
+            return stats
+
+        build(paths, "first build")
+        # Replace the second half of one source: its stale chunks are removed from the index
+        pages = synthetic_pages(pages_per_source, seed=0)
+        write_pdf(paths[0], pages[:pages_per_source // 2] + synthetic_pages(pages_per_source // 2, seed=10))
+        changed = build(paths, "changed source")
+        if not changed["removed"]:
+            errors.append(f"{index_type} changed source: no chunks were removed")
+        # Drop a source: a second removal from the same index
+        dropped = build(paths[:1] + paths[2:], "dropped source")
+        if not dropped["removed"]:
+            errors.append(f"{index_type} dropped source: no chunks were removed")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that removing vectors keeps search results mapped to their passages.")
+    parser.add_argument("--size", type=int, default=5000, help="Vectors per index")
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--types", nargs="+", default=list(index_factory.INDEX_TYPES), choices=index_factory.INDEX_TYPES)
+    parser.add_argument("--no-build", action="store_true", help="Skip the incremental builds on generated PDFs")
+    args = parser.parse_args()
+
+    vectors = synthetic_vectors(args.size, args.dimension)
+    errors = []
+    for index_type in args.types:
+        failed = check_removal(index_type, vectors)
+        print(f"{index_type:<10} remove_ids      {'FAIL' if failed else 'ok'}")
+        errors.extend(failed)
+
+    if not args.no_build and importlib.util.find_spec("fitz") is None:
+        print("PyMuPDF not installed, skipping the incremental builds")
+        args.no_build = True
+    for index_type in [] if args.no_build else args.types:
+        failed = check_incremental_build(index_type)
+        print(f"{index_type:<10} incremental     {'FAIL' if failed else 'ok'}")
+        errors.extend(failed)
+
+    for error in errors:
+        print(f"FAIL: {error}")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
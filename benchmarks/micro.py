@@ -0,0 +1,244 @@
+# benchmarks/micro.py
+#
+# Micro-benchmarks for the retrieval stack on a synthetic corpus, per corpus
+# size and index type:
+#   build_s            training + adding the vectors to the FAISS index
+#   search_p50/p99_ms  one FAISS search for a pre-encoded query
+#   store_open_ms      opening the passage store (memory-mapped)
+#   store_lookup_ms    looking up top_k passages by id
+#   store_rss_mb       resident memory added by opening the store and doing the lookups
+#                      (mapped file pages count, though the OS shares them between processes)
+#   retrieve_p50/p99_ms  Retriever.retrieve() (what rag_utils.retrieve_context calls), caches cleared
+# and once per run encode_p50/p99_ms, the embedding model encoding one query.
+# The corpus is Zipf-distributed text with clustered unit vectors (so IVF cells
+# mean something); a 1M-chunk corpus needs a few GB of memory.
+#
+# Results are written as JSON, and --baseline compares them against an earlier
+# file: a metric regresses when it grows by more than its threshold (relative;
+# --threshold for all, --metric-threshold name=value to override one) and by more
+# than its noise floor in absolute terms (noise_floors, per metric in its own unit).
+# Exits 1 on any regression.
+#
+#   python -m benchmarks.micro --sizes 1000 10000 100000 --output runs/micro.json
+#   python -m benchmarks.micro --sizes 1000 10000 --baseline runs/micro.json
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import numpy as np
+import config
+import index_factory
+import passage_store
+import embedding_backend
+import build_rag_database_from_pdf as builder
+from rag_utils import Retriever
+from benchmarks.hybrid import latency_summary
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+# Default relative growth that counts as a regression
+threshold = 0.2
+# Smaller absolute differences (in the metric's own unit) are treated as noise
+noise_floors = {
+    "build_s": 0.05,
+    "search_p50_ms": 0.05, "search_p99_ms": 0.1,
+    "store_open_ms": 0.5, "store_lookup_ms": 0.05, "store_rss_mb": 4.0,
+    "retrieve_p50_ms": 1.0, "retrieve_p99_ms": 2.0,
+    "encode_p50_ms": 1.0, "encode_p99_ms": 2.0,
+}
+noise_floor = 0.1  # metrics not listed above
+
+words_per_chunk = 100
+vocabulary = 30000
+clusters = 256
+timed_queries = 200
+
+
+def rss_mb():
+    """
+    Current resident memory of this process in MB, or None if it can't be measured.
+    """
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return None
+
+
+def synthetic_vectors(n, dimension, seed=0, batch=100000):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dimension)).astype(np.float32)
+    vectors = np.empty((n, dimension), dtype=np.float32)
+    for start in range(0, n, batch):
+        end = min(n, start + batch)
+        noise = rng.normal(scale=0.6, size=(end - start, dimension)).astype(np.float32)
+        vectors[start:end] = centers[rng.integers(clusters, size=end - start)] + noise
+    return index_factory.normalize(vectors)
+
+
+def synthetic_passages(n, seed=0):
+    rng = random.Random(seed)
+    words = [f"term{i}" for i in range(vocabulary)]
+    weights = [1 / (i + 1) for i in range(vocabulary)]
+    return [" ".join(rng.choices(words, weights=weights, k=words_per_chunk)) for _ in range(n)]
+
+
+def sample_queries(count, seed=1):
+    rng = random.Random(seed)
+    words = [f"term{i}" for i in range(5000)]
+    return [" ".join(rng.choices(words, k=rng.randint(2, 8))) for _ in range(count)]
+
+
+def bench_encode(embedder, queries):
+    embedder.encode(["warm up"])
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        embedder.encode([query])
+        latencies.append(time.perf_counter() - start)
+    summary = latency_summary(latencies)
+    return {"encode_p50_ms": summary["p50_ms"], "encode_p99_ms": summary["p99_ms"]}
+
+
+def bench_index(index_type, vectors, passages, queries, text_queries, folder, k, retrieve):
+    results = {}
+    ids = np.arange(len(vectors), dtype=np.int64)
+    train = vectors[:index_factory.train_size] if index_factory.needs_training(index_type) else None
+    start = time.perf_counter()
+    index = index_factory.make_index(index_type, vectors.shape[1], train)
+    index.add_with_ids(vectors, ids)
+    results["build_s"] = time.perf_counter() - start
+
+    _, latencies = index_factory.timed_search(index, queries, k)
+    results["search_p50_ms"] = float(np.percentile(latencies, 50))
+    results["search_p99_ms"] = float(np.percentile(latencies, 99))
+
+    builder.save_index(folder, index, passages, builder.new_manifest(index_type))
+    del index
+
+    before = rss_mb()
+    start = time.perf_counter()
+    store = passage_store.PassageStore(folder)
+    results["store_open_ms"] = (time.perf_counter() - start) * 1000
+    rng = np.random.default_rng(0)
+    lookups = []
+    for row in rng.integers(len(passages), size=(len(queries), k)):
+        start = time.perf_counter()
+        [store.get(idx) for idx in row]
+        lookups.append(time.perf_counter() - start)
+    results["store_lookup_ms"] = latency_summary(lookups)["p50_ms"]
+    if before is not None:
+        results["store_rss_mb"] = rss_mb() - before
+    store.close()
+
+    if retrieve:
+        retriever = Retriever(db_folder=folder, reranker=False)
+        retriever.warm_up()
+        latencies = []
+        for query in text_queries:
+            retriever.result_cache.clear()
+            retriever.embedding_cache.clear()
+            start = time.perf_counter()
+            retriever.retrieve(query, k)
+            latencies.append(time.perf_counter() - start)
+        summary = latency_summary(latencies)
+        results["retrieve_p50_ms"], results["retrieve_p99_ms"] = summary["p50_ms"], summary["p99_ms"]
+    return results
+
+
+def run(sizes, index_types, k, with_model=True):
+    embedder = embedding_backend.load_embedder() if with_model else None
+    dimension = embedder.get_sentence_embedding_dimension() if embedder else 384
+    text_queries = sample_queries(timed_queries)
+    results = bench_encode(embedder, text_queries) if embedder else {}
+
+    workdir = tempfile.mkdtemp(prefix="medibot_micro_")
+    try:
+        for size in sizes:
+            print(f"📦 Synthetic corpus: {size} chunks")
+            vectors = synthetic_vectors(size + timed_queries, dimension)
+            queries, vectors = vectors[:timed_queries], vectors[timed_queries:]
+            passages = synthetic_passages(size)
+            for index_type in index_types:
+                folder = os.path.join(workdir, f"{size}_{index_type}")
+                measured = bench_index(index_type, vectors, passages, queries, text_queries, folder, k, with_model)
+                results.update({f"{size}/{index_type}/{metric}": value for metric, value in measured.items()})
+                shutil.rmtree(folder, ignore_errors=True)
+                print(f"   … {index_type}: " + ", ".join(f"{m} {v:.2f}" for m, v in measured.items()))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def compare(results, baseline, default_threshold=None, overrides=None):
+    """
+    Metrics that grew past their threshold, as (name, old, new, limit) tuples.
+    Overrides are keyed by metric name without the size/index prefix, e.g. "search_p99_ms".
+    """
+    default_threshold = threshold if default_threshold is None else default_threshold
+    overrides = overrides or {}
+    regressions = []
+    for name, new in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        metric = name.rsplit("/", 1)[-1]
+        limit = overrides.get(metric, default_threshold)
+        if new > old * (1 + limit) and new - old > noise_floors.get(metric, noise_floor):
+            regressions.append((name, old, new, limit))
+    return regressions
+
+
+def parse_overrides(values):
+    overrides = {}
+    for value in values or ():
+        name, _, limit = value.partition("=")
+        overrides[name] = float(limit)
+    return overrides
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark index build, search, passage store and retrieval.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="Corpus sizes in chunks")
+    parser.add_argument("--types", nargs="+", default=list(index_factory.INDEX_TYPES),
+                        choices=index_factory.INDEX_TYPES)
+    parser.add_argument("--k", type=int, default=config.TOP_K)
+    parser.add_argument("--no-model", action="store_true",
+                        help="Skip query encoding and end-to-end retrieval (no embedding model needed)")
+    parser.add_argument("--output", help="Write the results as JSON")
+    parser.add_argument("--baseline", help="Earlier results JSON to compare against; exit 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=threshold, help="Relative growth that counts as a regression")
+    parser.add_argument("--metric-threshold", nargs="*", metavar="METRIC=VALUE", help="Per-metric thresholds")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.types, args.k, with_model=not args.no_model)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"settings": {"k": args.k, "embedding_backend": config.EMBEDDING_BACKEND,
+                                    "hybrid": config.HYBRID_SEARCH}, "results": results}, f, indent=2)
+    if not args.baseline:
+        return
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.threshold, parse_overrides(args.metric_threshold))
+    for name, old, new, limit in regressions:
+        print(f"❌ Regression: {name} {old:.3f} -> {new:.3f} (allowed +{limit:.0%})")
+    if regressions:
+        sys.exit(1)
+    print(f"✅ No regressions against {args.baseline} ({sum(name in baseline for name in results)} metrics compared)")
+
+
+if __name__ == "__main__":
+    main()
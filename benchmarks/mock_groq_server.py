@@ -0,0 +1,153 @@
+# benchmarks/mock_groq_server.py
+#
+# Local stand-in for the Groq OpenAI-compatible API, for exercising groq_client.py
+# without a key or network. It simulates response latency, a per-minute request
+# quota (429 with Retry-After once exceeded) and a rate of random 5xx errors.
+# --seconds-per-mb adds latency proportional to the request size, the way
+# uploading and transcribing a longer recording takes longer.
+#
+#   python -m benchmarks.mock_groq_server --port 8765 --latency 0.3 --rpm 60
+#   GROQ_BASE_URL=http://127.0.0.1:8765 python gradio_app.py
+
+import json
+import time
+import random
+import argparse
+import threading
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+REPLY = ("With what I see, I think you have a mild viral infection. "
+         "Rest, drink plenty of fluids and see a doctor if the fever lasts more than three days.")
+
+
+class MockGroqServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.2, rpm=60, error_rate=0.0, seconds_per_mb=0.0):
+        super().__init__(address, MockGroqHandler)
+        self.latency = latency
+        self.seconds_per_mb = seconds_per_mb
+        self.rpm = rpm
+        self.error_rate = error_rate
+        self.requests = deque()  # arrival times inside the current 60 s window
+        self.counts = {"ok": 0, "rate_limited": 0, "errors": 0}
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def admit(self):
+        """
+        Return None if the request is within quota, otherwise seconds until a slot frees up.
+        """
+        with self.lock:
+            now = time.monotonic()
+            while self.requests and now - self.requests[0] >= 60:
+                self.requests.popleft()
+            if self.rpm and len(self.requests) >= self.rpm:
+                self.counts["rate_limited"] += 1
+                return 60 - (now - self.requests[0])
+            self.requests.append(now)
+            return None
+
+    def count(self, outcome):
+        with self.lock:
+            self.counts[outcome] += 1
+
+
+class MockGroqHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so connection pooling is visible
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        retry_after = self.server.admit()
+        if retry_after is not None:
+            self.send_json(429, {"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded"}},
+                           {"Retry-After": f"{retry_after:.2f}"})
+            return
+        time.sleep(self.server.latency + self.server.seconds_per_mb * len(body) / 1e6)
+        if random.random() < self.server.error_rate:
+            self.server.count("errors")
+            self.send_json(503, {"error": {"message": "Service unavailable", "type": "internal_error"}})
+            return
+        self.server.count("ok")
+
+        if self.path.endswith("/audio/transcriptions"):
+            self.send_json(200, {"text": "I have had a headache and a fever since yesterday."})
+        elif self.path.endswith("/chat/completions"):
+            request = json.loads(body or b"{}")
+            if request.get("stream"):
+                self.stream_completion(request)
+            else:
+                self.send_json(200, completion(request))
+        else:
+            self.send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def stream_completion(self, request):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for word in REPLY.split(" "):
+            chunk = {"id": "mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": request.get("model", "mock"),
+                     "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+
+def completion(request):
+    return {
+        "id": "mock", "object": "chat.completion", "created": int(time.time()),
+        "model": request.get("model", "mock"),
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": REPLY}}],
+        "usage": {"prompt_tokens": 100, "completion_tokens": 40, "total_tokens": 140},
+    }
+
+
+def start_server(port=0, latency=0.2, rpm=60, error_rate=0.0, seconds_per_mb=0.0):
+    """
+    Start the mock server on a background thread; port 0 picks a free port.
+    """
+    server = MockGroqServer(("127.0.0.1", port), latency, rpm, error_rate, seconds_per_mb)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a mock Groq API on localhost.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds per response")
+    parser.add_argument("--rpm", type=int, default=60, help="Requests per minute before 429s (0 = unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--seconds-per-mb", type=float, default=0.0, help="Extra latency per MB of request body")
+    args = parser.parse_args()
+
+    server = MockGroqServer(("127.0.0.1", args.port), args.latency, args.rpm, args.error_rate, args.seconds_per_mb)
+    print(f"Mock Groq API on {server.url} (set GROQ_BASE_URL to use it)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n{server.counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+# benchmarks/rag_eval.py
+#
+# End-to-end evaluation of the consultation pipeline on a question set. Each
+# question goes through the same steps as gradio_app.py (passage retrieval,
+# token-budgeted prompt assembly, LLM call), several questions at a time, and
+# the run records:
+#   - retrieval recall@k and MRR (a passage is relevant when it contains the answer phrase)
+#   - latency per stage (retrieval, prompt, llm, total) as p50/p95
+#   - prompt size in estimated tokens
+#   - ROUGE-L, BLEU and optionally BERTScore F1 of the reply against the reference
+# The LLM is pluggable: "stub" answers deterministically from the retrieved
+# knowledge in the prompt, so the run needs no network and a change in scores
+# comes from retrieval or prompt assembly alone; "groq" calls the real model
+# (point GROQ_BASE_URL at benchmarks/mock_groq_server.py to test offline).
+#
+# Results are written as JSON with the settings that produced them; --compare
+# checks a run against an earlier one and exits 1 if quality dropped or latency
+# grew beyond the tolerances below.
+#
+#   python -m benchmarks.rag_eval --folder path/to/db_faiss --output runs/today.json --compare runs/baseline.json
+#
+# Questions are JSON lines with "question", "answer" (a phrase a relevant passage
+# contains) and optionally "reference" (the full answer scored against the reply).
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+import numpy as np
+import config
+import chatbot_evaluation
+from rag_utils import Retriever
+from prompt_builder import build_consultation_prompt, sentence_end
+from benchmarks.chunking import DEFAULT_QUESTIONS, load_questions, contains_answer
+
+LLM_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
+STAGES = ("retrieval", "prompt", "llm", "total")
+
+# --compare: largest acceptable drop in a quality score (absolute) and rise in a latency (relative)
+quality_tolerance = 0.02
+latency_tolerance = 0.25
+# Latencies below this many ms are too noisy to compare
+latency_floor_ms = 5.0
+
+# Sentences of knowledge the stub LLM repeats back
+stub_sentences = 3
+
+
+class StubLLM:
+    """
+    Deterministic offline stand-in for the LLM: replies with the first sentences of the
+    knowledge section of the prompt, after an optional fixed delay.
+    """
+
+    name = "stub"
+
+    def __init__(self, latency_ms=0.0):
+        self.latency = latency_ms / 1000
+
+    async def generate(self, prompt, history):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        knowledge = prompt.split("Relevant Medical Knowledge:\n", 1)[-1].split("\n\nPatient says:", 1)[0]
+        sentences = [s.strip() for s in sentence_end.split(" ".join(knowledge.split())) if s.strip()]
+        return " ".join(sentences[:stub_sentences])
+
+
+class GroqLLM:
+    """
+    The model gradio_app.py uses, called without streaming.
+    """
+
+    name = "groq"
+
+    def __init__(self, model=LLM_MODEL):
+        self.model = model
+
+    async def generate(self, prompt, history):
+        from brain_of_the_doctor import analyze_image_with_query_async
+        return await analyze_image_with_query_async(query=prompt, model=self.model, chat_history=history)
+
+
+def first_relevant_rank(passages, answer):
+    return next((rank for rank, (text, _) in enumerate(passages, 1) if contains_answer(text, answer)), None)
+
+
+async def consult(retriever, llm, question, k):
+    timings = {}
+    start = time.perf_counter()
+    passages = await asyncio.to_thread(retriever.retrieve_passages_many, [question["question"]], k)
+    passages = passages[0]
+    timings["retrieval"] = time.perf_counter() - start
+
+    mark = time.perf_counter()
+    prompt, history, report = build_consultation_prompt(question["question"], passages)
+    timings["prompt"] = time.perf_counter() - mark
+
+    mark = time.perf_counter()
+    reply = await llm.generate(prompt, history)
+    timings["llm"] = time.perf_counter() - mark
+    timings["total"] = time.perf_counter() - start
+
+    return {"question": question["question"], "reply": reply,
+            "rank": first_relevant_rank(passages, question["answer"]),
+            "prompt_tokens": report["total"],
+            "ms": {stage: 1000 * seconds for stage, seconds in timings.items()}}
+
+
+async def run(retriever, llm, questions, k, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(question):
+        async with semaphore:
+            return await consult(retriever, llm, question, k)
+
+    return await asyncio.gather(*(one(question) for question in questions))
+
+
+def score_replies(rows, questions, bert_model=None, bertscore=False):
+    refs = [question.get("reference", question["answer"]) for question in questions]
+    hyps = [row["reply"] or "" for row in rows]
+    chatbot_evaluation._init_worker()
+    for row, pair in zip(rows, zip(refs, hyps)):
+        row["rouge_l"] = chatbot_evaluation.rouge_l(pair)
+        row["bleu"] = chatbot_evaluation.bleu(pair)
+    if bertscore:
+        for row, f1 in zip(rows, chatbot_evaluation.BertScoreBatcher(bert_model).f1(refs, hyps)):
+            row["bertscore_f1"] = f1
+
+
+def summarize(rows, k):
+    ranks = [row["rank"] for row in rows]
+    summary = {
+        f"recall@{k}": sum(rank is not None for rank in ranks) / len(rows),
+        "mrr": sum(1 / rank for rank in ranks if rank) / len(rows),
+        "prompt_tokens": float(np.mean([row["prompt_tokens"] for row in rows])),
+    }
+    for metric in ("rouge_l", "bleu", "bertscore_f1"):
+        if metric in rows[0]:
+            summary[metric] = float(np.mean([row[metric] for row in rows]))
+    for stage in STAGES:
+        values = [row["ms"][stage] for row in rows]
+        summary[f"{stage}_p50_ms"] = float(np.percentile(values, 50))
+        summary[f"{stage}_p95_ms"] = float(np.percentile(values, 95))
+    return summary
+
+
+def settings(args, llm):
+    return {"folder": args.folder, "k": args.k, "llm": llm.name, "concurrency": args.concurrency,
+            "questions": args.questions, "hybrid": config.HYBRID_SEARCH, "rerank": config.RERANK_ENABLED,
+            "embedding_backend": config.EMBEDDING_BACKEND, "prompt_token_budget": config.PROMPT_TOKEN_BUDGET,
+            "min_passage_score": config.MIN_PASSAGE_SCORE}
+
+
+def compare(current, baseline):
+    """
+    Regressions of current against baseline, as readable lines (empty if none).
+    """
+    changed = {key: (baseline["settings"].get(key), value) for key, value in current["settings"].items()
+               if baseline["settings"].get(key) != value}
+    for key, (old, new) in changed.items():
+        print(f"ℹ️ {key} changed: {old} -> {new}")
+    regressions = []
+    for metric, new in current["summary"].items():
+        old = baseline["summary"].get(metric)
+        if old is None:
+            continue
+        if metric.endswith("_ms"):
+            if new > max(old, latency_floor_ms) * (1 + latency_tolerance):
+                regressions.append(f"{metric}: {old:.1f} -> {new:.1f} ms")
+        elif metric != "prompt_tokens" and new < old - quality_tolerance:
+            regressions.append(f"{metric}: {old:.3f} -> {new:.3f}")
+    return regressions
+
+
+def print_summary(summary, baseline=None):
+    print(f"\n{'metric':<18} {'value':>10} {'baseline':>10}")
+    for metric, value in summary.items():
+        old = baseline.get(metric) if baseline else None
+        print(f"{metric:<18} {value:>10.3f} {'' if old is None else format(old, '.3f'):>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate retrieval, prompt assembly and replies end to end.")
+    parser.add_argument("--folder", default=config.DB_FOLDER)
+    parser.add_argument("--questions", default=DEFAULT_QUESTIONS)
+    parser.add_argument("--k", type=int, default=config.TOP_K)
+    parser.add_argument("--llm", choices=("stub", "groq"), default="stub")
+    parser.add_argument("--stub-latency-ms", type=float, default=0.0, help="Simulated LLM time for the stub")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--bertscore", action="store_true", help="Also compute BERTScore (loads a model)")
+    parser.add_argument("--bert-model", default=None)
+    parser.add_argument("--output", help="Write the results as JSON")
+    parser.add_argument("--compare", help="Earlier results JSON; exit 1 on regressions")
+    args = parser.parse_args()
+
+    questions = load_questions(args.questions)
+    llm = StubLLM(args.stub_latency_ms) if args.llm == "stub" else GroqLLM()
+    retriever = Retriever(db_folder=args.folder)
+    retriever.warm_up()
+
+    start = time.perf_counter()
+    rows = asyncio.run(run(retriever, llm, questions, args.k, args.concurrency))
+    elapsed = time.perf_counter() - start
+    score_replies(rows, questions, args.bert_model, args.bertscore)
+    result = {"settings": settings(args, llm), "summary": summarize(rows, args.k), "rows": rows}
+    print(f"⏱ {len(rows)} questions in {elapsed:.2f}s ({len(rows) / elapsed:.1f} questions/sec)")
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_summary(result["summary"], baseline and baseline["summary"])
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    if baseline:
+        regressions = compare(result, baseline)
+        for line in regressions:
+            print(f"❌ Regression: {line}")
+        if regressions:
+            sys.exit(1)
+        print("✅ No regressions against", args.compare)
+
+
+if __name__ == "__main__":
+    main()
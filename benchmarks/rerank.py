@@ -0,0 +1,61 @@
+# benchmarks/rerank.py
+#
+# Retrieval with and without the cross-encoder stage on a built index: hit rate
+# on the held-out question set, p50/p99 retrieval latency, and the latency the
+# reranker added, for each requested backend (torch, int8, onnx).
+#
+#   python -m benchmarks.rerank --folder path/to/db_faiss --backends torch int8 onnx
+
+import time
+import argparse
+import numpy as np
+import config
+from rag_utils import Retriever
+from reranker import Reranker, BACKENDS
+from benchmarks.chunking import DEFAULT_QUESTIONS, load_questions, contains_answer
+
+
+def evaluate(retriever, questions, k):
+    hits, latencies = 0, []
+    for question in questions:
+        retriever.result_cache.clear()
+        start = time.perf_counter()
+        passages = retriever.retrieve_passages_many([question["question"]], k)[0]
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += any(contains_answer(text, question["answer"]) for text, _ in passages)
+    return {"hit_rate": hits / len(questions), "p50_ms": float(np.percentile(latencies, 50)),
+            "p99_ms": float(np.percentile(latencies, 99))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the cost and benefit of cross-encoder reranking.")
+    parser.add_argument("--folder", default=config.DB_FOLDER)
+    parser.add_argument("--questions", default=DEFAULT_QUESTIONS)
+    parser.add_argument("--k", type=int, default=config.TOP_K)
+    parser.add_argument("--backends", nargs="+", default=["int8"], choices=BACKENDS)
+    parser.add_argument("--budget-ms", type=float, default=config.RERANK_BUDGET_MS)
+    args = parser.parse_args()
+    questions = load_questions(args.questions)
+
+    baseline = Retriever(db_folder=args.folder, reranker=False)
+    baseline.warm_up()
+    rows = {"no rerank": evaluate(baseline, questions, args.k)}
+    metrics = {}
+    for backend in args.backends:
+        reranker = Reranker(backend=backend, budget_ms=args.budget_ms)
+        retriever = Retriever(db_folder=args.folder, reranker=reranker)
+        retriever.warm_up()
+        rows[backend] = evaluate(retriever, questions, args.k)
+        metrics[backend] = reranker.metrics()
+
+    print(f"\n{'stage':<10} {'hit@' + str(args.k):>7} {'p50 ms':>8} {'p99 ms':>8} {'added ms':>9}")
+    for name, r in rows.items():
+        added = metrics[name]["avg_added_ms"] if name in metrics else 0.0
+        print(f"{name:<10} {r['hit_rate']:>7.2f} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} {added:>9.2f}")
+    for backend, m in metrics.items():
+        print(f"{backend}: {m['reranked']} reranked, {m['skipped_margin']} skipped (clear winner), "
+              f"{m['skipped_budget']} skipped (budget), {m['timeouts']} timeouts")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# benchmarks/semantic_cache.py
+#
+# Check of the semantic answer cache (semantic_cache.py) on labelled query pairs
+# (benchmarks/data/semantic_cache_pairs.jsonl): the "cached" query is stored, the
+# other one is looked up, and "share" says whether it may get the stored answer.
+# Pairs that differ in negation ("I do / do not have chest pain") must never share;
+# serving one of those fails the run, while a missed shareable pair only costs an
+# LLM call and is reported. --no-model checks the negation guard alone, treating
+# every pair as similar enough to hit. Exits with status 1 if any check fails.
+#
+#   python -m benchmarks.semantic_cache --threshold 0.92
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import config
+from semantic_cache import SemanticCache, same_polarity
+
+DEFAULT_PAIRS = os.path.join(os.path.dirname(__file__), "data", "semantic_cache_pairs.jsonl")
+
+
+def load_pairs(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def served_with_model(pairs, retriever, threshold):
+    served = []
+    for pair in pairs:
+        # A fresh cache per pair, so only the pair's own entry can answer
+        folder = tempfile.mkdtemp(prefix="medibot_cache_check_")
+        try:
+            cache = SemanticCache(retriever, folder=folder, threshold=threshold)
+            cache.store(pair["cached"], "cached answer", 1.0)
+            served.append(cache.lookup(pair["query"]) is not None)
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+    return served
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check which labelled query pairs share a cached answer.")
+    parser.add_argument("--pairs", default=DEFAULT_PAIRS)
+    parser.add_argument("--model", default=config.EMBEDDING_MODEL)
+    parser.add_argument("--threshold", type=float, default=config.SEMANTIC_CACHE_THRESHOLD)
+    parser.add_argument("--no-model", action="store_true", help="Negation guard only")
+    args = parser.parse_args()
+    pairs = load_pairs(args.pairs)
+
+    if args.no_model:
+        served = [same_polarity(pair["query"], pair["cached"]) for pair in pairs]
+    else:
+        from rag_utils import Retriever
+        served = served_with_model(pairs, Retriever(model_name=args.model), args.threshold)
+
+    errors = [pair for pair, hit in zip(pairs, served) if hit and not pair["share"]]
+    missed = [pair for pair, hit in zip(pairs, served) if not hit and pair["share"]]
+    shareable = sum(pair["share"] for pair in pairs)
+    print(f"{len(pairs)} pairs, {shareable} shareable: {shareable - len(missed)} served, "
+          f"{len(errors)} served that must not be")
+    for pair in missed:
+        print(f"  missed       {pair['query']!r} ~ {pair['cached']!r}")
+    for pair in errors:
+        print(f"FAIL: {pair['query']!r} got the answer cached for {pair['cached']!r}")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# benchmarks/sessions.py
+#
+# Concurrency check for session_store.py. Dozens of simulated patients run
+# consultations in parallel the way gradio_app.py does (look up the session,
+# read its recent turns, wait for a simulated LLM reply, record the turn) and the
+# run verifies that:
+#   - no session ever sees another session's turns
+#   - histories and logs stay within their ring-buffer bounds
+#   - the store never exceeds its session limit and idle sessions are evicted
+#   - memory stays under a ceiling however many turns are played
+# Exits with status 1 if any check fails.
+#
+#   python -m benchmarks.sessions --sessions 50 --turns 40 --max-turns 10
+
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tracemalloc
+from session_store import SessionStore
+
+
+async def patient(store, session_id, turns, max_turns, errors):
+    rng = random.Random(session_id)
+    for turn in range(turns):
+        session = store.get(session_id)
+        history = session.recent_turns()
+        foreign = [q for q, _ in history if not q.startswith(f"{session_id}:")]
+        if foreign:
+            errors.append(f"{session_id} saw turns of another session: {foreign[:2]}")
+        if len(history) > max_turns:
+            errors.append(f"{session_id} history grew to {len(history)} turns")
+        await asyncio.sleep(rng.uniform(0, 0.005))  # LLM call; other sessions interleave here
+        session.add_turn(f"{session_id}: question {turn}", "reply " * rng.randint(50, 200))
+
+
+async def run(store, sessions, turns, max_turns):
+    errors = []
+    await asyncio.gather(*(patient(store, f"s{i}", turns, max_turns, errors) for i in range(sessions)))
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive many simulated sessions through the session store.")
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=40, help="Consultation turns per session")
+    parser.add_argument("--max-turns", type=int, default=10, help="History ring-buffer size")
+    parser.add_argument("--max-log", type=int, default=20, help="Conversation log ring-buffer size")
+    parser.add_argument("--memory-ceiling-mb", type=float, default=64)
+    args = parser.parse_args()
+
+    store = SessionStore(idle_timeout=0.2, max_sessions=args.sessions,
+                         max_turns=args.max_turns, max_log_entries=args.max_log)
+    tracemalloc.start()
+    start = time.perf_counter()
+    errors = asyncio.run(run(store, args.sessions, args.turns, args.max_turns))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    for session_id in (f"s{i}" for i in range(args.sessions)):
+        session = store._sessions.get(session_id)
+        if session and (len(session.history) > args.max_turns or len(session.log) > args.max_log):
+            errors.append(f"{session_id} exceeded its ring buffers")
+    metrics = store.metrics()
+    if metrics["active"] > args.sessions:
+        errors.append(f"{metrics['active']} sessions held, limit {args.sessions}")
+
+    # One extra session beyond the limit evicts the least recently active one
+    store.get("overflow")
+    if len(store) > args.sessions:
+        errors.append("session limit not enforced")
+
+    # After the idle timeout every earlier session is dropped on the next access
+    time.sleep(0.25)
+    store.get("late")
+    if len(store) != 1:
+        errors.append(f"{len(store) - 1} idle sessions survived the timeout")
+
+    peak_mb = peak / 1e6
+    if peak_mb > args.memory_ceiling_mb:
+        errors.append(f"peak memory {peak_mb:.1f} MB above the {args.memory_ceiling_mb} MB ceiling")
+
+    print(f"{args.sessions} sessions x {args.turns} turns in {elapsed:.2f}s "
+          f"({args.sessions * args.turns / elapsed:.0f} turns/s)")
+    print(f"held {metrics['active']} sessions, {metrics['history_bytes'] / 1e6:.2f} MB of history, "
+          f"peak traced memory {peak_mb:.1f} MB")
+    print(f"store: {store.metrics()}")
+    for error in errors[:20]:
+        print(f"FAIL: {error}")
+    print("OK" if not errors else f"{len(errors)} check(s) failed")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# benchmarks/triage.py
+#
+# Emergency triage (emergency_triage.py) on a labelled set of patient queries
+# (benchmarks/data/emergency_queries.jsonl): precision, recall and p50/p99 latency
+# of the old five-keyword scan, the exact-term matcher alone, and terms plus
+# embedding similarity. Misclassified queries are listed, and --thresholds shows
+# how precision and recall move with MEDIBOT_EMERGENCY_THRESHOLD.
+#
+#   python -m benchmarks.triage --thresholds 0.5 0.55 0.6 0.65 0.7
+#
+# --no-model skips the embedding stage (no model download needed).
+
+import os
+import json
+import time
+import argparse
+import numpy as np
+import config
+from emergency_triage import EmergencyTriage
+
+DEFAULT_QUERIES = os.path.join(os.path.dirname(__file__), "data", "emergency_queries.jsonl")
+
+# The substring scan gradio_app.py used to run over the LLM's reply
+legacy_keywords = ["chest pain", "difficulty breathing", "severe bleeding", "stroke", "heart attack"]
+
+
+def load_queries(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(queries, detect):
+    latencies, outcomes = [], []
+    for item in queries:
+        start = time.perf_counter()
+        urgent = detect(item["query"])
+        latencies.append((time.perf_counter() - start) * 1000)
+        outcomes.append((item, urgent))
+    tp = sum(1 for item, urgent in outcomes if urgent and item["urgent"])
+    fp = sum(1 for item, urgent in outcomes if urgent and not item["urgent"])
+    fn = sum(1 for item, urgent in outcomes if not urgent and item["urgent"])
+    precision = tp / (tp + fp) if tp + fp else 1.0
+    recall = tp / (tp + fn) if tp + fn else 1.0
+    return {"precision": precision, "recall": recall,
+            "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+            "p50_ms": float(np.percentile(latencies, 50)), "p99_ms": float(np.percentile(latencies, 99)),
+            "wrong": [(item["query"], item["urgent"]) for item, urgent in outcomes if urgent != item["urgent"]]}
+
+
+def report(name, result):
+    print(f"{name:<22} {result['precision']:>9.1%} {result['recall']:>7.1%} {result['f1']:>6.2f} "
+          f"{result['p50_ms']:>8.3f} {result['p99_ms']:>8.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precision, recall and latency of emergency triage.")
+    parser.add_argument("--queries", default=DEFAULT_QUERIES)
+    parser.add_argument("--model", default=config.EMBEDDING_MODEL)
+    parser.add_argument("--threshold", type=float, default=config.EMERGENCY_THRESHOLD)
+    parser.add_argument("--thresholds", type=float, nargs="*", default=[], help="Also report these thresholds")
+    parser.add_argument("--no-model", action="store_true", help="Exact terms only")
+    args = parser.parse_args()
+    queries = load_queries(args.queries)
+    print(f"{len(queries)} queries, {sum(q['urgent'] for q in queries)} urgent\n")
+    print(f"{'':<22} {'precision':>9} {'recall':>7} {'f1':>6} {'p50 ms':>8} {'p99 ms':>8}")
+
+    results = {
+        "keywords (old)": evaluate(queries, lambda q: any(k in q.lower() for k in legacy_keywords)),
+        "terms": evaluate(queries, lambda q, terms=EmergencyTriage(semantic=False): terms.assess(q).urgent),
+    }
+    triage = None
+    if not args.no_model:
+        from rag_utils import Retriever
+        triage = EmergencyTriage(Retriever(model_name=args.model), threshold=args.threshold, semantic=True)
+        triage.warm_up()
+        results[f"terms+semantic@{args.threshold:g}"] = evaluate(queries, lambda q: triage.assess(q).urgent)
+    for name, result in results.items():
+        report(name, result)
+
+    for threshold in args.thresholds if triage else []:
+        triage.threshold = threshold
+        report(f"  threshold {threshold:g}", evaluate(queries, lambda q: triage.assess(q).urgent))
+
+    best = list(results)[-1]
+    print(f"\nMisclassified by {best}:")
+    for query, urgent in results[best]["wrong"]:
+        print(f"  {'missed' if urgent else 'false alarm':<12} {query}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# bm25_index.py
+#
+# Compact inverted index with BM25 scoring, used next to the FAISS index so
+# exact terms (drug names, disease names) are matched even when the MiniLM
+# embedding blurs them. Postings are stored as flat arrays (CSR layout):
+#   bm25.offsets.npy  int64, postings of term t are [offsets[t], offsets[t + 1])
+#   bm25.docs.npy     int64 chunk ids
+#   bm25.weights.npy  float32 precomputed BM25 weight (idf * saturated tf) per posting
+#   bm25.vocab.json   terms in term-id order, plus the k1/b used
+# Weights are final at build time, so a query is a few array slices, one
+# bincount and a partial sort. The arrays are memory-mapped when loaded.
+
+import os
+import re
+import json
+from collections import Counter, defaultdict
+import numpy as np
+
+OFFSETS_NAME = "bm25.offsets.npy"
+DOCS_NAME = "bm25.docs.npy"
+WEIGHTS_NAME = "bm25.weights.npy"
+VOCAB_NAME = "bm25.vocab.json"
+
+# BM25 parameters
+k1 = 1.2
+b = 0.75
+
+token_pattern = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+STOPWORDS = frozenset("""
+a an and are as at be been but by can could do does for from had has have he her his how i if in into is it
+its may me might my no not of on or our she should so such than that the their them then there these they
+this those to was we were what when where which while who why will with would you your also other some any
+""".split())
+
+
+def tokenize(text):
+    return [t for t in token_pattern.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+def build(passages):
+    """
+    Build a BM25Index from passages (dict chunk id -> text, a PassageStore, or a list).
+    """
+    items = passages.items() if hasattr(passages, "items") else enumerate(passages)
+    term_ids = {}
+    post_terms, post_docs, post_tfs = [], [], []
+    doc_ids, doc_lengths = [], []
+    for chunk_id, text in items:
+        tokens = tokenize(text)
+        doc_ids.append(chunk_id)
+        doc_lengths.append(len(tokens))
+        for term, tf in Counter(tokens).items():
+            post_terms.append(term_ids.setdefault(term, len(term_ids)))
+            post_docs.append(chunk_id)
+            post_tfs.append(tf)
+
+    # Renumber terms alphabetically so the vocabulary file is stable between builds
+    vocab = sorted(term_ids)
+    renumber = np.empty(len(vocab), dtype=np.int64)
+    renumber[[term_ids[t] for t in vocab]] = np.arange(len(vocab))
+    terms = renumber[np.asarray(post_terms, dtype=np.int64)]
+    docs = np.asarray(post_docs, dtype=np.int64)
+    tfs = np.asarray(post_tfs, dtype=np.float32)
+
+    lengths = np.zeros(max(doc_ids, default=-1) + 1, dtype=np.float32)
+    lengths[doc_ids] = doc_lengths
+    doc_count = max(len(doc_ids), 1)
+    avg_length = (sum(doc_lengths) / doc_count) or 1.0
+
+    df = np.bincount(terms, minlength=len(vocab))
+    idf = np.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+    norm = k1 * (1 - b + b * lengths[docs] / avg_length)
+    weights = (idf[terms] * tfs * (k1 + 1) / (tfs + norm)).astype(np.float32)
+
+    order = np.argsort(terms, kind="stable")
+    offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum(df, out=offsets[1:])
+    return BM25Index(vocab, offsets, docs[order], weights[order])
+
+
+class BM25Index:
+    """
+    Read-only BM25 search over chunk ids.
+    """
+
+    def __init__(self, vocab, offsets, docs, weights):
+        self.vocab = vocab
+        self.term_ids = {term: i for i, term in enumerate(vocab)}
+        self.offsets = offsets
+        self.docs = docs
+        self.weights = weights
+        self.size = int(docs.max()) + 1 if len(docs) else 0
+
+    def __len__(self):
+        return len(self.vocab)
+
+    def search(self, query, top_k):
+        """
+        (chunk ids, scores) of the best top_k chunks for a query, best first.
+        """
+        term_ids = {self.term_ids[t] for t in tokenize(query) if t in self.term_ids}
+        if not term_ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        slices = [slice(self.offsets[t], self.offsets[t + 1]) for t in term_ids]
+        docs = np.concatenate([self.docs[s] for s in slices])
+        weights = np.concatenate([self.weights[s] for s in slices])
+        if len(slices) == 1:
+            candidates, scores = docs, weights
+        else:
+            totals = np.bincount(docs, weights=weights, minlength=self.size)
+            candidates = np.unique(docs)
+            scores = totals[candidates]
+        if len(candidates) > top_k:
+            best = np.argpartition(-scores, top_k - 1)[:top_k]
+            candidates, scores = candidates[best], scores[best]
+        order = np.argsort(-scores, kind="stable")
+        return candidates[order], scores[order].astype(np.float32)
+
+    def search_many(self, queries, top_k):
+        return [self.search(query, top_k) for query in queries]
+
+    def save(self, folder):
+        for name, array in ((OFFSETS_NAME, self.offsets), (DOCS_NAME, self.docs), (WEIGHTS_NAME, self.weights)):
+            path = os.path.join(folder, name)
+            with open(path + ".tmp", "wb") as f:
+                np.save(f, array)
+            os.replace(path + ".tmp", path)
+        vocab_file = os.path.join(folder, VOCAB_NAME)
+        with open(vocab_file + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"k1": k1, "b": b, "terms": self.vocab}, f)
+        os.replace(vocab_file + ".tmp", vocab_file)
+
+
+def exists(folder):
+    return all(os.path.exists(os.path.join(folder, name))
+               for name in (OFFSETS_NAME, DOCS_NAME, WEIGHTS_NAME, VOCAB_NAME))
+
+
+def load(folder, mmap=True):
+    """
+    Open a saved index, or return None if the build has no BM25 files.
+    """
+    if not exists(folder):
+        return None
+    mode = "r" if mmap else None
+    with open(os.path.join(folder, VOCAB_NAME), "r", encoding="utf-8") as f:
+        vocab = json.load(f)["terms"]
+    return BM25Index(vocab,
+                     np.load(os.path.join(folder, OFFSETS_NAME), mmap_mode=mode),
+                     np.load(os.path.join(folder, DOCS_NAME), mmap_mode=mode),
+                     np.load(os.path.join(folder, WEIGHTS_NAME), mmap_mode=mode))
+
+
+def reciprocal_rank_fusion(rankings, top_k, k=60):
+    """
+    Fuse ranked id lists: each id scores sum(1 / (k + rank)) over the lists it appears in.
+    Returns the top_k ids, best first.
+    """
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, idx in enumerate(ranking):
+            if idx >= 0:
+                scores[int(idx)] += 1.0 / (k + rank + 1)
+    return sorted(scores, key=lambda idx: -scores[idx])[:top_k]
@@ -51,25 +51,23 @@
 
 #     return chat_completion.choices[0].message.content
 
-import os
-import base64
-from groq import Groq
+import logging
 from dotenv import load_dotenv
+from groq_client import get_client_manager, estimate_tokens
+from image_preprocessing import prepare_image
 
 # Load environment variables
 load_dotenv()
 
-GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
+logger = logging.getLogger(__name__)
 
-# Encode image into base64
-def encode_image(image_path):
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
 
-# Analyze image + query with LLM
-def analyze_image_with_query(query, model, encoded_image=None, chat_history=[]):
-    client = Groq(api_key=GROQ_API_KEY)
+# Downscale and re-encode the image (cached by content), as a data URL with its real type
+def encode_image(image_path):
+    return prepare_image(image_path).data_url
 
+# Build the chat messages for a query (+ optional image) and recent history
+def build_messages(query, encoded_image=None, chat_history=()):
     messages = []
 
     # Add past history if available
@@ -89,22 +87,61 @@ def analyze_image_with_query(query, model, encoded_image=None, chat_history=[]):
         user_message["content"].append({
             "type": "image_url",
             "image_url": {
-                "url": f"data:image/jpeg;base64,{encoded_image}",
+                "url": encoded_image,
             },
         })
 
-    # 🔵 Print full prompt being sent
-    print("\n📜 FINAL QUERY SENT TO MODEL:\n")
-    print(query)
-    print("\n" + "-"*80 + "\n")
+    # 🔵 Full prompt being sent, at debug level
+    logger.debug(f"📜 FINAL QUERY SENT TO MODEL:\n{query}")
 
     messages.append(user_message)
+    return messages
+
+# Pull the text deltas out of a streamed completion
+def _iter_tokens(chunks):
+    for chunk in chunks:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
 
-    # Call Groq API
-    chat_completion = client.chat.completions.create(
+async def _aiter_tokens(chunks):
+    async for chunk in chunks:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+def _create_completion(client, **kwargs):
+    return client.chat.completions.create(**kwargs)
+
+# Analyze image + query with LLM
+# With stream=True a generator of text tokens is returned instead of the full reply
+def analyze_image_with_query(query, model, encoded_image=None, chat_history=[], stream=False):
+    messages = build_messages(query, encoded_image, chat_history)
+
+    # Call Groq API through the shared, rate-limited client
+    chat_completion = get_client_manager().call(
+        _create_completion,
         messages=messages,
-        model=model
+        model=model,
+        stream=stream,
+        estimated_tokens=estimate_tokens(messages)
     )
 
+    if stream:
+        return _iter_tokens(chat_completion)
     return chat_completion.choices[0].message.content
 
+# Async variant used by the Gradio pipeline
+# With stream=True an async generator of text tokens is returned
+async def analyze_image_with_query_async(query, model, encoded_image=None, chat_history=(), stream=False):
+    messages = build_messages(query, encoded_image, chat_history)
+
+    chat_completion = await get_client_manager().acall(
+        _create_completion,
+        messages=messages,
+        model=model,
+        stream=stream,
+        estimated_tokens=estimate_tokens(messages)
+    )
+
+    if stream:
+        return _aiter_tokens(chat_completion)
+    return chat_completion.choices[0].message.content
@@ -1,66 +1,466 @@
 # build_rag_database_from_pdf.py
 
 import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
 import faiss
-import pickle
 import numpy as np
-from sentence_transformers import SentenceTransformer
-import fitz  # PyMuPDF
+from collections import deque, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import config
+import chunker
+import bm25_index
+import embedding_backend
+import index_factory
+import passage_store
+from tokens import count_tokens
 
-# Set paths
-pdf_path = r"D:\medical-chatbot\data\The_GALE_ENCYCLOPEDIA_of_MEDICINE_SECOND.pdf"  # 🔵 Put correct PDF path
-save_folder = r"C:\Users\DELL\Desktop\embeddings\db_faiss"  # 🔵 Folder where you want index.faiss and index.pkl
+# Set paths (see config.py; override with MEDIBOT_PDF_PATHS / MEDIBOT_DB_FOLDER)
+pdf_paths = config.PDF_PATHS
+save_folder = config.DB_FOLDER
+manifest_name = "manifest.json"  # Source files and per-chunk content hashes, used by --incremental
 
-os.makedirs(save_folder, exist_ok=True)
+model_name = config.EMBEDDING_MODEL
 
-# Load embedding model
-print("🔵 Loading embedding model...")
-embedder = SentenceTransformer("all-MiniLM-L6-v2")
+# Chunking: "structured" packs whole sentences into ~chunker.target_tokens chunks along
+# entry/section/paragraph boundaries; "fixed" is the original character window below
+CHUNKERS = ("structured", "fixed")
+chunking = "structured"
 
-# Read PDF and extract text
-print("📄 Reading PDF...")
-doc = fitz.open(pdf_path)
-full_text = ""
-for page in doc:
-    full_text += page.get_text()
-
-print(f"✅ PDF loaded. Total characters: {len(full_text)}")
-
-# Split text into small chunks (around 500-700 characters)
-print("✂️ Splitting into text chunks...")
+# Fixed chunking settings (around 500-700 characters)
 chunk_size = 700
 overlap = 100
 
+# Streaming settings
+pages_per_task = 32       # pages extracted by one worker call
+embed_batch_size = 512    # chunks embedded and appended to FAISS at a time
+num_workers = max(1, (os.cpu_count() or 2) - 1)
+
+
+def peak_rss_mb():
+    """
+    Peak resident memory of this process in MB, or None if it can't be measured.
+    """
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is bytes on macOS and kilobytes on Linux
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+    except ImportError:
+        return None
+
+
+def _extract_page_range(task):
+    # Runs in a worker process: open the PDF and return text for pages [start, stop)
+    import fitz  # PyMuPDF, only needed when reading PDFs
+    path, start, stop = task
+    with fitz.open(path) as doc:
+        return [doc[i].get_text() for i in range(start, stop)]
+
+
+def iter_pages(path, workers=num_workers, pages_per_task=pages_per_task):
+    """
+    Yield page texts in order, extracting them in a process pool.
+    Only a bounded window of tasks is in flight so pages never pile up in memory.
+    """
+    import fitz
+    with fitz.open(path) as doc:
+        page_count = doc.page_count
+
+    tasks = [(path, start, min(start + pages_per_task, page_count))
+             for start in range(0, page_count, pages_per_task)]
+
+    if workers <= 1:
+        for task in tasks:
+            yield from _extract_page_range(task)
+        return
+
+    max_in_flight = workers * 2
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        task_iter = iter(tasks)
+        for task in task_iter:
+            pending.append(pool.submit(_extract_page_range, task))
+            if len(pending) >= max_in_flight:
+                break
+        while pending:
+            pages = pending.popleft().result()
+            next_task = next(task_iter, None)
+            if next_task is not None:
+                pending.append(pool.submit(_extract_page_range, next_task))
+            yield from pages
+
+
+def iter_chunks(texts, chunk_size=700, overlap=100):
+    """
+    Yield fixed-size overlapping chunks from a stream of texts, treating the
+    stream as one continuous document. Produces exactly the same chunks as
+    split_text() on the concatenated text, but only buffers one chunk's worth.
+    """
+    step = chunk_size - overlap
+    buffer = ""
+    for text in texts:
+        buffer += text
+        while len(buffer) >= chunk_size:
+            yield buffer[:chunk_size]
+            buffer = buffer[step:]
+    while buffer:
+        yield buffer[:chunk_size]
+        buffer = buffer[step:]
+
+
 def split_text(text, chunk_size=700, overlap=100):
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = start + chunk_size
-        chunks.append(text[start:end])
-        start += chunk_size - overlap
-    return chunks
+    return list(iter_chunks([text], chunk_size=chunk_size, overlap=overlap))
+
+
+def iter_source_chunks(pages, method=None):
+    """
+    Yield (text, metadata) for a stream of page texts; metadata is None for fixed chunks.
+    """
+    method = method or chunking
+    if method == "fixed":
+        for text in iter_chunks(pages, chunk_size=chunk_size, overlap=overlap):
+            yield text, None
+    else:
+        for chunk in chunker.iter_structured_chunks(pages):
+            yield chunk.text, chunk.metadata()
+
+
+def chunk_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def new_manifest(index_type="flat", method=None):
+    method = method or chunking
+    return {
+        "version": 1,
+        "model": model_name,
+        "chunker": method,
+        "chunk_size": chunk_size,
+        "overlap": overlap,
+        "target_tokens": chunker.target_tokens if method == "structured" else None,
+        "index_type": index_type,
+        "next_id": 0,
+        "sources": {},
+    }
+
+
+def load_existing(folder, dimension, index_type, method=None):
+    """
+    Load (faiss_index, passages, manifest) from a previous incremental build; passages
+    is the memory-mapped store (a dict for a legacy index.pkl), not read into memory.
+    Returns None when there is nothing compatible to update, which means a full rebuild.
+    """
+    manifest_file = os.path.join(folder, manifest_name)
+    index_file = os.path.join(folder, "index.faiss")
+    if not (os.path.exists(manifest_file) and os.path.exists(index_file)):
+        return None
+    if not (passage_store.has_store(folder) or os.path.exists(os.path.join(folder, passage_store.LEGACY_NAME))):
+        return None
+
+    with open(manifest_file, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    expected = new_manifest(index_type, method)
+    # Builds from before the chunker setting existed used fixed chunks
+    legacy = {"chunker": "fixed", "target_tokens": None}
+    for key in ("version", "model", "chunker", "chunk_size", "overlap", "target_tokens", "index_type"):
+        if manifest.get(key, legacy.get(key)) != expected[key]:
+            print(f"⚠️ Manifest {key} changed ({manifest.get(key, legacy.get(key))} -> {expected[key]}), "
+                  f"rebuilding from scratch.")
+            return None
+
+    faiss_index = faiss.read_index(index_file)
+    if faiss_index.d != dimension or not index_factory.supports_ids(faiss_index, index_type):
+        print("⚠️ Existing index can't be updated by chunk id, rebuilding from scratch.")
+        return None
+    return faiss_index, passage_store.load_passages(folder), manifest
+
+
+def source_unchanged(path, info):
+    stat = os.stat(path)
+    if stat.st_size != info.get("size"):
+        return False
+    if stat.st_mtime == info.get("mtime"):
+        return True
+    # Touched but maybe not modified: fall back to the content hash
+    if file_sha256(path) == info.get("sha256"):
+        info["mtime"] = stat.st_mtime
+        return True
+    return False
+
+
+def remove_chunks(state, ids):
+    # Vectors are dropped in one pass at the end of the build (HNSW has to rebuild its graph)
+    state["stale"].extend(ids)
+    state["passages"].remove(ids)
+    return len(ids)
+
+
+def add_vectors(state, ids, embeddings, final=False):
+    """
+    Add normalized vectors to the index. For IVF types the index doesn't exist yet
+    on a fresh build: vectors are buffered until index_factory.train_size of them
+    are available (or the input ends), the index is trained on them, then filled.
+    """
+    embeddings = index_factory.normalize(embeddings)
+    if state["index"] is None:
+        state["train_ids"].append(ids)
+        state["train_vectors"].append(embeddings)
+        buffered = sum(len(v) for v in state["train_vectors"])
+        if buffered < index_factory.train_size and not final:
+            return
+        ids = np.concatenate(state["train_ids"])
+        embeddings = np.concatenate(state["train_vectors"])
+        state["train_ids"], state["train_vectors"] = [], []
+        print(f"🎯 Training {state['index_type']} index on {len(embeddings)} vectors...")
+        state["index"] = index_factory.make_index(state["index_type"], state["dimension"], embeddings)
+    if len(ids):
+        state["index"].add_with_ids(embeddings, np.asarray(ids, dtype=np.int64))
+
+
+def index_source(path, embedder, state, stats, batch_size=embed_batch_size, workers=num_workers):
+    """
+    Chunk one PDF and bring the index in line with it: chunks whose content hash
+    was already indexed for this source keep their vectors, new chunks are embedded
+    in batches, and chunks that disappeared are removed.
+    Manifest entries are [content hash, chunk id, metadata or None].
+    """
+    manifest = state["manifest"]
+    old_chunks = manifest["sources"].get(path, {}).get("chunks", [])
+    reusable = defaultdict(list)
+    for entry in old_chunks:
+        reusable[entry[0]].append(entry[1])
+
+    entries = []
+    pending_ids, pending_texts = [], []
+
+    def flush():
+        if not pending_texts:
+            return
+        embeddings = embedder.encode(pending_texts, batch_size=32, convert_to_numpy=True)
+        add_vectors(state, list(pending_ids), embeddings)
+        state["passages"].add(pending_ids, pending_texts)
+        stats["embedded"] += len(pending_texts)
+        print(f"   … {stats['pages']} pages, {stats['embedded']} chunks embedded")
+        pending_ids.clear()
+        pending_texts.clear()
+
+    def counted_pages():
+        for text in iter_pages(path, workers=workers):
+            stats["pages"] += 1
+            stats["chars"] += len(text)
+            yield text
+
+    for chunk, metadata in iter_source_chunks(counted_pages(), state["chunking"]):
+        digest = chunk_hash(chunk)
+        stats["chunks"] += 1
+        stats["chunk_tokens"] += count_tokens(chunk)
+        if reusable.get(digest):
+            chunk_id = reusable[digest].pop()
+            stats["reused"] += 1
+        else:
+            chunk_id = manifest["next_id"]
+            manifest["next_id"] += 1
+            pending_ids.append(chunk_id)
+            pending_texts.append(chunk)
+            if len(pending_texts) >= batch_size:
+                flush()
+        entries.append([digest, chunk_id, metadata])
+    flush()
+
+    stale = [chunk_id for ids in reusable.values() for chunk_id in ids]
+    stats["removed"] += remove_chunks(state, stale)
+
+    stat = os.stat(path)
+    manifest["sources"][path] = {
+        "sha256": file_sha256(path),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "chunks": entries,
+    }
+
+
+def build_index(pdf_paths, embedder, folder=None, incremental=False, index_type="flat",
+                batch_size=embed_batch_size, workers=num_workers, method=None):
+    """
+    Build or update the index for a list of PDFs.
+    With incremental=True an existing build in `folder` is reused: unchanged PDFs are
+    skipped entirely, changed ones only re-embed chunks whose content hash is new,
+    and PDFs no longer listed have their vectors removed.
+    index_type is one of index_factory.INDEX_TYPES, method one of CHUNKERS (default: chunking).
+    Passage texts are written to disk as they are embedded, never all held in memory.
+    Returns (faiss_index, passages, manifest, stats); passages is a passage_store.PassageWriter
+    that save_index() commits.
+    """
+    method = method or chunking
+    dimension = embedder.get_sentence_embedding_dimension()
+    existing = load_existing(folder, dimension, index_type, method) if incremental and folder else None
+    state = {"dimension": dimension, "index_type": index_type, "chunking": method, "stale": [],
+             "train_ids": [], "train_vectors": []}
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    if existing is None:
+        state["passages"] = passage_store.PassageWriter(folder=folder)
+        state["manifest"] = new_manifest(index_type, method)
+        # Types that need no training are created up front; IVF waits for a training sample
+        state["index"] = None if index_factory.needs_training(index_type) \
+            else index_factory.make_index(index_type, dimension)
+    else:
+        state["index"], base, state["manifest"] = existing
+        state["passages"] = passage_store.PassageWriter(base, folder=folder)
+        print(f"♻️ Updating existing index with {state['index'].ntotal} vectors")
+    try:
+        faiss_index, stats = _update_sources(state, pdf_paths, embedder, batch_size, workers)
+    except BaseException:
+        state["passages"].discard()
+        raise
+    return faiss_index, state["passages"], state["manifest"], stats
+
+
+def _update_sources(state, pdf_paths, embedder, batch_size, workers):
+    # Drop sources no longer listed, index new and changed ones, then apply the removals
+    manifest = state["manifest"]
+    stats = {"pages": 0, "chars": 0, "chunks": 0, "chunk_tokens": 0, "embedded": 0,
+             "reused": 0, "removed": 0, "skipped_sources": 0}
+    wanted = [os.path.abspath(p) for p in pdf_paths]
+
+    start = time.perf_counter()
+    for path in list(manifest["sources"]):
+        if path not in wanted:
+            print(f"🗑 Removing source no longer listed: {path}")
+            ids = [entry[1] for entry in manifest["sources"].pop(path)["chunks"]]
+            stats["removed"] += remove_chunks(state, ids)
+
+    for path in wanted:
+        info = manifest["sources"].get(path)
+        if info and source_unchanged(path, info):
+            print(f"⏭ Unchanged, skipping: {path}")
+            stats["skipped_sources"] += 1
+            continue
+        print(f"📄 Indexing {path}")
+        index_source(path, embedder, state, stats, batch_size=batch_size, workers=workers)
+
+    # Train on whatever was buffered if the corpus was smaller than the training sample
+    if state["index"] is None:
+        add_vectors(state, np.empty(0, dtype=np.int64),
+                    np.empty((0, state["dimension"]), dtype=np.float32), final=True)
+    faiss_index = index_factory.remove_ids(state["index"], state["stale"], state["index_type"])
+
+    stats["seconds"] = time.perf_counter() - start
+    return faiss_index, stats
+
+
+def save_index(folder, faiss_index, passages, manifest):
+    # Write to temp files first so a crash never leaves a half-written index behind
+    os.makedirs(folder, exist_ok=True)
+    index_file = os.path.join(folder, "index.faiss")
+    manifest_file = os.path.join(folder, manifest_name)
+
+    faiss.write_index(faiss_index, index_file + ".tmp")
+    with open(manifest_file + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+
+    if isinstance(passages, passage_store.PassageWriter):
+        passages.commit(folder)
+    else:
+        passage_store.write_store(folder, passages)
+    passage_store.write_metadata(folder, {
+        entry[1]: dict(entry[2], source=path)
+        for path, info in manifest["sources"].items() for entry in info["chunks"] if entry[2]
+    })
+    # Inverted index for the lexical half of hybrid search, rebuilt from the final passages
+    start = time.perf_counter()
+    store = passage_store.PassageStore(folder)
+    lexical = bm25_index.build(store)
+    store.close()
+    lexical.save(folder)
+    print(f"🔤 BM25 index: {len(lexical)} terms, {len(lexical.docs)} postings "
+          f"in {time.perf_counter() - start:.1f}s")
+
+    os.replace(index_file + ".tmp", index_file)
+    os.replace(manifest_file + ".tmp", manifest_file)
+
+    # A stale index.pkl would no longer match the index
+    legacy_file = os.path.join(folder, passage_store.LEGACY_NAME)
+    if os.path.exists(legacy_file):
+        os.remove(legacy_file)
+
+
+def print_stats(stats):
+    seconds = max(stats["seconds"], 1e-9)
+    print(f"📊 Pages: {stats['pages']} ({stats['pages'] / seconds:.1f} pages/sec)")
+    print(f"📊 Chunks: {stats['chunks']} ({stats['chunks'] / seconds:.1f} chunks/sec, "
+          f"{stats['chunk_tokens'] / max(stats['chunks'], 1):.0f} tokens on average)")
+    print(f"📊 Embedded: {stats['embedded']}, reused: {stats['reused']}, removed: {stats['removed']}, "
+          f"unchanged sources skipped: {stats['skipped_sources']}")
+    print(f"📊 Characters: {stats['chars']}")
+    print(f"📊 Wall time: {seconds:.1f}s")
+    rss = peak_rss_mb()
+    if rss is not None:
+        print(f"📊 Peak RSS: {rss:.0f} MB")
+
 
-passages = split_text(full_text, chunk_size=chunk_size, overlap=overlap)
+def main():
+    parser = argparse.ArgumentParser(description="Build the MediBot FAISS index from one or more PDFs.")
+    parser.add_argument("pdfs", nargs="*", default=pdf_paths, help="Source PDF files")
+    parser.add_argument("--out", default=save_folder, help="Folder for index.faiss, the passage store and the manifest")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only re-embed new or changed chunks of an existing build")
+    parser.add_argument("--chunker", default=chunking, choices=CHUNKERS,
+                        help="structured = sentence/section-aware chunks with metadata; fixed = 700-character windows")
+    parser.add_argument("--embedding-backend", default=config.EMBEDDING_BACKEND, choices=embedding_backend.BACKENDS,
+                        help="torch = SentenceTransformer; onnx / onnx-int8 = ONNX Runtime (parity-checked)")
+    parser.add_argument("--index-type", default="flat", choices=index_factory.INDEX_TYPES,
+                        help="flat = exact search; ivf_flat, ivf_pq and hnsw are approximate and faster on large corpora")
+    parser.add_argument("--nlist", type=int, default=index_factory.nlist, help="IVF cells")
+    parser.add_argument("--pq-m", type=int, default=index_factory.pq_m, help="PQ sub-quantizers for ivf_pq")
+    parser.add_argument("--hnsw-m", type=int, default=index_factory.hnsw_m, help="HNSW graph degree")
+    parser.add_argument("--train-size", type=int, default=index_factory.train_size,
+                        help="Vectors used to train IVF/PQ indexes")
+    args = parser.parse_args()
+    # Progress from the library modules (index rebuilds, mmap fallbacks) is logged
+    logging.basicConfig(level=config.LOG_LEVEL, format="%(message)s")
+    index_factory.nlist, index_factory.pq_m = args.nlist, args.pq_m
+    index_factory.hnsw_m, index_factory.train_size = args.hnsw_m, args.train_size
 
-print(f"✅ Total chunks created: {len(passages)}")
+    # Load embedding model
+    print("🔵 Loading embedding model...")
+    embedder = embedding_backend.load_embedder(model_name, args.embedding_backend)
 
-# Generate embeddings
-print("🔵 Generating embeddings...")
-embeddings = embedder.encode(passages, batch_size=32, show_progress_bar=True)
+    # Read PDFs, split and embed in a streaming fashion
+    print(f"📄 Streaming {len(args.pdfs)} PDF(s) with {num_workers} extraction workers...")
+    faiss_index, passages, manifest, stats = build_index(
+        args.pdfs, embedder, folder=args.out, incremental=args.incremental, index_type=args.index_type,
+        method=args.chunker
+    )
+    print(f"✅ Total chunks in index: {faiss_index.ntotal}")
 
-# Create FAISS index
-print("🛠 Creating FAISS index...")
-dimension = embeddings.shape[1]
-faiss_index = faiss.IndexFlatL2(dimension)
-faiss_index.add(np.array(embeddings).astype(np.float32))
+    # Save FAISS index, passages and manifest
+    save_index(args.out, faiss_index, passages, manifest)
 
-# Save FAISS index
-faiss.write_index(faiss_index, os.path.join(save_folder, "index.faiss"))
+    print("✅ Successfully saved FAISS index and passages!")
+    print_stats(stats)
 
-# Save passages
-with open(os.path.join(save_folder, "index.pkl"), "wb") as f:
-    pickle.dump(passages, f)
+    print("\n🏁 DONE! Now you can load these files in your chatbot.")
 
-print("✅ Successfully saved FAISS index and passages!")
 
-print("\n🏁 DONE! Now you can load these files in your chatbot.")
+if __name__ == "__main__":
+    main()
@@ -1,83 +1,210 @@
-import pandas as pd
+# chatbot_evaluation.py
+#
+# Scores chatbot responses against reference answers with ROUGE-L, BLEU and
+# BERTScore F1. The input CSV (columns "Answer" and "Chatbot_Response") is read
+# in chunks; for each chunk ROUGE-L and BLEU run across a process pool and
+# BERTScore runs in large batches on a model loaded once. Every finished chunk
+# is written to <output>.parts/, so an interrupted run picks up where it
+# stopped when started again with the same arguments. Throughput per metric is
+# printed at the end.
+#
+#   python chatbot_evaluation.py simulated_chatbot_responses.csv --output evaluated_chatbot_responses.xlsx
+
 import os
-from rouge_score import rouge_scorer
-from bert_score import score
-from nltk.translate.bleu_score import sentence_bleu, SmoothingFunction
+import json
+import time
+import shutil
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
 
-# Load your CSV file
-csv_path = "simulated_chatbot_responses.csv"
+CSV_PATH = "simulated_chatbot_responses.csv"
+OUTPUT_FILE = "evaluated_chatbot_responses.xlsx"
+REQUIRED_COLS = {"Answer", "Chatbot_Response"}
+METRICS = ("ROUGE-L", "BLEU", "BERTScore_F1")
 
-try:
-    df = pd.read_csv(csv_path)
-    print("📁 File loaded:", csv_path)
-    print("📊 Number of rows in CSV:", len(df))
-    print("📋 Columns found:", df.columns.tolist())
-except Exception as e:
-    print("❌ Error loading file:", e)
-    exit()
-
-# Check required columns
-required_cols = {"Answer", "Chatbot_Response"}
-if not required_cols.issubset(df.columns):
-    print(f"❌ CSV is missing required columns: {required_cols - set(df.columns)}")
-    exit()
-
-# Initialize scorers
-rouge = rouge_scorer.RougeScorer(['rougeL'], use_stemmer=True)
-rouge_scores, bleu_scores, bert_f1_scores = [], [], []
-
-print("🔍 Starting evaluation...\n")
-
-# Evaluate each row
-for i in range(len(df)):
-    ref = str(df.loc[i, "Answer"])
-    hyp = str(df.loc[i, "Chatbot_Response"])
-
-    # ROUGE-L
+# Rows read, scored and checkpointed at a time
+chunk_rows = 2000
+# Sentence pairs per BERTScore forward pass
+bert_batch_size = 64
+# Rows handed to a worker process per task, to keep inter-process overhead low
+pool_chunksize = 256
+
+# Created once per worker process by _init_worker
+_rouge = None
+_smoothing = None
+
+
+def _init_worker():
+    global _rouge, _smoothing
+    from rouge_score import rouge_scorer
+    from nltk.translate.bleu_score import SmoothingFunction
+    _rouge = rouge_scorer.RougeScorer(['rougeL'], use_stemmer=True)
+    _smoothing = SmoothingFunction().method1
+
+
+def rouge_l(pair):
+    ref, hyp = pair
     try:
-        rouge_f = rouge.score(ref, hyp)['rougeL'].fmeasure
+        return round(_rouge.score(ref, hyp)['rougeL'].fmeasure, 4)
     except Exception as e:
-        print(f"❌ ROUGE error on row {i+1}: {e}")
-        rouge_f = 0.0
+        print(f"❌ ROUGE error on {hyp[:40]!r}: {e}")
+        return 0.0
+
 
-    # BLEU
+def bleu(pair):
+    from nltk.translate.bleu_score import sentence_bleu
+    ref, hyp = pair
     try:
-        bleu = sentence_bleu(
-            [ref.split()],
-            hyp.split(),
-            smoothing_function=SmoothingFunction().method1
-        )
+        return round(sentence_bleu([ref.split()], hyp.split(), smoothing_function=_smoothing), 4)
     except Exception as e:
-        print(f"❌ BLEU error on row {i+1}: {e}")
-        bleu = 0.0
+        print(f"❌ BLEU error on {hyp[:40]!r}: {e}")
+        return 0.0
+
+
+class BertScoreBatcher:
+    """
+    BERTScore with the model loaded once and scored in batches of bert_batch_size.
+    """
+
+    def __init__(self, model_type=None, batch_size=bert_batch_size):
+        from bert_score import BERTScorer
+        options = {"lang": "en"}
+        if model_type:
+            # Models outside bert_score's own table use their last layer
+            from transformers import AutoConfig
+            options = {"model_type": model_type,
+                       "num_layers": AutoConfig.from_pretrained(model_type).num_hidden_layers}
+        self.scorer = BERTScorer(batch_size=batch_size, **options)
+
+    def f1(self, refs, hyps):
+        try:
+            _, _, f1 = self.scorer.score(hyps, refs, verbose=False)
+            return [round(value, 4) for value in f1.tolist()]
+        except Exception as e:
+            # Fall back to row by row so one bad pair does not zero the whole chunk
+            print(f"❌ BERTScore batch error ({e}), scoring rows individually")
+            return [self._single(ref, hyp) for ref, hyp in zip(refs, hyps)]
+
+    def _single(self, ref, hyp):
+        try:
+            _, _, f1 = self.scorer.score([hyp], [ref], verbose=False)
+            return round(f1[0].item(), 4)
+        except Exception as e:
+            print(f"❌ BERTScore error on {hyp[:40]!r}: {e}")
+            return 0.0
+
+
+def source_fingerprint(csv_path, rows_per_chunk):
+    stat = os.stat(csv_path)
+    return {"source": os.path.abspath(csv_path), "size": stat.st_size, "mtime": stat.st_mtime,
+            "chunk_rows": rows_per_chunk}
+
+
+def open_checkpoint(parts_dir, fingerprint):
+    """
+    Chunk numbers already scored for this input. Parts from a different input or
+    chunk size are discarded.
+    """
+    meta_path = os.path.join(parts_dir, "progress.json")
+    if os.path.exists(meta_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            if json.load(f) == fingerprint:
+                return {int(name[5:10]) for name in os.listdir(parts_dir)
+                        if name.startswith("part-") and name.endswith(".csv")}
+        print("⚠️ Input or chunk size changed since the last run, starting over.")
+        shutil.rmtree(parts_dir)
+    os.makedirs(parts_dir, exist_ok=True)
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(fingerprint, f)
+    return set()
+
+
+def part_path(parts_dir, number):
+    return os.path.join(parts_dir, f"part-{number:05d}.csv")
+
+
+def evaluate(csv_path=CSV_PATH, output_file=OUTPUT_FILE, workers=None, bert_model=None, rows_per_chunk=None):
+    rows_per_chunk = rows_per_chunk or chunk_rows
+    columns = pd.read_csv(csv_path, nrows=0).columns
+    print("📁 File loaded:", csv_path)
+    print("📋 Columns found:", columns.tolist())
+    if not REQUIRED_COLS.issubset(columns):
+        raise ValueError(f"CSV is missing required columns: {REQUIRED_COLS - set(columns)}")
+
+    parts_dir = output_file + ".parts"
+    done = open_checkpoint(parts_dir, source_fingerprint(csv_path, rows_per_chunk))
+    if done:
+        print(f"♻️ Resuming: {len(done)} chunks already scored")
+
+    seconds = dict.fromkeys(METRICS, 0.0)
+    scored = 0
+    bert = None
+    print("🔍 Starting evaluation...\n")
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        for number, chunk in enumerate(pd.read_csv(csv_path, chunksize=rows_per_chunk)):
+            if number in done:
+                continue
+            refs = [str(value) for value in chunk["Answer"]]
+            hyps = [str(value) for value in chunk["Chatbot_Response"]]
+            pairs = list(zip(refs, hyps))
+
+            start = time.perf_counter()
+            chunk["ROUGE-L"] = list(pool.map(rouge_l, pairs, chunksize=pool_chunksize))
+            seconds["ROUGE-L"] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            chunk["BLEU"] = list(pool.map(bleu, pairs, chunksize=pool_chunksize))
+            seconds["BLEU"] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            bert = bert or BertScoreBatcher(bert_model)
+            chunk["BERTScore_F1"] = bert.f1(refs, hyps)
+            seconds["BERTScore_F1"] += time.perf_counter() - start
+
+            path = part_path(parts_dir, number)
+            chunk.to_csv(path + ".tmp", index=False)
+            os.replace(path + ".tmp", path)
+            scored += len(chunk)
+            print(f"✅ Evaluated chunk {number + 1} (rows {chunk.index[0] + 1}-{chunk.index[-1] + 1})")
+
+    parts = sorted(name for name in os.listdir(parts_dir) if name.startswith("part-") and name.endswith(".csv"))
+    df = pd.concat((pd.read_csv(os.path.join(parts_dir, name)) for name in parts), ignore_index=True)
+    if output_file.endswith(".csv"):
+        df.to_csv(output_file, index=False)
+    else:
+        df.to_excel(output_file, index=False)
+    shutil.rmtree(parts_dir)
+
+    print(f"\n📊 Rows evaluated: {len(df)} ({scored} this run)")
+    for metric in METRICS:
+        if scored:
+            print(f"⏱ {metric:<13} {scored / max(seconds[metric], 1e-9):>9.1f} rows/sec")
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score chatbot responses with ROUGE-L, BLEU and BERTScore.")
+    parser.add_argument("csv_path", nargs="?", default=CSV_PATH, help="CSV with Answer and Chatbot_Response columns")
+    parser.add_argument("--output", default=OUTPUT_FILE, help="Output .xlsx or .csv file")
+    parser.add_argument("--workers", type=int, default=None, help="ROUGE/BLEU processes (default: CPU count)")
+    parser.add_argument("--chunk-rows", type=int, default=chunk_rows, help="Rows scored per checkpoint")
+    parser.add_argument("--bert-model", default=None, help="BERTScore model (default: the English default)")
+    args = parser.parse_args()
 
-    # BERTScore
     try:
-        _, _, f1 = score([hyp], [ref], lang="en", verbose=False)
-        bert_f1 = f1[0].item()
-    except Exception as e:
-        print(f"❌ BERTScore error on row {i+1}: {e}")
-        bert_f1 = 0.0
-
-    # Store results
-    rouge_scores.append(round(rouge_f, 4))
-    bleu_scores.append(round(bleu, 4))
-    bert_f1_scores.append(round(bert_f1, 4))
-
-    print(f"✅ Evaluated row {i+1}/{len(df)}")
-
-# Add metrics to DataFrame
-df["ROUGE-L"] = rouge_scores
-df["BLEU"] = bleu_scores
-df["BERTScore_F1"] = bert_f1_scores
-
-# Save evaluated results
-output_file = "evaluated_chatbot_responses.xlsx"
-df.to_excel(output_file, index=False)
-
-# Confirm save location
-full_path = os.path.abspath(output_file)
-if os.path.exists(output_file):
-    print(f"\n✅ Evaluation complete. File saved at:\n{full_path}")
-else:
-    print("❌ File was not saved.")
+        evaluate(args.csv_path, args.output, workers=args.workers, bert_model=args.bert_model,
+                 rows_per_chunk=args.chunk_rows)
+    except (OSError, ValueError) as e:
+        print("❌", e)
+        raise SystemExit(1)
+
+    full_path = os.path.abspath(args.output)
+    if os.path.exists(args.output):
+        print(f"\n✅ Evaluation complete. File saved at:\n{full_path}")
+    else:
+        print("❌ File was not saved.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+# chunker.py
+#
+# Structure-aware chunking for build_rag_database_from_pdf.py. Instead of
+# fixed 700-character windows, text is cut at sentence ends and packed into
+# chunks of about `target_tokens`, with encyclopedia structure respected:
+#   - a new entry (a short title line followed by "Definition") always starts a new chunk
+#   - section headings ("Causes and symptoms", "Treatment", ...) and paragraph
+#     ends start a new chunk once the current one is reasonably full
+#   - running page headers/footers and page numbers are dropped, and words
+#     hyphenated across line breaks are rejoined
+# Each chunk is prefixed with its entry title and section so it can be
+# understood (and embedded) on its own, and carries metadata: page range,
+# title, section and character offsets in the source's page stream (the same
+# coordinates as the concatenated page texts).
+#
+# Works on a stream of pages and only buffers the paragraph and chunk being built.
+
+import re
+from tokens import count_tokens
+
+# Target and hard maximum chunk length in estimated tokens (MiniLM reads up to 256 word pieces)
+target_tokens = 180
+max_tokens = 250
+
+# Fraction of target_tokens a chunk must reach before a section or paragraph end closes it
+min_fill = 0.6
+
+SECTION_HEADINGS = {
+    "definition", "description", "demographics", "causes and symptoms", "causes & symptoms",
+    "diagnosis", "treatment", "alternative treatment", "prognosis", "prevention", "resources",
+    "key terms", "purpose", "precautions", "preparation", "aftercare", "risks",
+    "normal results", "abnormal results", "side effects", "interactions",
+}
+
+boilerplate = re.compile(r"^(\d{1,4}|GALE ENCYCLOPEDIA OF MEDICINE.*)$", re.IGNORECASE)
+sentence_end = re.compile(r'(?<=[.!?])["\')\]]?\s+(?=["\'(\[]?[A-Z0-9])')
+
+
+class Chunk:
+    """
+    One chunk of text and where it came from.
+    """
+
+    __slots__ = ("text", "page", "end_page", "title", "section", "start", "end")
+
+    def __init__(self, text, page, end_page, title, section, start, end):
+        self.text = text
+        self.page = page
+        self.end_page = end_page
+        self.title = title
+        self.section = section
+        self.start = start
+        self.end = end
+
+    def metadata(self):
+        return {"page": self.page, "end_page": self.end_page, "title": self.title,
+                "section": self.section, "start": self.start, "end": self.end}
+
+
+def is_section_heading(line):
+    return line.strip().rstrip(":").lower() in SECTION_HEADINGS
+
+
+def is_title_candidate(line):
+    # Short capitalized line without closing punctuation, e.g. an entry title "Acne"
+    line = line.strip()
+    return 0 < len(line) <= 70 and line[0].isupper() and line[-1] not in ".,;:!?" and not is_section_heading(line)
+
+
+def iter_lines(pages):
+    """
+    (page number, raw offset, line) for every line, with offsets into the concatenated page texts.
+    pages: iterable of page texts, first page is 1.
+    """
+    offset = 0
+    for page_number, text in enumerate(pages, start=1):
+        position = 0
+        for line in text.split("\n"):
+            yield page_number, offset + position, line
+            position += len(line) + 1
+        offset += len(text)
+
+
+class _Paragraph:
+    # Text joined from PDF lines, with the raw offset of every character kept for chunk offsets
+
+    def __init__(self):
+        self.text = []
+        self.offsets = []
+        self.pages = []
+
+    def add_line(self, page, offset, line):
+        stripped = line.strip()
+        lead = len(line) - len(line.lstrip())
+        if self.text:
+            if self.text[-1] == "-" and stripped[:1].islower():
+                # "inflam-" + "mation" -> "inflammation"
+                self.text.pop()
+                self.offsets.pop()
+                self.pages.pop()
+            else:
+                self.text.append(" ")
+                self.offsets.append(offset)
+                self.pages.append(page)
+        self.text.extend(stripped)
+        self.offsets.extend(range(offset + lead, offset + lead + len(stripped)))
+        self.pages.extend([page] * len(stripped))
+
+    def __bool__(self):
+        return bool(self.text)
+
+    def sentences(self):
+        """
+        (text, first page, last page, raw start, raw end) per sentence.
+        """
+        text = "".join(self.text)
+        start = 0
+        for match in list(sentence_end.finditer(text)) + [None]:
+            end = match.start() + len(match.group().rstrip()) if match else len(text)
+            sentence = text[start:end].strip()
+            if sentence:
+                first = start + (len(text[start:end]) - len(text[start:end].lstrip()))
+                last = first + len(sentence) - 1
+                yield sentence, self.pages[first], self.pages[last], self.offsets[first], self.offsets[last] + 1
+            start = match.end() if match else len(text)
+
+
+def split_long(sentence, limit):
+    # A "sentence" longer than the hard limit (tables, lists) is cut at word boundaries
+    words, piece = sentence.split(" "), []
+    for word in words:
+        if piece and count_tokens(" ".join(piece + [word])) > limit:
+            yield " ".join(piece)
+            piece = []
+        piece.append(word)
+    if piece:
+        yield " ".join(piece)
+
+
+class StructuredChunker:
+    """
+    Packs sentences into chunks; feed it pages with chunks(pages).
+    """
+
+    def __init__(self, target=None, limit=None):
+        self.target = target or target_tokens
+        self.limit = limit or max_tokens
+        self.title = None
+        self.section = None
+        self._reset()
+
+    def _reset(self):
+        self.sentences = []  # (text, first page, last page, start, end)
+        self.tokens = 0
+        self.chunk_section = None  # section of the first sentence; small sections share a chunk
+
+    def _emit(self):
+        if not self.sentences:
+            return None
+        body = " ".join(s[0] for s in self.sentences)
+        title, section = self.title, self.chunk_section
+        heading = f"{title} ({section})" if title and section else title or section
+        chunk = Chunk(f"{heading}\n{body}" if heading else body,
+                      self.sentences[0][1], self.sentences[-1][2], title, section,
+                      self.sentences[0][3], self.sentences[-1][4])
+        self._reset()
+        return chunk
+
+    def _add_sentence(self, sentence):
+        text, first_page, last_page, start, end = sentence
+        out = []
+        pieces = [text] if count_tokens(text) <= self.limit else list(split_long(text, self.limit))
+        for piece in pieces:
+            tokens = count_tokens(piece) + 1
+            if self.sentences and self.tokens + tokens > self.target:
+                out.append(self._emit())
+            if not self.sentences:
+                self.chunk_section = self.section
+            self.sentences.append((piece, first_page, last_page, start, end))
+            self.tokens += tokens
+        return out
+
+    def _boundary(self, hard):
+        # A new entry always closes the chunk; sections and paragraphs only once it is full enough
+        if hard or self.tokens >= self.target * min_fill:
+            chunk = self._emit()
+            return [chunk] if chunk else []
+        return []
+
+    def _paragraph(self, paragraph):
+        out = []
+        for sentence in paragraph.sentences():
+            out.extend(self._add_sentence(sentence))
+        return out
+
+    def chunks(self, pages):
+        """
+        Yield Chunk objects from an iterable of page texts.
+        """
+        paragraph = _Paragraph()
+        pending_title = None  # (page, offset, line) held back until we know whether "Definition" follows
+        previous_line = ""
+
+        for page, offset, line in iter_lines(pages):
+            stripped = line.strip()
+            if not stripped or boilerplate.match(stripped):
+                continue
+
+            if pending_title is not None:
+                title_page, title_offset, title_line = pending_title
+                pending_title = None
+                if stripped.rstrip(":").lower() == "definition":
+                    yield from self._paragraph(paragraph)
+                    paragraph = _Paragraph()
+                    yield from self._boundary(hard=True)
+                    self.title, self.section = title_line.strip(), None
+                else:
+                    paragraph.add_line(title_page, title_offset, title_line)
+
+            if is_section_heading(stripped):
+                yield from self._paragraph(paragraph)
+                paragraph = _Paragraph()
+                yield from self._boundary(hard=False)
+                self.section = stripped.rstrip(":")
+            elif is_title_candidate(stripped) and (not previous_line or previous_line[-1] in ".!?:"
+                                                  or is_section_heading(previous_line)):
+                if paragraph:
+                    yield from self._paragraph(paragraph)
+                    paragraph = _Paragraph()
+                    yield from self._boundary(hard=False)
+                pending_title = (page, offset, line)
+            else:
+                paragraph.add_line(page, offset, line)
+                if stripped[-1] in ".!?" and len(stripped) < 40:
+                    # A short line ending a sentence is most likely the last line of a paragraph
+                    yield from self._paragraph(paragraph)
+                    paragraph = _Paragraph()
+                    yield from self._boundary(hard=False)
+            previous_line = stripped
+
+        if pending_title is not None:
+            paragraph.add_line(*pending_title)
+        yield from self._paragraph(paragraph)
+        chunk = self._emit()
+        if chunk:
+            yield chunk
+
+
+def iter_structured_chunks(pages, target=None, limit=None):
+    return StructuredChunker(target, limit).chunks(pages)
@@ -0,0 +1,146 @@
+# config.py
+#
+# Paths and retrieval settings shared by the index builder and the app.
+# Every value can be overridden with an environment variable (or the .env file).
+
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Folder holding index.faiss, the passage store and manifest.json
+DB_FOLDER = os.environ.get("MEDIBOT_DB_FOLDER", os.path.join(BASE_DIR, "db_faiss"))
+
+# Source PDF(s) for build_rag_database_from_pdf.py, separated by os.pathsep (";" on Windows, ":" elsewhere)
+PDF_PATHS = os.environ.get(
+    "MEDIBOT_PDF_PATHS",
+    os.path.join(BASE_DIR, "data", "The_GALE_ENCYCLOPEDIA_of_MEDICINE_SECOND.pdf"),
+).split(os.pathsep)
+
+EMBEDDING_MODEL = os.environ.get("MEDIBOT_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+
+# Retrieval
+TOP_K = int(os.environ.get("MEDIBOT_TOP_K", "3"))
+NPROBE = int(os.environ.get("MEDIBOT_NPROBE", "16"))
+EF_SEARCH = int(os.environ.get("MEDIBOT_EF_SEARCH", "64"))
+MMAP_INDEX = os.environ.get("MEDIBOT_MMAP_INDEX", "1") != "0"
+
+# Concurrent retrieve_context() calls arriving within this window are encoded and
+# searched as one batch (0 disables micro-batching)
+BATCH_WINDOW_MS = float(os.environ.get("MEDIBOT_BATCH_WINDOW_MS", "3"))
+BATCH_MAX_SIZE = int(os.environ.get("MEDIBOT_BATCH_MAX_SIZE", "32"))
+
+# Retrieval caches (entries; TTL in seconds). The index file is re-checked every
+# INDEX_CHECK_INTERVAL seconds and a rebuild clears cached results.
+EMBEDDING_CACHE_SIZE = int(os.environ.get("MEDIBOT_EMBEDDING_CACHE_SIZE", "4096"))
+RESULT_CACHE_SIZE = int(os.environ.get("MEDIBOT_RESULT_CACHE_SIZE", "4096"))
+CACHE_TTL = float(os.environ.get("MEDIBOT_CACHE_TTL", "3600"))
+INDEX_CHECK_INTERVAL = float(os.environ.get("MEDIBOT_INDEX_CHECK_INTERVAL", "5"))
+
+# Semantic cache of LLM answers for text-only consultations (opt-in)
+SEMANTIC_CACHE_ENABLED = os.environ.get("MEDIBOT_SEMANTIC_CACHE", "0") == "1"
+SEMANTIC_CACHE_DIR = os.environ.get("MEDIBOT_SEMANTIC_CACHE_DIR", os.path.join(BASE_DIR, "semantic_cache"))
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("MEDIBOT_SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_SIZE = int(os.environ.get("MEDIBOT_SEMANTIC_CACHE_SIZE", "1000"))
+SEMANTIC_CACHE_TTL = float(os.environ.get("MEDIBOT_SEMANTIC_CACHE_TTL", "86400"))
+# Journal records (new entries, evictions) written before the cache is snapshotted in the background
+SEMANTIC_CACHE_COMPACT_EVERY = int(os.environ.get("MEDIBOT_SEMANTIC_CACHE_COMPACT_EVERY", "100"))
+
+# Groq API access (see groq_client.py). Quotas are per minute and shared by all sessions.
+GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
+GROQ_BASE_URL = os.environ.get("GROQ_BASE_URL")  # e.g. a local mock server; default is the public API
+GROQ_TIMEOUT = float(os.environ.get("MEDIBOT_GROQ_TIMEOUT", "60"))
+GROQ_CONNECT_TIMEOUT = float(os.environ.get("MEDIBOT_GROQ_CONNECT_TIMEOUT", "5"))
+GROQ_MAX_CONNECTIONS = int(os.environ.get("MEDIBOT_GROQ_MAX_CONNECTIONS", "20"))
+GROQ_MAX_RETRIES = int(os.environ.get("MEDIBOT_GROQ_MAX_RETRIES", "4"))
+GROQ_BASE_BACKOFF = float(os.environ.get("MEDIBOT_GROQ_BASE_BACKOFF", "0.5"))
+GROQ_MAX_BACKOFF = float(os.environ.get("MEDIBOT_GROQ_MAX_BACKOFF", "20"))
+GROQ_REQUESTS_PER_MINUTE = int(os.environ.get("MEDIBOT_GROQ_RPM", "30"))
+GROQ_TOKENS_PER_MINUTE = int(os.environ.get("MEDIBOT_GROQ_TPM", "30000"))
+GROQ_EXPECTED_COMPLETION_TOKENS = int(os.environ.get("MEDIBOT_GROQ_EXPECTED_COMPLETION_TOKENS", "600"))
+
+# Per-session consultation state (see session_store.py) and server concurrency.
+# QUEUE_CONCURRENCY is how many consultations Gradio runs at the same time.
+MAX_HISTORY_TURNS = int(os.environ.get("MEDIBOT_MAX_HISTORY_TURNS", "10"))
+MAX_LOG_ENTRIES = int(os.environ.get("MEDIBOT_MAX_LOG_ENTRIES", "200"))
+SESSION_IDLE_TIMEOUT = float(os.environ.get("MEDIBOT_SESSION_IDLE_TIMEOUT", "1800"))
+MAX_SESSIONS = int(os.environ.get("MEDIBOT_MAX_SESSIONS", "1000"))
+QUEUE_CONCURRENCY = int(os.environ.get("MEDIBOT_QUEUE_CONCURRENCY", "16"))
+
+# Prompt assembly (see prompt_builder.py): tokens per prompt including chat history,
+# estimated at ~4 characters per token (not the LLM tokenizer's count), and the
+# cosine similarity below which retrieved passages are dropped.
+PROMPT_TOKEN_BUDGET = int(os.environ.get("MEDIBOT_PROMPT_TOKEN_BUDGET", "1500"))
+MIN_PASSAGE_SCORE = float(os.environ.get("MEDIBOT_MIN_PASSAGE_SCORE", "0.25"))
+
+# Hybrid retrieval: BM25 (bm25_index.py) fused with dense search by reciprocal rank
+# fusion. Each search contributes HYBRID_CANDIDATES results to the fusion.
+HYBRID_SEARCH = os.environ.get("MEDIBOT_HYBRID", "1") == "1"
+HYBRID_CANDIDATES = int(os.environ.get("MEDIBOT_HYBRID_CANDIDATES", "20"))
+RRF_K = int(os.environ.get("MEDIBOT_RRF_K", "60"))
+
+# Cross-encoder reranking (opt-in, see reranker.py). RERANK_CANDIDATES are fetched
+# and reordered; skipped when the top dense score leads by RERANK_MARGIN, and the
+# depth is cut to what fits in RERANK_BUDGET_MS. Backend: torch, int8 or onnx.
+RERANK_ENABLED = os.environ.get("MEDIBOT_RERANK", "0") == "1"
+RERANK_MODEL = os.environ.get("MEDIBOT_RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_BACKEND = os.environ.get("MEDIBOT_RERANK_BACKEND", "int8")
+RERANK_CANDIDATES = int(os.environ.get("MEDIBOT_RERANK_CANDIDATES", "20"))
+RERANK_MARGIN = float(os.environ.get("MEDIBOT_RERANK_MARGIN", "0.1"))
+RERANK_BUDGET_MS = float(os.environ.get("MEDIBOT_RERANK_BUDGET_MS", "150"))
+RERANK_MAX_LENGTH = int(os.environ.get("MEDIBOT_RERANK_MAX_LENGTH", "256"))
+
+# Where exported/converted models (ONNX files) are kept
+MODEL_CACHE_DIR = os.environ.get("MEDIBOT_MODEL_CACHE_DIR", os.path.join(BASE_DIR, "model_cache"))
+
+# Sentence-embedding backend (see embedding_backend.py): torch, onnx or onnx-int8.
+# ONNX models must reach EMBEDDING_PARITY_MIN cosine similarity with the torch model.
+# EMBEDDING_THREADS sets ONNX Runtime's intra-op threads (0 = one per core).
+EMBEDDING_BACKEND = os.environ.get("MEDIBOT_EMBEDDING_BACKEND", "torch")
+EMBEDDING_THREADS = int(os.environ.get("MEDIBOT_EMBEDDING_THREADS", "0"))
+EMBEDDING_PARITY_MIN = float(os.environ.get("MEDIBOT_EMBEDDING_PARITY_MIN", "0.99"))
+
+# Uploaded images (see image_preprocessing.py): longest side in pixels after
+# downscaling, output format (JPEG or WEBP) and quality, and how many prepared
+# images are cached by content hash.
+IMAGE_MAX_SIDE = int(os.environ.get("MEDIBOT_IMAGE_MAX_SIDE", "1024"))
+IMAGE_FORMAT = os.environ.get("MEDIBOT_IMAGE_FORMAT", "JPEG")
+IMAGE_QUALITY = int(os.environ.get("MEDIBOT_IMAGE_QUALITY", "85"))
+IMAGE_CACHE_SIZE = int(os.environ.get("MEDIBOT_IMAGE_CACHE_SIZE", "64"))
+
+# Recorded speech (see audio_frontend.py): recordings longer than this are split at
+# pauses and the segments transcribed concurrently; uploads are FLAC (needs the
+# optional soundfile package, otherwise WAV) or WAV.
+AUDIO_MAX_SEGMENT_SECONDS = float(os.environ.get("MEDIBOT_AUDIO_MAX_SEGMENT_SECONDS", "30"))
+AUDIO_UPLOAD_FORMAT = os.environ.get("MEDIBOT_AUDIO_UPLOAD_FORMAT", "flac")
+
+# Doctor's voice (see tts_service.py): engine (gtts, pyttsx3 for offline speech, or
+# tone for tests), where synthesized sentence clips are cached and how large that
+# cache may grow, and how long per-request audio files are kept before removal.
+TTS_ENGINE = os.environ.get("MEDIBOT_TTS_ENGINE", "gtts")
+TTS_CACHE_DIR = os.environ.get("MEDIBOT_TTS_CACHE_DIR", os.path.join(BASE_DIR, "tts_cache"))
+TTS_CACHE_MAX_MB = float(os.environ.get("MEDIBOT_TTS_CACHE_MAX_MB", "200"))
+TTS_OUTPUT_TTL = float(os.environ.get("MEDIBOT_TTS_OUTPUT_TTL", "900"))
+
+# Emergency triage of the patient's query before the LLM call (see emergency_triage.py).
+# Besides exact red-flag terms, clauses whose embedding reaches EMERGENCY_THRESHOLD
+# cosine similarity to a red-flag description are urgent (MEDIBOT_EMERGENCY_SEMANTIC=0
+# keeps only the term match).
+EMERGENCY_SEMANTIC = os.environ.get("MEDIBOT_EMERGENCY_SEMANTIC", "1") == "1"
+EMERGENCY_THRESHOLD = float(os.environ.get("MEDIBOT_EMERGENCY_THRESHOLD", "0.62"))
+
+# Observability (see telemetry.py). With METRICS_ENABLED (opt-in) the app is served by uvicorn
+# with /metrics (Prometheus) and /traces next to the Gradio UI on SERVER_NAME:SERVER_PORT;
+# TRACE_BUFFER recent request traces are kept. PROFILER_ENDPOINTS adds /profiler/start
+# and /profiler/stop, sampling stacks every PROFILE_INTERVAL_MS. LOG_LEVEL=DEBUG also
+# logs prompts, retrieved context and traces.
+LOG_LEVEL = os.environ.get("MEDIBOT_LOG_LEVEL", "INFO").upper()
+METRICS_ENABLED = os.environ.get("MEDIBOT_METRICS", "0") == "1"
+SERVER_NAME = os.environ.get("MEDIBOT_SERVER_NAME", "127.0.0.1")
+SERVER_PORT = int(os.environ.get("MEDIBOT_SERVER_PORT", "7860"))
+TRACE_BUFFER = int(os.environ.get("MEDIBOT_TRACE_BUFFER", "200"))
+PROFILER_ENDPOINTS = os.environ.get("MEDIBOT_PROFILER_ENDPOINTS", "0") == "1"
+PROFILE_INTERVAL_MS = float(os.environ.get("MEDIBOT_PROFILE_INTERVAL_MS", "10"))
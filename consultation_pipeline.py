@@ -0,0 +1,141 @@
+# consultation_pipeline.py
+#
+# Asyncio helpers for the consultation flow in gradio_app.py: per-stage timing
+# (so overlapping stages show up as a shorter critical path) and streaming of
+# LLM tokens into the UI with speech synthesized sentence by sentence.
+
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+import telemetry
+from voice_of_the_doctor import synthesize_speech, clean_for_speech
+from tts_service import SENTENCE_BOUNDARY
+
+logger = logging.getLogger(__name__)
+
+# Concurrent TTS requests per response
+tts_concurrency = 4
+
+# Minimum seconds between textbox updates while tokens stream in
+text_update_interval = 0.05
+
+
+class StageTimer:
+    """
+    Records when each named stage of one request starts and ends.
+    Stages that ran concurrently overlap, so `total` is shorter than the sum of stages.
+    Stages are also spans of the request's telemetry trace.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.trace = telemetry.start_trace(name)
+        self.start = self.trace.start
+        self.stages = []  # (stage, start offset, end offset) in seconds
+        self.marks = {}   # event -> offset in seconds, e.g. first_token, first_audio
+
+    @asynccontextmanager
+    async def stage(self, stage_name):
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.stages.append((stage_name, begin - self.start, end - self.start))
+            telemetry.record_span(stage_name, begin, end, traces=[self.trace])
+
+    def mark(self, event):
+        # Only the first occurrence of an event is recorded
+        self.marks.setdefault(event, time.perf_counter() - self.start)
+
+    def durations(self):
+        return {stage: end - begin for stage, begin, end in self.stages}
+
+    def report(self):
+        if "llm_start" in self.marks and "last_token" in self.marks:
+            telemetry.record_span("llm", self.start + self.marks["llm_start"], self.start + self.marks["last_token"],
+                                  traces=[self.trace])
+        self.trace.annotate(**{f"{event}_ms": round(offset * 1000, 2) for event, offset in self.marks.items()})
+        telemetry.finish_trace(self.trace)
+        total = time.perf_counter() - self.start
+        stage_sum = sum(self.durations().values())
+        parts = [f"{stage} {begin:.2f}→{end:.2f}s" for stage, begin, end in self.stages]
+        parts += [f"{event} at {offset:.2f}s" for event, offset in self.marks.items()]
+        parts.append(f"total {total:.2f}s (stages sum {stage_sum:.2f}s)")
+        logger.info(f"⏱ {self.name}: " + " | ".join(parts))
+        return total
+
+
+class SentenceBuffer:
+    """
+    Collects streamed tokens and hands back each sentence once it is complete.
+    """
+
+    boundary = SENTENCE_BOUNDARY  # the same split the TTS clip cache uses
+
+    def __init__(self):
+        self.text = ""
+
+    def feed(self, token):
+        self.text += token
+        matches = list(self.boundary.finditer(self.text))
+        if not matches:
+            return []
+        cut = matches[-1].end()
+        complete, self.text = self.text[:cut], self.text[cut:]
+        return [p.strip() for p in self.boundary.split(complete) if p.strip()]
+
+    def flush(self):
+        rest, self.text = self.text.strip(), ""
+        return rest
+
+
+async def single_chunk(text):
+    # Wrap an already complete reply (e.g. from the semantic cache) as a token stream
+    yield text
+
+
+async def stream_with_speech(tokens, timer):
+    """
+    Consume an async stream of LLM tokens and yield events in display order:
+      ("text", reply_so_far)  throttled to text_update_interval, always sent at the end
+      ("audio", audio_bytes)  one per sentence, in order
+    Each sentence starts synthesizing as soon as it is complete, while tokens keep arriving.
+    Marks first_token, last_token and first_audio on the timer.
+    """
+    semaphore = asyncio.Semaphore(tts_concurrency)
+    sentences = SentenceBuffer()
+    pending = deque()
+    reply = ""
+    last_text_update = 0.0
+
+    async def synthesize(sentence):
+        async with semaphore:
+            with telemetry.span("tts", chars=len(sentence)):
+                return await asyncio.to_thread(synthesize_speech, sentence)
+
+    def speak(sentence):
+        if clean_for_speech(sentence):
+            pending.append(asyncio.create_task(synthesize(sentence)))
+
+    async for token in tokens:
+        timer.mark("first_token")
+        reply += token
+        for sentence in sentences.feed(token):
+            speak(sentence)
+        if time.perf_counter() - last_text_update >= text_update_interval:
+            last_text_update = time.perf_counter()
+            yield "text", reply
+        while pending and pending[0].done():
+            timer.mark("first_audio")
+            yield "audio", pending.popleft().result()
+
+    timer.mark("last_token")
+    speak(sentences.flush())
+    yield "text", reply
+    while pending:
+        audio = await pending.popleft()
+        timer.mark("first_audio")
+        yield "audio", audio
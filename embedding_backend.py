@@ -0,0 +1,236 @@
+# embedding_backend.py
+#
+# Pluggable sentence-embedding backends for the build and the retriever
+# (MEDIBOT_EMBEDDING_BACKEND):
+#   torch      SentenceTransformer in PyTorch fp32 (the reference)
+#   onnx       the same model exported to ONNX, run with ONNX Runtime
+#   onnx-int8  the ONNX model with dynamic int8 quantization (smallest, fastest on CPU)
+# The ONNX files, the tokenizer and a parity record live in
+# MODEL_CACHE_DIR/<model>/. Conversion happens once, and before a converted
+# model is used its embeddings are compared with the reference model (cosine
+# similarity on sample medical sentences); below EMBEDDING_PARITY_MIN the
+# backend falls back to torch. At serve time the ONNX backends need only
+# onnxruntime and tokenizers, not torch.
+#
+# Convert, verify and compare encode latency:
+#   python embedding_backend.py --backend onnx-int8
+
+import os
+import json
+import time
+import logging
+import argparse
+import numpy as np
+import config
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+PARITY_NAME = "parity.json"
+
+# MiniLM's maximum sequence length in word pieces
+max_seq_length = 256
+
+PARITY_TEXTS = [
+    "headache and fever for three days",
+    "Chest pain that spreads to the left arm can be a sign of a heart attack.",
+    "Metformin is commonly prescribed for type 2 diabetes.",
+    "itchy red rash on both arms after gardening",
+    "Tuberculosis is caused by Mycobacterium tuberculosis and spreads through the air.",
+    "Iron deficiency anemia is treated with iron supplements and dietary changes.",
+    "persistent dry cough for two weeks, worse at night",
+    "Acne occurs when hair follicles become clogged with oil and dead skin cells.",
+]
+
+
+def model_dir(model_name):
+    return os.path.join(config.MODEL_CACHE_DIR, model_name.replace("/", "__"))
+
+
+def onnx_file(model_name, backend):
+    return os.path.join(model_dir(model_name), "model.int8.onnx" if backend == "onnx-int8" else "model.onnx")
+
+
+class OnnxEmbedder:
+    """
+    Drop-in for the parts of SentenceTransformer the repo uses: encode() and
+    get_sentence_embedding_dimension(). Mean pooling and L2 normalization match all-MiniLM-L6-v2.
+    """
+
+    def __init__(self, model_name, backend="onnx-int8", threads=None):
+        import onnxruntime
+        from tokenizers import Tokenizer
+        folder = model_dir(model_name)
+        self.tokenizer = Tokenizer.from_file(os.path.join(folder, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_seq_length)
+        self.tokenizer.enable_padding()
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        threads = config.EMBEDDING_THREADS if threads is None else threads
+        if threads:
+            options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(onnx_file(model_name, backend), options,
+                                                    providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.dimension = self.session.get_outputs()[0].shape[-1]
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        out = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        # Sorting by length keeps padding, and therefore wasted compute, low within each batch
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            encodings = self.tokenizer.encode_batch([texts[i] for i in batch])
+            ids = np.array([e.ids for e in encodings], dtype=np.int64)
+            mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            feeds = {"input_ids": ids, "attention_mask": mask, "token_type_ids": np.zeros_like(ids)}
+            hidden = self.session.run(None, {k: v for k, v in feeds.items() if k in self.input_names})[0]
+            weights = mask[:, :, None].astype(np.float32)
+            pooled = (hidden * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+            out[batch] = pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+        return out[0] if single else out
+
+
+def export(model_name, reference=None):
+    """
+    Export the model to ONNX (fp32 and dynamic int8) with its tokenizer, then record parity.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    reference = reference or SentenceTransformer(model_name, device="cpu")
+    folder = model_dir(model_name)
+    os.makedirs(folder, exist_ok=True)
+    reference.tokenizer.save_pretrained(folder)
+
+    transformer = reference[0].auto_model.eval()
+    sample = reference.tokenizer(["export"], return_tensors="pt")
+    names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    fp32_path = onnx_file(model_name, "onnx")
+    logger.info(f"📦 Exporting {model_name} to {fp32_path}")
+    # Exported in place: newer exporters keep the weights in a "<file>.data" sidecar named
+    # after the output file. parity.json, written last, marks a finished conversion.
+    torch.onnx.export(transformer, tuple(sample[name] for name in names), fp32_path,
+                      input_names=names, output_names=["last_hidden_state"],
+                      dynamic_axes={**{name: {0: "batch", 1: "sequence"} for name in names},
+                                    "last_hidden_state": {0: "batch", 1: "sequence"}},
+                      opset_version=14)
+    int8_path = onnx_file(model_name, "onnx-int8")
+    quantize_dynamic(fp32_path, int8_path + ".tmp", weight_type=QuantType.QInt8)
+    os.replace(int8_path + ".tmp", int8_path)
+
+    parity = {backend: check_parity(OnnxEmbedder(model_name, backend), reference) for backend in ("onnx", "onnx-int8")}
+    with open(os.path.join(folder, PARITY_NAME), "w", encoding="utf-8") as f:
+        json.dump(dict(parity, model=model_name), f, indent=2)
+    return parity
+
+
+def check_parity(embedder, reference, texts=PARITY_TEXTS):
+    """
+    Lowest cosine similarity between the two models' embeddings of the sample texts.
+    """
+    ours = np.asarray(embedder.encode(texts), dtype=np.float32)
+    theirs = np.asarray(reference.encode(texts), dtype=np.float32)
+    ours /= np.linalg.norm(ours, axis=1, keepdims=True)
+    theirs /= np.linalg.norm(theirs, axis=1, keepdims=True)
+    return float(np.min(np.sum(ours * theirs, axis=1)))
+
+
+def load_parity(model_name):
+    path = os.path.join(model_dir(model_name), PARITY_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_torch(model_name):
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+
+def load_embedder(model_name=None, backend=None):
+    """
+    The embedding model for `backend` (default MEDIBOT_EMBEDDING_BACKEND). ONNX models are
+    exported on first use; if conversion fails or parity is below EMBEDDING_PARITY_MIN the
+    torch model is returned instead.
+    """
+    model_name = model_name or config.EMBEDDING_MODEL
+    backend = backend or config.EMBEDDING_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {BACKENDS}")
+    if backend == "torch":
+        return load_torch(model_name)
+
+    try:
+        parity = load_parity(model_name)
+        if parity is None or not os.path.exists(onnx_file(model_name, backend)):
+            parity = export(model_name)
+        if parity[backend] < config.EMBEDDING_PARITY_MIN:
+            logger.warning(f"{backend} embeddings only reach cosine {parity[backend]:.4f} against the reference "
+                           f"(minimum {config.EMBEDDING_PARITY_MIN}), using torch")
+            return load_torch(model_name)
+        logger.info(f"🧠 Embedding backend {backend} (parity {parity[backend]:.4f})")
+        return OnnxEmbedder(model_name, backend)
+    except ImportError as e:
+        logger.warning(f"{backend} embedding backend unavailable ({e}), using torch")
+        return load_torch(model_name)
+    except Exception:
+        # Export errors, ONNX Runtime session errors, a corrupt model file: serve with torch
+        logger.exception(f"{backend} embedding backend failed to load, using torch")
+        return load_torch(model_name)
+
+
+def benchmark(model_name, backend, queries=200, batch=512):
+    """
+    Per-query encode latency and batch throughput for torch vs the given backend.
+    """
+    texts = [PARITY_TEXTS[i % len(PARITY_TEXTS)] + f" ({i})" for i in range(batch)]
+    results = {}
+    for name in ("torch", backend):
+        embedder = load_embedder(model_name, name)
+        embedder.encode(["warm up"])
+        latencies = []
+        for i in range(queries):
+            start = time.perf_counter()
+            embedder.encode([texts[i % len(texts)]])
+            latencies.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        embedder.encode(texts, batch_size=32)
+        results[name] = {"p50_ms": float(np.percentile(latencies, 50)),
+                         "p99_ms": float(np.percentile(latencies, 99)),
+                         "texts_per_sec": batch / (time.perf_counter() - start)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export, verify and benchmark an ONNX embedding backend.")
+    parser.add_argument("--model", default=config.EMBEDDING_MODEL)
+    parser.add_argument("--backend", default="onnx-int8", choices=BACKENDS[1:])
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    parity = export(args.model)
+    for name, value in parity.items():
+        if name != "model":
+            status = "ok" if value >= config.EMBEDDING_PARITY_MIN else "below minimum, will fall back to torch"
+            print(f"🔎 {name} parity: min cosine {value:.4f} ({status})")
+    for name, r in benchmark(args.model, args.backend, queries=args.queries).items():
+        print(f"⏱ {name:<10} query p50 {r['p50_ms']:.2f} ms, p99 {r['p99_ms']:.2f} ms, "
+              f"batch {r['texts_per_sec']:.0f} texts/sec")
+    for name in ("onnx", "onnx-int8"):
+        path = onnx_file(args.model, name)
+        size = sum(os.path.getsize(p) for p in (path, path + ".data") if os.path.exists(p))
+        print(f"💾 {name} model: {size / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
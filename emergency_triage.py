@@ -0,0 +1,290 @@
+# emergency_triage.py
+#
+# Red-flag check on the patient's own words, run before the LLM is called so an
+# urgent case gets its warning immediately. Two stages:
+#   - exact terms ("chest pain", "can't breathe", "overdose", ...) are found in one
+#     pass over the text with an Aho-Corasick automaton, at word boundaries;
+#     negated mentions ("no chest pain") and mentions tied to past medical history
+#     ("passed out from dehydration last year") don't count
+#   - otherwise each sentence/clause of the query is embedded with the retriever's
+#     MiniLM model and compared against all red-flag descriptions with a single
+#     matrix product; a cosine similarity at or above EMERGENCY_THRESHOLD is urgent,
+#     which catches paraphrases ("my lips are turning blue")
+# General questions about a condition ("What causes a stroke?") are not flagged.
+
+import re
+import time
+import logging
+import threading
+from collections import deque
+import numpy as np
+import config
+import index_factory
+
+logger = logging.getLogger(__name__)
+
+# category -> (exact terms, descriptions matched by meaning)
+RED_FLAGS = {
+    "cardiac": (
+        ["chest pain", "chest pressure", "chest tightness", "crushing chest", "heart attack",
+         "pain radiating to my arm", "pain radiating to my left arm", "pain spreading to my jaw"],
+        ["I have crushing pressure in the middle of my chest",
+         "pain in my chest that spreads to my left arm and jaw",
+         "my chest feels tight and I am sweating and feel sick",
+         "I think I am having a heart attack",
+         "my heart is racing and I feel like I am going to pass out"],
+    ),
+    "stroke": (
+        ["face drooping", "facial droop", "slurred speech", "slurring my words", "sudden weakness on one side",
+         "numbness on one side", "having a stroke", "can't move my arm", "cannot move my arm"],
+        ["one side of my face is drooping",
+         "I suddenly can't lift my arm and my words come out wrong",
+         "sudden numbness in my face and arm on one side of my body",
+         "my speech is slurred and I am suddenly confused",
+         "I suddenly lost vision in one eye"],
+    ),
+    "breathing": (
+        ["difficulty breathing", "trouble breathing", "can't breathe", "cannot breathe", "unable to breathe",
+         "struggling to breathe", "gasping for air", "lips turning blue", "blue lips", "choking"],
+        ["I can't catch my breath even when I am resting",
+         "my lips and fingertips are turning blue",
+         "I am gasping for air and can't finish a sentence",
+         "my child is wheezing badly and the inhaler isn't helping"],
+    ),
+    "anaphylaxis": (
+        ["anaphylaxis", "anaphylactic", "throat swelling", "throat is closing", "throat closing",
+         "swollen tongue", "tongue swelling"],
+        ["my throat feels like it is closing up after eating peanuts",
+         "my face and tongue are swelling after a bee sting",
+         "hives all over and it is getting hard to swallow"],
+    ),
+    "bleeding": (
+        ["severe bleeding", "won't stop bleeding", "wont stop bleeding", "bleeding heavily", "vomiting blood",
+         "coughing up blood", "throwing up blood", "black tarry stool"],
+        ["the cut keeps bleeding through the bandage and won't stop",
+         "I threw up a large amount of blood",
+         "there is a lot of blood coming from the wound"],
+    ),
+    "neurological": (
+        ["seizure", "convulsions", "convulsing", "unconscious", "unresponsive", "passed out",
+         "worst headache of my life", "thunderclap headache"],
+        ["a sudden severe headache, the worst I have ever had",
+         "he collapsed and is not waking up",
+         "my child is shaking uncontrollably and not responding",
+         "fever with a stiff neck and I can't look at light"],
+    ),
+    "self_harm": (
+        ["suicidal", "suicide", "kill myself", "end my life", "want to die", "self harm", "hurt myself"],
+        ["I don't want to live anymore",
+         "I have been thinking about ending it all",
+         "I have a plan to take my own life"],
+    ),
+    "poisoning": (
+        ["overdose", "overdosed", "took too many pills", "swallowed poison", "drank bleach"],
+        ["I accidentally took far too many of my sleeping pills",
+         "my toddler swallowed some cleaning liquid",
+         "I took a whole bottle of painkillers"],
+    ),
+    "trauma": (
+        ["head injury", "bone sticking out", "severe burn", "stab wound", "gunshot"],
+        ["I fell and hit my head and now I keep vomiting and feel confused",
+         "I was in a car crash and my neck hurts and my hands are numb",
+         "boiling water burned a large area of my skin and it is blistering"],
+    ),
+    "abdominal": (
+        ["severe abdominal pain", "pregnant and bleeding", "bleeding during pregnancy"],
+        ["sudden severe pain in my belly and it is hard as a board",
+         "I am pregnant and bleeding heavily with cramps",
+         "high fever, stiff neck and a rash that doesn't fade when pressed"],
+    ),
+}
+
+WORD = re.compile(r"[a-z0-9']")
+CLAUSES = re.compile(r"[.!?;\n]+|,\s*(?:but|and|so)?\s*|\s+(?:but|and then|while)\s+"
+                     r"|\s+and\s+(?=(?:i|i'm|i've|i'd|he|she|they|we|it|my|his|her|their|our)\b)")
+NEGATIONS = {"no", "not", "denies", "deny", "without", "never", "dont", "don't", "isn't", "wasn't"}
+negation_window = 3  # words before a term that can negate it
+history_window = 4   # words either side of a term that can tie it to past history
+# A question about a condition rather than a report of symptoms: interrogative opener, no first person
+INFORMATIONAL = re.compile(r"^(what|why|how|which|who|when|where|is|are|can|does|do)\b")
+# Medical history rather than a current symptom, e.g. "had a seizure as a child",
+# unless a current cue ("now", "since", "again") is next to the term as well
+PAST_HISTORY = re.compile(r"\b(last (?:year|month|week|summer|winter)|(?:years|months|weeks) ago|"
+                          r"(?:a|one|two|three|\d+) (?:years?|months?) ago|history of|used to|in the past|"
+                          r"as a (?:child|kid|teenager)|when i was)\b")
+CURRENT = re.compile(r"\b(now|right now|today|tonight|again|currently|still|just|since)\b")
+FIRST_PERSON = re.compile(r"\b(i|i'm|im|i've|me|my|we|our|us)\b|\b(he|she|they|his|her|their|son|daughter|child|baby|wife|husband|mom|dad|mother|father)\b")
+
+
+class TermMatcher:
+    """
+    Aho-Corasick automaton over lowercase terms: every occurrence in one pass over the text.
+    """
+
+    def __init__(self, terms):
+        self.goto = [{}]      # state -> {char: next state}
+        self.fail = [0]
+        self.output = [[]]    # state -> terms ending here
+        for term in terms:
+            state = 0
+            for char in term:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.output[state].append(term)
+
+        # Breadth-first: a state's failure link is the longest proper suffix that is also a prefix
+        pending = deque(self.goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for char, child in self.goto[state].items():
+                pending.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def find(self, text):
+        """
+        (start, term) for each occurrence of a term in text that starts and ends at word boundaries.
+        """
+        matches = []
+        state = 0
+        for end, char in enumerate(text):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for term in self.output[state]:
+                start = end - len(term) + 1
+                if (start == 0 or not WORD.match(text[start - 1])) and \
+                        (end + 1 == len(text) or not WORD.match(text[end + 1])):
+                    matches.append((start, term))
+        return matches
+
+
+class TriageResult:
+    """
+    Whether a query needs an immediate warning, and why.
+    """
+
+    __slots__ = ("urgent", "category", "method", "matched", "score", "seconds")
+
+    def __init__(self, urgent, category=None, method=None, matched=None, score=None, seconds=0.0):
+        self.urgent = urgent
+        self.category = category
+        self.method = method      # "term" or "semantic"
+        self.matched = matched    # the term, or the red-flag description that was closest
+        self.score = score        # cosine similarity for semantic matches
+        self.seconds = seconds
+
+
+def normalize_text(text):
+    return re.sub(r"\s+", " ", text.casefold().replace("’", "'")).strip()
+
+
+def clauses(text):
+    """
+    Lowercased sentences and clauses of a query, without general questions about a condition.
+    """
+    parts = (part.strip(" '\"") for part in CLAUSES.split(normalize_text(text)))
+    return [part for part in parts if part and not (INFORMATIONAL.match(part) and not FIRST_PERSON.search(part))]
+
+
+def negated(clause, start):
+    return bool(NEGATIONS.intersection(clause[:start].split()[-negation_window:]))
+
+
+def past_history(clause, start, end):
+    # Only the words right around the term count, so other history in the clause
+    # ("I had a heart attack last year and chest pain now") doesn't hide it
+    around = " ".join(clause[:start].split()[-history_window:]), " ".join(clause[end:].split()[:history_window])
+    return any(PAST_HISTORY.search(words) for words in around) and not any(CURRENT.search(words) for words in around)
+
+
+class EmergencyTriage:
+    """
+    Term and embedding-similarity red-flag detection for patient queries.
+    """
+
+    def __init__(self, retriever=None, threshold=None, semantic=None, red_flags=None):
+        self.retriever = retriever
+        self.threshold = config.EMERGENCY_THRESHOLD if threshold is None else threshold
+        self.semantic = config.EMERGENCY_SEMANTIC if semantic is None else semantic
+        self.red_flags = red_flags or RED_FLAGS
+
+        self.categories = {}
+        for category, (terms, _) in self.red_flags.items():
+            for term in terms:
+                self.categories[normalize_text(term)] = category
+        self.matcher = TermMatcher(self.categories)
+        self.descriptions = [(category, text) for category, (_, texts) in self.red_flags.items() for text in texts]
+        self._matrix = None  # red-flag description embeddings, one normalized row each
+        self._lock = threading.Lock()
+
+    @property
+    def matrix(self):
+        if self._matrix is None:
+            with self._lock:
+                if self._matrix is None:
+                    self._matrix = self._embed([text for _, text in self.descriptions])
+        return self._matrix
+
+    def _embed(self, texts):
+        return index_factory.normalize(np.array(self.retriever.embedder.encode(texts)))
+
+    def warm_up(self):
+        if self.semantic and self.retriever is not None:
+            self.matrix
+
+    def check_terms(self, parts):
+        for clause in parts:
+            for start, term in self.matcher.find(clause):
+                if not negated(clause, start) and not past_history(clause, start, start + len(term)):
+                    return TriageResult(True, self.categories[term], "term", term)
+        return None
+
+    def check_semantic(self, parts):
+        # Similarity of every clause to every red-flag description in one product
+        scores = self._embed(parts) @ self.matrix.T
+        row, column = np.unravel_index(int(np.argmax(scores)), scores.shape)
+        score = float(scores[row, column])
+        category, text = self.descriptions[column]
+        return TriageResult(score >= self.threshold, category, "semantic", text, score)
+
+    def assess(self, query):
+        start = time.perf_counter()
+        parts = clauses(query)
+        result = self.check_terms(parts)
+        if result is None:
+            if parts and self.semantic and self.retriever is not None:
+                result = self.check_semantic(parts)
+            else:
+                result = TriageResult(False)
+        result.seconds = time.perf_counter() - start
+        if result.urgent:
+            score = f", similarity {result.score:.2f}" if result.score is not None else ""
+            logger.info(f"🚨 Emergency triage: {result.category} ({result.method} match "
+                        f"'{result.matched}'{score}) in {result.seconds * 1000:.1f} ms")
+        return result
+
+
+_default_triage = None
+_default_lock = threading.Lock()
+
+
+def get_triage():
+    global _default_triage
+    if _default_triage is None:
+        with _default_lock:
+            if _default_triage is None:
+                from rag_utils import get_retriever
+                _default_triage = EmergencyTriage(get_retriever())
+    return _default_triage
+
+
+def assess(query):
+    return get_triage().assess(query)
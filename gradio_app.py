@@ -1,138 +1,189 @@
 import os
 import re
+import asyncio
+import logging
+import tempfile
+import threading
 import gradio as gr
 from dotenv import load_dotenv
-from brain_of_the_doctor import encode_image, analyze_image_with_query
-from voice_of_the_patient import transcribe_with_groq
-from voice_of_the_doctor import text_to_speech_with_gtts
-from rag_utils import retrieve_context
+from brain_of_the_doctor import encode_image, analyze_image_with_query_async
+from voice_of_the_patient import transcribe_with_groq_async
+from voice_of_the_doctor import synthesize_speech
+from consultation_pipeline import StageTimer, stream_with_speech, single_chunk
+from rag_utils import retrieve_passages, format_passages, get_retriever
+from prompt_builder import build_consultation_prompt, build_followup_prompt
+from semantic_cache import get_semantic_cache
+from emergency_triage import get_triage
+from session_store import get_session_store
+import telemetry
+import config
 
 # Load environment variables
 load_dotenv()
 
+logging.basicConfig(level=config.LOG_LEVEL, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
 GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
 ELEVENLABS_API_KEY = os.environ.get("ELEVENLABS_API_KEY")
 
-# System Prompt
-system_prompt = (
-    "You are a professional and empathetic AI doctor. "
-    "Use the provided medical knowledge to respond accurately. "
-    "Be concise, clear, avoid disclaimers. "
-    "Recommend possible causes, diagnostic tests, treatment options, and suggest when to seek emergency care. "
-    "If an image is provided, incorporate it naturally into your medical advice."
-)
-
-# Histories
-chat_history = []
-conversation_log = []
-emergency_keywords = ["chest pain", "difficulty breathing", "severe bleeding", "stroke", "heart attack"]
-
-def check_emergency(response_text):
-    return any(keyword in response_text.lower() for keyword in emergency_keywords)
-
-def consult_doctor(audio_filepath, manual_text, image_filepath):
+async def triage(query, timer):
+    async with timer.stage("triage"):
+        result = await asyncio.to_thread(get_triage().assess, query)
+    if result.urgent:
+        telemetry.EVENTS.inc(event="emergency")
+        timer.trace.annotate(emergency=result.category)
+    return result
+
+async def consult_doctor(audio_filepath, manual_text, image_filepath, request: gr.Request):
+    session = get_session_store().get(request.session_hash)
+    timer = StageTimer("consultation")
     if not audio_filepath and not manual_text.strip():
-        return "Please record or type your symptoms.", "", None
+        yield "Please record or type your symptoms.", "", None
+        return
 
     if manual_text.strip():
         user_query = manual_text.strip()
     else:
-        user_query = transcribe_with_groq(audio_filepath)
+        async with timer.stage("transcription"):
+            user_query = await transcribe_with_groq_async(audio_filepath)
         if not user_query.strip():
-            return "Could not understand audio. Please type your symptoms manually.", "", None
-
-    retrieved_context = retrieve_context(user_query)
-    print("🔎 Retrieved Medical Context:\n", retrieved_context)
-
-    full_prompt = f"""
-{system_prompt}
-
-Relevant Medical Knowledge:
-{retrieved_context}
-
-Patient says: {user_query}
-
-Now, based on the symptoms and knowledge provided, kindly suggest:
-- Possible medical conditions
-- Recommended diagnostic tests
-- Suitable treatment or remedies
-- Whether immediate medical attention is needed
-Please avoid disclaimers.
-"""
-
-    encoded_image = encode_image(image_filepath) if image_filepath else None
-    response = analyze_image_with_query(
-        query=full_prompt,
-        model="meta-llama/llama-4-scout-17b-16e-instruct",
-        encoded_image=encoded_image,
-        chat_history=chat_history
-    )
-
-    chat_history.append((user_query, response))
-    conversation_log.append(f"User: {user_query}\nDoctor: {response}\n")
-
-    if check_emergency(response):
-        response += "\n\n⚠️ Please seek immediate medical attention!"
-
-    clean_response = re.sub(r'\*+', '', response)  # 🔧 Remove asterisks
-    audio_out = "consultation.mp3"
-    text_to_speech_with_gtts(clean_response, audio_out)
-
-    return user_query, clean_response, audio_out  # ⬅️ Send clean version to UI
+            yield "Could not understand audio. Please type your symptoms manually.", "", None
+            return
+    yield user_query, "", None
+
+    # Only a text-only question that opens a session can be answered from (or stored in) the semantic
+    # cache: with an image or earlier turns the answer depends on more than the query
+    cache = None if image_filepath or session.recent_turns() else get_semantic_cache()
+
+    async def retrieve():
+        async with timer.stage("retrieval"):
+            return await asyncio.to_thread(retrieve_passages, user_query)
+
+    async def encode():
+        if not image_filepath:
+            return None
+        async with timer.stage("image_encoding"):
+            return await asyncio.to_thread(encode_image, image_filepath)
+
+    async def cached_response():
+        if not cache:
+            return None
+        async with timer.stage("semantic_cache"):
+            return await asyncio.to_thread(cache.lookup, user_query)
+
+    # Retrieval, image encoding and the cache lookup don't depend on each other
+    preparation = asyncio.gather(retrieve(), encode(), cached_response())
+
+    # Triage finishes in milliseconds, so an urgent case is warned before anything else arrives
+    prefix = ""
+    if (await triage(user_query, timer)).urgent:
+        warning = "⚠️ Please seek immediate medical attention!"
+        prefix = warning + "\n\n"
+        yield user_query, warning, await asyncio.to_thread(synthesize_speech, warning)
+
+    passages, encoded_image, cached = await preparation
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"🔎 Retrieved Medical Context:\n{format_passages(passages)}")
+
+    async with timer.stage("prompt"):
+        full_prompt, history, _ = build_consultation_prompt(user_query, passages, session.recent_turns())
+
+    timer.mark("llm_start")
+    if cached is not None:
+        telemetry.EVENTS.inc(event="semantic_cache_hit")
+        tokens = single_chunk(cached)
+    else:
+        tokens = await analyze_image_with_query_async(
+            query=full_prompt,
+            model="meta-llama/llama-4-scout-17b-16e-instruct",
+            encoded_image=encoded_image,
+            chat_history=history,
+            stream=True
+        )
 
-def followup_question(prev_response, new_query):
+    response = ""
+    async with timer.stage("llm+tts"):
+        async for kind, value in stream_with_speech(tokens, timer):
+            if kind == "text":
+                response = value
+                yield user_query, prefix + re.sub(r'\*+', '', response), gr.skip()
+            else:
+                yield gr.skip(), gr.skip(), value
+
+    if cache and cached is None:
+        llm_seconds = timer.marks["last_token"] - timer.marks["llm_start"]
+        await asyncio.to_thread(cache.store, user_query, response, llm_seconds)
+
+    session.add_turn(user_query, response)
+    timer.report()
+
+async def followup_question(prev_response, new_query, request: gr.Request):
+    session = get_session_store().get(request.session_hash)
+    timer = StageTimer("followup")
     if not new_query:
-        return "Please enter a follow-up question.", "", None
-
-    retrieved_context = retrieve_context(new_query)
-
-    full_query = f"""
-{system_prompt}
-
-Previous Response:
-{prev_response}
-
-User Follow-up:
-{new_query}
-
-Additional Relevant Medical Knowledge:
-{retrieved_context}
-
-Update your medical advice accordingly.
-"""
-
-    response = analyze_image_with_query(
+        yield "Please enter a follow-up question.", "", None
+        return
+
+    async def retrieve():
+        async with timer.stage("retrieval"):
+            return await asyncio.to_thread(retrieve_passages, new_query)
+
+    retrieval = asyncio.ensure_future(retrieve())
+    prefix = ""
+    if (await triage(new_query, timer)).urgent:
+        warning = "⚠️ Follow-up indicates possible emergency. Seek medical help!"
+        prefix = warning + "\n\n"
+        yield new_query, warning, await asyncio.to_thread(synthesize_speech, warning)
+    passages = await retrieval
+
+    async with timer.stage("prompt"):
+        full_query, history, _ = build_followup_prompt(prev_response, new_query, passages, session.recent_turns())
+
+    timer.mark("llm_start")
+    tokens = await analyze_image_with_query_async(
         query=full_query,
         model="meta-llama/llama-4-scout-17b-16e-instruct",
         encoded_image=None,
-        chat_history=chat_history
+        chat_history=history,
+        stream=True
     )
 
-    chat_history.append((new_query, response))
-    conversation_log.append(f"User(Follow-up): {new_query}\nDoctor: {response}\n")
-
-    if check_emergency(response):
-        response += "\n\n⚠️ Follow-up indicates possible emergency. Seek medical help!"
+    response = ""
+    async with timer.stage("llm+tts"):
+        async for kind, value in stream_with_speech(tokens, timer):
+            if kind == "text":
+                response = value
+                yield new_query, prefix + re.sub(r'\*+', '', response), gr.skip()
+            else:
+                yield gr.skip(), gr.skip(), value
 
-    clean_response = re.sub(r'\*+', '', response)  # 🔧 Clean again
-    audio_out = "followup.mp3"
-    text_to_speech_with_gtts(clean_response, audio_out)
+    session.add_turn(new_query, response, label="User(Follow-up)")
+    timer.report()
 
-    return new_query, clean_response, audio_out  # ⬅️ Send clean version
-
-def clear_all():
-    global chat_history, conversation_log
-    chat_history = []
-    conversation_log = []
+def clear_all(request: gr.Request):
+    get_session_store().get(request.session_hash).clear()
     return None, "", None, "", "", "", None
 
-def download_history():
-    path = "consultation_history.txt"
-    with open(path, "w", encoding="utf-8") as f:
-        f.write("\n".join(conversation_log))
-    return path
+def download_history(request: gr.Request):
+    # One file per download so concurrent sessions never overwrite each other's history;
+    # the session removes its files when it closes or is evicted
+    session = get_session_store().get(request.session_hash)
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", suffix=".txt",
+                                     prefix="consultation_history_", delete=False) as f:
+        f.write(session.transcript())
+    session.add_download(f.name)
+    return f.name
+
+def end_session(request: gr.Request):
+    get_session_store().close(request.session_hash)
 
 def launch_interface():
+    # Load the embedding model and index in the background while the UI starts serving
+    get_retriever().warm_up_in_background()
+    # ...and embed the red-flag descriptions, so the first triage is as fast as the rest
+    threading.Thread(target=get_triage().warm_up, name="triage-warm-up", daemon=True).start()
+
     with gr.Blocks(theme=gr.themes.Soft()) as demo:
         gr.Markdown("# 🩺🤖 MediBot - AI Doctor with RAG, Vision, and Voice")
         gr.Markdown("Consult using voice or text. Upload an optional image. Follow-up supported!")
@@ -173,7 +224,7 @@ def launch_interface():
 
         speech_out = gr.Textbox(label="📝 Your Query")
         doctor_resp = gr.Textbox(label="🧑‍⚕️ Doctor's Response")
-        audio_out = gr.Audio(type="filepath", label="🔊 Doctor Speaking")
+        audio_out = gr.Audio(label="🔊 Doctor Speaking", streaming=True, autoplay=True)
 
         gr.Markdown("---")
         gr.Markdown("## Follow-up Question")
@@ -208,7 +259,21 @@ def launch_interface():
             outputs=[history_file]
         )
 
-    demo.launch(debug=True)
+        # Drop the session's history as soon as the browser tab goes away
+        demo.unload(end_session)
+
+    demo.queue(default_concurrency_limit=config.QUEUE_CONCURRENCY)
+    if not config.METRICS_ENABLED:
+        demo.launch(debug=True, server_name=config.SERVER_NAME, server_port=config.SERVER_PORT)
+        return
+
+    # Serve /metrics and /traces next to the UI; they are registered first so the Gradio mount doesn't shadow them
+    import uvicorn
+    from fastapi import FastAPI
+    app = FastAPI()
+    app.include_router(telemetry.metrics_router())
+    app = gr.mount_gradio_app(app, demo, path="/")
+    uvicorn.run(app, host=config.SERVER_NAME, port=config.SERVER_PORT, log_level=config.LOG_LEVEL.lower())
 
 if __name__ == "__main__":
     launch_interface()
@@ -0,0 +1,216 @@
+# groq_client.py
+#
+# Process-wide Groq access shared by the LLM and transcription code:
+#   - one sync and one async client with pooled keep-alive HTTP connections
+#   - configurable connect/read timeouts
+#   - retries with exponential backoff and full jitter on 429, 5xx, timeouts and
+#     connection errors, honouring Retry-After
+#   - a token-bucket scheduler that keeps all sessions together under the
+#     per-minute request and token quotas
+
+import time
+import random
+import asyncio
+import logging
+import threading
+import httpx
+import groq
+from groq import Groq, AsyncGroq
+import config
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_ERRORS = (groq.RateLimitError, groq.InternalServerError, groq.APITimeoutError, groq.APIConnectionError)
+
+
+class TokenBucket:
+    """
+    Refills `per_minute` units per minute up to `per_minute` capacity.
+    reserve() takes units immediately, letting the balance go negative, and returns how
+    long the caller must wait; callers are therefore served in arrival order.
+    """
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount=1):
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+            self.updated = now
+            self.level -= min(amount, self.capacity)
+            return max(0.0, -self.level / self.rate)
+
+
+class RateLimiter:
+    """
+    Request and token quotas shared by every session, plus a global pause when the API says back off.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, estimated_tokens):
+        wait = max(self.requests.reserve(1), self.tokens.reserve(estimated_tokens))
+        with self._lock:
+            return max(wait, self.paused_until - time.monotonic())
+
+    def pause(self, seconds):
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def acquire(self, estimated_tokens):
+        wait = self.reserve(estimated_tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, estimated_tokens):
+        wait = self.reserve(estimated_tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+
+def estimate_tokens(messages=None, completion_tokens=None):
+    """
+    Rough request size for the token quota: ~4 characters per token plus the expected completion.
+    """
+    chars = 0
+    for message in messages or []:
+        content = message.get("content", "")
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content if part.get("type") == "text")
+        chars += len(content)
+    expected = config.GROQ_EXPECTED_COMPLETION_TOKENS if completion_tokens is None else completion_tokens
+    return chars // 4 + expected
+
+
+def retry_after_seconds(error):
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class GroqClientManager:
+    """
+    Owns the shared Groq clients and runs every call through the limiter and retry policy.
+    """
+
+    def __init__(self, api_key=None, base_url=None, timeout=None, connect_timeout=None,
+                 max_connections=None, max_retries=None, requests_per_minute=None, tokens_per_minute=None):
+        self.api_key = api_key or config.GROQ_API_KEY
+        self.base_url = base_url or config.GROQ_BASE_URL
+        self.timeout = httpx.Timeout(timeout or config.GROQ_TIMEOUT,
+                                     connect=connect_timeout or config.GROQ_CONNECT_TIMEOUT)
+        self.limits = httpx.Limits(max_connections=max_connections or config.GROQ_MAX_CONNECTIONS,
+                                   max_keepalive_connections=max_connections or config.GROQ_MAX_CONNECTIONS,
+                                   keepalive_expiry=30)
+        self.max_retries = config.GROQ_MAX_RETRIES if max_retries is None else max_retries
+        self.requests_per_minute = requests_per_minute or config.GROQ_REQUESTS_PER_MINUTE
+        self.tokens_per_minute = tokens_per_minute or config.GROQ_TOKENS_PER_MINUTE
+        self.limiters = {}  # Groq quotas are per model
+        self.stats = {"calls": 0, "retries": 0, "failures": 0, "throttled_seconds": 0.0}
+        self._client = None
+        self._async_client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    # The SDK's own retries are disabled; call() retries in coordination with the limiter
+                    self._client = Groq(api_key=self.api_key, base_url=self.base_url, max_retries=0,
+                                        timeout=self.timeout,
+                                        http_client=httpx.Client(limits=self.limits, timeout=self.timeout))
+        return self._client
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            with self._lock:
+                if self._async_client is None:
+                    self._async_client = AsyncGroq(api_key=self.api_key, base_url=self.base_url, max_retries=0,
+                                                   timeout=self.timeout,
+                                                   http_client=httpx.AsyncClient(limits=self.limits,
+                                                                                 timeout=self.timeout))
+        return self._async_client
+
+    def limiter_for(self, model):
+        with self._lock:
+            if model not in self.limiters:
+                self.limiters[model] = RateLimiter(self.requests_per_minute, self.tokens_per_minute)
+            return self.limiters[model]
+
+    def _backoff(self, attempt, error, limiter):
+        # Full jitter: uniform in [0, base * 2^attempt], but never sooner than Retry-After
+        delay = random.uniform(0, min(config.GROQ_MAX_BACKOFF, config.GROQ_BASE_BACKOFF * 2 ** attempt))
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        if isinstance(error, groq.RateLimitError):
+            limiter.pause(delay)
+        logger.warning(f"Groq call failed ({type(error).__name__}), retry {attempt + 1}/{self.max_retries} "
+                       f"in {delay:.2f}s")
+        return delay
+
+    def call(self, fn, *args, estimated_tokens=0, **kwargs):
+        """
+        Run fn(client, *args, **kwargs) under the rate limiter of kwargs["model"] with retries.
+        """
+        limiter = self.limiter_for(kwargs.get("model"))
+        self.stats["calls"] += 1
+        for attempt in range(self.max_retries + 1):
+            self.stats["throttled_seconds"] += limiter.acquire(estimated_tokens)
+            try:
+                return fn(self.client, *args, **kwargs)
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    self.stats["failures"] += 1
+                    raise
+                self.stats["retries"] += 1
+                time.sleep(self._backoff(attempt, e, limiter))
+
+    async def acall(self, fn, *args, estimated_tokens=0, **kwargs):
+        """
+        Async version of call(): awaits fn(async_client, *args, **kwargs).
+        """
+        limiter = self.limiter_for(kwargs.get("model"))
+        self.stats["calls"] += 1
+        for attempt in range(self.max_retries + 1):
+            self.stats["throttled_seconds"] += await limiter.acquire_async(estimated_tokens)
+            try:
+                return await fn(self.async_client, *args, **kwargs)
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    self.stats["failures"] += 1
+                    raise
+                self.stats["retries"] += 1
+                await asyncio.sleep(self._backoff(attempt, e, limiter))
+
+
+_default_manager = None
+_default_lock = threading.Lock()
+
+
+def get_client_manager():
+    global _default_manager
+    if _default_manager is None:
+        with _default_lock:
+            if _default_manager is None:
+                _default_manager = GroqClientManager()
+    return _default_manager
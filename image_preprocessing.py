@@ -0,0 +1,148 @@
+# image_preprocessing.py
+#
+# Prepares an uploaded image for the vision model instead of sending the raw
+# file: it is decoded once (JPEGs at reduced scale when they are much larger
+# than needed), rotated upright from its EXIF orientation, downscaled so the
+# longest side is at most IMAGE_MAX_SIDE, and re-encoded as a compact JPEG or
+# WebP with all metadata (EXIF, GPS, ICC) dropped. The base64 payload is cached
+# by a hash of the file's content, so a follow-up with the same image skips the
+# work. Files Pillow cannot decode are sent unchanged with their detected type.
+
+import io
+import base64
+import hashlib
+import logging
+import mimetypes
+import threading
+import time
+import config
+import telemetry
+from retrieval_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+# Magic numbers of formats sent unchanged when they can't be decoded
+SIGNATURES = ((b"\xff\xd8\xff", "image/jpeg"), (b"\x89PNG\r\n\x1a\n", "image/png"),
+              (b"GIF8", "image/gif"), (b"RIFF", "image/webp"))
+
+
+class PreparedImage:
+    """
+    A base64 payload ready for an image_url message, and what preparing it did.
+    """
+
+    __slots__ = ("data", "mime", "width", "height", "bytes_in", "bytes_out", "seconds", "digest")
+
+    def __init__(self, data, mime, width, height, bytes_in, bytes_out, seconds, digest):
+        self.data = data
+        self.mime = mime
+        self.width = width
+        self.height = height
+        self.bytes_in = bytes_in
+        self.bytes_out = bytes_out
+        self.seconds = seconds
+        self.digest = digest
+
+    @property
+    def data_url(self):
+        return f"data:{self.mime};base64,{self.data}"
+
+
+def sniff_mime(raw, path=None):
+    for signature, mime in SIGNATURES:
+        if raw.startswith(signature):
+            return mime
+    return (mimetypes.guess_type(path)[0] if path else None) or "application/octet-stream"
+
+
+def reencode(raw, max_side=None, image_format=None, quality=None):
+    """
+    Decode, orient, downscale and re-encode image bytes without metadata.
+    Returns (encoded bytes, mime, width, height).
+    """
+    from PIL import Image, ImageOps
+    max_side = max_side or config.IMAGE_MAX_SIDE
+    image_format = (image_format or config.IMAGE_FORMAT).upper()
+    quality = quality or config.IMAGE_QUALITY
+    if image_format not in FORMATS:
+        raise ValueError(f"Unknown image format {image_format!r}, expected one of {tuple(FORMATS)}")
+
+    with Image.open(io.BytesIO(raw)) as image:
+        # JPEG can decode at 1/2, 1/4 or 1/8 scale directly, much faster than a full decode
+        image.draft("RGB", (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        if image.mode in ("RGBA", "LA", "P"):
+            # Flatten transparency onto white rather than the black a plain convert gives
+            rgba = image.convert("RGBA")
+            image = Image.new("RGB", rgba.size, (255, 255, 255))
+            image.paste(rgba, mask=rgba.getchannel("A"))
+        elif image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.info = {}  # no EXIF, ICC profile or comments in the output
+
+        out = io.BytesIO()
+        options = {"optimize": True, "progressive": True} if image_format == "JPEG" else {"method": 4}
+        image.save(out, image_format, quality=quality, **options)
+        return out.getvalue(), FORMATS[image_format], image.width, image.height
+
+
+class ImagePreprocessor:
+    """
+    Content-addressed cache in front of reencode().
+    """
+
+    def __init__(self, max_side=None, image_format=None, quality=None, cache_size=None):
+        self.max_side = max_side or config.IMAGE_MAX_SIDE
+        self.image_format = (image_format or config.IMAGE_FORMAT).upper()
+        self.quality = quality or config.IMAGE_QUALITY
+        self.cache = LRUCache(config.IMAGE_CACHE_SIZE if cache_size is None else cache_size, name="image")
+
+    def prepare(self, image_path):
+        with open(image_path, "rb") as f:
+            raw = f.read()
+        # The settings are part of the key so changing them never serves a stale payload
+        digest = hashlib.sha256(raw).hexdigest()
+        key = (digest, self.max_side, self.image_format, self.quality)
+        prepared = self.cache.get(key)
+        if prepared is not None:
+            logger.info(f"🖼 Image cache hit ({prepared.bytes_out / 1024:.0f} KB {prepared.mime})")
+            telemetry.PAYLOAD_BYTES.observe(prepared.bytes_out, payload="image")
+            return prepared
+
+        start = time.perf_counter()
+        try:
+            encoded, mime, width, height = reencode(raw, self.max_side, self.image_format, self.quality)
+        except (ImportError, OSError, ValueError) as e:
+            # Not decodable (or Pillow missing): send the original bytes, correctly labelled
+            logger.warning(f"Could not preprocess {image_path} ({e}), sending it unchanged")
+            encoded, mime, width, height = raw, sniff_mime(raw, image_path), None, None
+        seconds = time.perf_counter() - start
+
+        prepared = PreparedImage(base64.b64encode(encoded).decode("ascii"), mime, width, height,
+                                 len(raw), len(encoded), seconds, digest)
+        self.cache.put(key, prepared)
+        telemetry.PAYLOAD_BYTES.observe(len(encoded), payload="image")
+        size = f"{width}x{height} " if width else ""
+        logger.info(f"🖼 Image {len(raw) / 1024:.0f} KB -> {len(encoded) / 1024:.0f} KB ({size}{mime}) "
+                    f"in {seconds * 1000:.0f} ms")
+        return prepared
+
+
+_default_preprocessor = None
+_default_lock = threading.Lock()
+
+
+def get_preprocessor():
+    global _default_preprocessor
+    if _default_preprocessor is None:
+        with _default_lock:
+            if _default_preprocessor is None:
+                _default_preprocessor = ImagePreprocessor()
+    return _default_preprocessor
+
+
+def prepare_image(image_path):
+    return get_preprocessor().prepare(image_path)
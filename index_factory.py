@@ -0,0 +1,269 @@
+# index_factory.py
+#
+# Builds the FAISS index types MediBot can serve from (exact Flat, IVF-Flat,
+# IVF-PQ, HNSW), tunes them at query time, and benchmarks the approximate ones
+# against the exact index:
+#
+#   python index_factory.py --folder path/to/db_faiss --k 3
+
+import os
+import time
+import logging
+import argparse
+import tempfile
+import faiss
+import numpy as np
+import config
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+# Defaults for the approximate indexes
+nlist = 1024          # IVF cells; capped at train_size / 39 so training stays meaningful
+pq_m = 48             # PQ sub-quantizers (must divide the embedding dimension, 384 for MiniLM)
+pq_bits = 8
+hnsw_m = 32
+ef_construction = 200
+train_size = 20000    # vectors buffered to train IVF/PQ before anything is added
+
+# Query-time defaults
+nprobe = config.NPROBE
+ef_search = config.EF_SEARCH
+
+
+def needs_training(index_type):
+    return index_type in ("ivf_flat", "ivf_pq")
+
+
+def factory_string(index_type, dimension, n_train=0):
+    # IVF lists store the caller's ids themselves (add_with_ids/remove_ids), so they are
+    # not wrapped: IDMap2 assumes removal compacts the inner index, which IVF doesn't do
+    if index_type == "flat":
+        return "IDMap2,Flat"
+    if index_type == "hnsw":
+        return f"IDMap2,HNSW{hnsw_m},Flat"
+
+    cells = max(1, min(nlist, n_train // 39))
+    if index_type == "ivf_flat":
+        return f"IVF{cells},Flat"
+    if index_type == "ivf_pq":
+        if dimension % pq_m:
+            raise ValueError(f"pq_m={pq_m} does not divide embedding dimension {dimension}")
+        # Like the IVF cells, each of the 2**bits PQ centroids needs ~39 training points
+        # (FAISS's minimum); fewer makes k-means warn and training crawl
+        bits = max(1, min(pq_bits, int(np.log2(max(n_train // 39, 2)))))
+        return f"IVF{cells},PQ{pq_m}x{bits}"
+    raise ValueError(f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}")
+
+
+def make_index(index_type, dimension, train_vectors=None):
+    """
+    Create an inner-product index of the given type that accepts add_with_ids (ID-mapped,
+    or an IVF index, which keeps ids in its inverted lists).
+    Vectors must be L2-normalized (see normalize()) so inner product == cosine.
+    IVF types are trained on `train_vectors`.
+    """
+    n_train = 0 if train_vectors is None else len(train_vectors)
+    index = faiss.index_factory(dimension, factory_string(index_type, dimension, n_train),
+                                faiss.METRIC_INNER_PRODUCT)
+    if index_type == "hnsw":
+        faiss.downcast_index(index.index).hnsw.efConstruction = ef_construction
+    if index_type == "ivf_pq":
+        # Polysemous training only serves Hamming-distance filtering, which search doesn't use,
+        # and costs far more than training the codebooks themselves
+        index.do_polysemous_training = False
+    if not index.is_trained and n_train:
+        index.train(np.ascontiguousarray(train_vectors, dtype=np.float32))
+    set_search_params(index)
+    return index
+
+
+def supports_ids(index, index_type):
+    """
+    Whether a loaded index has the id layout make_index() uses for index_type,
+    so vectors can be added and removed by chunk id.
+    """
+    if needs_training(index_type):
+        return not isinstance(index, faiss.IndexIDMap) and isinstance(index, faiss.IndexIVF)
+    return isinstance(index, faiss.IndexIDMap)
+
+
+def normalize(vectors):
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def uses_inner_product(index):
+    return index.metric_type == faiss.METRIC_INNER_PRODUCT
+
+
+def set_search_params(index, nprobe=None, ef_search=None):
+    """
+    Apply query-time knobs (nprobe for IVF, efSearch for HNSW); ignored for index types they don't apply to.
+    """
+    nprobe = globals()["nprobe"] if nprobe is None else nprobe
+    ef_search = globals()["ef_search"] if ef_search is None else ef_search
+    try:
+        faiss.extract_index_ivf(index).nprobe = nprobe
+    except RuntimeError:
+        pass
+    inner = faiss.downcast_index(index.index if isinstance(index, faiss.IndexIDMap) else index)
+    if isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efSearch = ef_search
+
+
+def remove_ids(index, ids, index_type):
+    """
+    Remove vectors by id. HNSW can't delete in place, so its graph is rebuilt from
+    the stored vectors (no re-embedding needed). Returns the index to keep using.
+    """
+    if not len(ids):
+        return index
+    ids = np.asarray(ids, dtype=np.int64)
+    try:
+        index.remove_ids(ids)
+        return index
+    except RuntimeError:
+        pass
+
+    logger.info(f"🔁 {index_type} does not support removal, rebuilding graph without {len(ids)} vectors...")
+    all_ids = faiss.vector_to_array(index.id_map)
+    vectors = index.index.reconstruct_n(0, index.ntotal)
+    keep = ~np.isin(all_ids, ids)
+    rebuilt = make_index(index_type, index.d)
+    rebuilt.add_with_ids(vectors[keep], all_ids[keep])
+    return rebuilt
+
+
+def read_index(path, mmap=True):
+    """
+    Load an index for serving. With mmap=True the vectors stay in the OS page cache
+    (shared by every process reading the same file) instead of being copied onto the heap.
+    """
+    if mmap:
+        try:
+            return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            logger.warning(f"Could not memory-map {path}, loading it into memory instead.")
+    return faiss.read_index(path)
+
+
+def index_size_bytes(index):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "index.faiss")
+        faiss.write_index(index, path)
+        return os.path.getsize(path)
+
+
+# ---------------------
+# Benchmark
+# ---------------------
+
+def load_vectors(folder, model_name=config.EMBEDDING_MODEL):
+    """
+    Get the corpus vectors for benchmarking: reconstructed from an existing index
+    when possible, otherwise re-embedded from the stored passages.
+    """
+    index = faiss.read_index(os.path.join(folder, "index.faiss"))
+    try:
+        inner = index.index if isinstance(index, faiss.IndexIDMap) else index
+        return normalize(inner.reconstruct_n(0, inner.ntotal))
+    except RuntimeError:
+        pass
+
+    import embedding_backend
+    import passage_store
+    texts = [text for _, text in passage_store.load_passages(folder).items()]
+    embedder = embedding_backend.load_embedder(model_name)
+    return normalize(embedder.encode(texts, batch_size=64, convert_to_numpy=True))
+
+
+def timed_search(index, queries, k):
+    latencies = []
+    results = np.empty((len(queries), k), dtype=np.int64)
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        _, ids = index.search(queries[i:i + 1], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results[i] = ids[0]
+    return results, np.array(latencies)
+
+
+def recall_at_k(found, truth):
+    hits = sum(len(set(f[f >= 0]) & set(t[t >= 0])) for f, t in zip(found, truth))
+    return hits / max(1, truth.size)
+
+
+def benchmark(vectors, k=3, num_queries=500, index_types=INDEX_TYPES,
+              nprobe_values=(1, 4, 16, 64), ef_values=(16, 64, 256), seed=0):
+    """
+    Hold out `num_queries` vectors as queries, build every index type on the rest,
+    and report recall@k against exact Flat search plus p50/p99 latency and size on disk.
+    """
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(vectors))
+    queries = vectors[order[:num_queries]]
+    base = vectors[order[num_queries:]]
+    ids = np.arange(len(base), dtype=np.int64)
+    train = base[rng.permutation(len(base))[:train_size]]
+
+    exact = make_index("flat", base.shape[1])
+    exact.add_with_ids(base, ids)
+    _, truth = exact.search(queries, k)
+
+    rows = []
+    for index_type in index_types:
+        start = time.perf_counter()
+        index = make_index(index_type, base.shape[1], train if needs_training(index_type) else None)
+        index.add_with_ids(base, ids)
+        build_seconds = time.perf_counter() - start
+        size_mb = index_size_bytes(index) / (1024 * 1024)
+
+        if needs_training(index_type):
+            settings = [("nprobe", v, dict(nprobe=v)) for v in nprobe_values]
+        elif index_type == "hnsw":
+            settings = [("efSearch", v, dict(ef_search=v)) for v in ef_values]
+        else:
+            settings = [("-", "-", {})]
+
+        for name, value, params in settings:
+            set_search_params(index, **params)
+            found, latencies = timed_search(index, queries, k)
+            rows.append({
+                "index": index_type,
+                "param": f"{name}={value}" if params else "-",
+                "recall": recall_at_k(found, truth),
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p99_ms": float(np.percentile(latencies, 99)),
+                "size_mb": size_mb,
+                "build_s": build_seconds,
+            })
+    return rows
+
+
+def print_benchmark(rows, k):
+    print(f"\n{'index':<10}{'param':<14}{f'recall@{k}':>10}{'p50 ms':>10}{'p99 ms':>10}{'size MB':>10}{'build s':>10}")
+    for r in rows:
+        print(f"{r['index']:<10}{r['param']:<14}{r['recall']:>10.3f}{r['p50_ms']:>10.3f}"
+              f"{r['p99_ms']:>10.3f}{r['size_mb']:>10.1f}{r['build_s']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark approximate FAISS indexes against exact search.")
+    parser.add_argument("--folder", default=config.DB_FOLDER, help="Folder containing index.faiss and the passages")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--types", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    args = parser.parse_args()
+
+    print("📦 Loading corpus vectors...")
+    vectors = load_vectors(args.folder)
+    print(f"✅ {len(vectors)} vectors of dimension {vectors.shape[1]}")
+    rows = benchmark(vectors, k=args.k, num_queries=args.queries, index_types=args.types)
+    print_benchmark(rows, args.k)
+
+
+if __name__ == "__main__":
+    main()
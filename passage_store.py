@@ -0,0 +1,251 @@
+# passage_store.py
+#
+# Compact on-disk passage store used instead of index.pkl:
+#   passages.bin      all passages as one contiguous UTF-8 blob
+#   passages.idx.npy  int64 offsets, passage i is blob[offsets[i]:offsets[i + 1]]
+#   passages.meta.json  chunk id -> source, page range, entry title, section and offsets
+#                       (structured chunks only; see chunker.py)
+#
+# Both files are memory-mapped read-only, so opening the store costs the same
+# for any corpus size and every server process shares the same OS page cache
+# instead of holding its own unpickled copy. Builds write through PassageWriter,
+# which appends passages to disk as they are embedded and keeps only their lengths.
+#
+# Convert an existing build:
+#   python passage_store.py C:\path\to\db_faiss
+
+import os
+import json
+import mmap
+import pickle
+import argparse
+import tempfile
+from array import array
+import numpy as np
+
+BLOB_NAME = "passages.bin"
+OFFSETS_NAME = "passages.idx.npy"
+META_NAME = "passages.meta.json"
+LEGACY_NAME = "index.pkl"
+
+
+class PassageStore:
+    """
+    Read-only, memory-mapped passage lookup by chunk id.
+    Ids that were never written (or were deleted) have zero length and return None.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.offsets = np.load(os.path.join(folder, OFFSETS_NAME), mmap_mode="r")
+        self._file = open(os.path.join(folder, BLOB_NAME), "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        # mmap can't map an empty file
+        self._blob = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self):
+        return max(0, len(self.offsets) - 1)
+
+    def get(self, idx, default=None):
+        idx = int(idx)
+        if idx < 0 or idx >= len(self):
+            return default
+        start, end = int(self.offsets[idx]), int(self.offsets[idx + 1])
+        if start == end:
+            return default
+        return self._blob[start:end].decode("utf-8")
+
+    def __getitem__(self, idx):
+        text = self.get(idx)
+        if text is None:
+            raise KeyError(idx)
+        return text
+
+    def items(self):
+        for idx in range(len(self)):
+            text = self.get(idx)
+            if text is not None:
+                yield idx, text
+
+    def close(self):
+        if isinstance(self._blob, mmap.mmap):
+            self._blob.close()
+        self._file.close()
+
+
+def write_store(folder, passages):
+    """
+    Write passages (a list indexed by row, or a dict keyed by chunk id) to the store.
+    Files are written to temporary names and swapped in, so readers never see a partial store.
+    """
+    items = sorted(passages.items() if isinstance(passages, dict) else enumerate(passages))
+    count = items[-1][0] + 1 if items else 0
+    offsets = np.zeros(count + 1, dtype=np.int64)
+
+    blob_file = os.path.join(folder, BLOB_NAME)
+    offsets_file = os.path.join(folder, OFFSETS_NAME)
+    position = 0
+    with open(blob_file + ".tmp", "wb") as f:
+        for idx, text in items:
+            data = text.encode("utf-8")
+            f.write(data)
+            position += len(data)
+            offsets[idx + 1] = position
+    # Ids without a passage get start == end (the running maximum fills the gaps)
+    np.maximum.accumulate(offsets, out=offsets)
+    with open(offsets_file + ".tmp", "wb") as f:
+        np.save(f, offsets)
+
+    os.replace(blob_file + ".tmp", blob_file)
+    os.replace(offsets_file + ".tmp", offsets_file)
+
+
+class PassageWriter:
+    """
+    Append-only passage store for builds. New passages go straight to a temporary
+    file and only their ids and lengths stay in memory; commit() writes the store
+    into a folder: the passages of `base` (the previous store, or a dict) that were
+    not removed, then the new ones. New ids must be larger than every id in base and
+    arrive in increasing order, which is how builds hand them out.
+    """
+
+    def __init__(self, base=None, folder=None):
+        self.base = base
+        self.removed = set()
+        self.ids = array("q")
+        self.lengths = array("q")
+        fd, self.path = tempfile.mkstemp(prefix="passages_", suffix=".new", dir=folder)
+        self._file = os.fdopen(fd, "wb")
+
+    def add(self, ids, texts):
+        for idx, text in zip(ids, texts):
+            if self.ids and idx <= self.ids[-1]:
+                raise ValueError(f"Passage ids must increase, got {idx} after {self.ids[-1]}")
+            data = text.encode("utf-8")
+            self._file.write(data)
+            self.ids.append(idx)
+            self.lengths.append(len(data))
+
+    def remove(self, ids):
+        self.removed.update(ids)
+
+    def _base_items(self):
+        if self.base is None:
+            return iter(())
+        return self.base.items() if isinstance(self.base, PassageStore) else iter(sorted(self.base.items()))
+
+    def _count(self):
+        if isinstance(self.base, PassageStore):
+            base = len(self.base)
+        else:
+            base = max(self.base, default=-1) + 1 if self.base else 0
+        return max(base, self.ids[-1] + 1 if self.ids else 0)
+
+    def commit(self, folder):
+        """
+        Write the store into folder (files are swapped in, as in write_store), then
+        close the base store and delete the temporary file.
+        """
+        self._file.close()
+        offsets = np.zeros(self._count() + 1, dtype=np.int64)
+        blob_file = os.path.join(folder, BLOB_NAME)
+        offsets_file = os.path.join(folder, OFFSETS_NAME)
+        position = 0
+        with open(blob_file + ".tmp", "wb") as f:
+            for idx, text in self._base_items():
+                if idx not in self.removed:
+                    data = text.encode("utf-8")
+                    f.write(data)
+                    position += len(data)
+                    offsets[idx + 1] = position
+            with open(self.path, "rb") as new:
+                for idx, length in zip(self.ids, self.lengths):
+                    data = new.read(length)
+                    if idx not in self.removed:
+                        f.write(data)
+                        position += length
+                        offsets[idx + 1] = position
+        np.maximum.accumulate(offsets, out=offsets)
+        with open(offsets_file + ".tmp", "wb") as f:
+            np.save(f, offsets)
+
+        # The base store may be mapped from the files about to be replaced
+        self.discard()
+        os.replace(blob_file + ".tmp", blob_file)
+        os.replace(offsets_file + ".tmp", offsets_file)
+
+    def discard(self):
+        self._file.close()
+        if isinstance(self.base, PassageStore):
+            self.base.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def write_metadata(folder, metadata):
+    meta_file = os.path.join(folder, META_NAME)
+    with open(meta_file + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({str(idx): meta for idx, meta in sorted(metadata.items())}, f)
+    os.replace(meta_file + ".tmp", meta_file)
+
+
+def load_metadata(folder):
+    """
+    Chunk id -> metadata dict; empty for builds without metadata.
+    """
+    meta_file = os.path.join(folder, META_NAME)
+    if not os.path.exists(meta_file):
+        return {}
+    with open(meta_file, "r", encoding="utf-8") as f:
+        return {int(idx): meta for idx, meta in json.load(f).items()}
+
+
+def has_store(folder):
+    return os.path.exists(os.path.join(folder, BLOB_NAME)) and os.path.exists(os.path.join(folder, OFFSETS_NAME))
+
+
+def load_passages(folder):
+    """
+    Open the passage store, falling back to a legacy index.pkl (list or dict).
+    Either way the result supports .get(chunk_id).
+    """
+    if has_store(folder):
+        return PassageStore(folder)
+    passages = load_legacy(folder)
+    return passages if isinstance(passages, dict) else dict(enumerate(passages))
+
+
+def load_legacy(folder):
+    with open(os.path.join(folder, LEGACY_NAME), "rb") as f:
+        return pickle.load(f)
+
+
+def convert_pickle(folder):
+    """
+    Write the store from index.pkl and check every passage round-trips.
+    Returns (passage count, number of mismatches).
+    """
+    passages = load_legacy(folder)
+    write_store(folder, passages)
+    store = PassageStore(folder)
+    items = passages.items() if isinstance(passages, dict) else enumerate(passages)
+    mismatches = sum(1 for idx, text in items if store.get(idx, "") != text)
+    store.close()
+    return len(passages), mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert index.pkl into a memory-mapped passage store.")
+    parser.add_argument("folder", help="Folder containing index.pkl")
+    args = parser.parse_args()
+
+    print("📦 Converting index.pkl...")
+    count, mismatches = convert_pickle(args.folder)
+    if mismatches:
+        print(f"❌ {mismatches} passages differ after conversion!")
+    else:
+        print(f"✅ Wrote {count} passages to {BLOB_NAME} / {OFFSETS_NAME}")
+
+
+if __name__ == "__main__":
+    main()
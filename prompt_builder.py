@@ -0,0 +1,225 @@
+# prompt_builder.py
+#
+# Assembles the consultation and follow-up prompts for gradio_app.py under a
+# token budget instead of pasting everything in:
+#   - retrieved passages below MIN_PASSAGE_SCORE are dropped, and adjacent
+#     chunks that share the splitter's overlap are merged into one passage
+#   - the last few turns go to the model as chat history with long replies
+#     truncated; older turns are condensed into a one-line-per-turn summary
+#   - the previous response of a follow-up is truncated and not repeated as history
+#   - passages fill whatever budget is left, best first
+# Every build logs the prompt's token count next to what the unbudgeted prompt would have cost.
+# Token counts are estimates (tokens.count_tokens, ~4 characters per token), not the
+# LLM tokenizer's count, so the budget is approximate.
+
+import re
+import logging
+import config
+import telemetry
+from tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+system_prompt = (
+    "You are a professional and empathetic AI doctor. "
+    "Use the provided medical knowledge to respond accurately. "
+    "Be concise, clear, avoid disclaimers. "
+    "Recommend possible causes, diagnostic tests, treatment options, and suggest when to seek emergency care. "
+    "If an image is provided, incorporate it naturally into your medical advice."
+)
+
+NO_CONTEXT = "No relevant medical knowledge found."
+
+# Shortest shared prefix/suffix (in characters) treated as chunk overlap rather than coincidence
+min_overlap = 40
+
+# Turns sent verbatim as chat history; older turns are summarized
+recent_turns = 2
+
+# Tokens kept of each reply in the chat history, and of the whole older-turn summary
+reply_tokens = 150
+summary_tokens = 120
+
+# Share of the budget a follow-up may spend on the previous response
+previous_response_share = 0.25
+
+sentence_end = re.compile(r'(?<=[.!?])\s')
+
+
+def truncate_to_tokens(text, max_tokens):
+    """
+    Shorten text to about max_tokens, cutting at the last sentence end (or word) that fits.
+    """
+    text = text.strip()
+    if count_tokens(text) <= max_tokens:
+        return text
+    cut = text[:max(0, max_tokens * 4 - 1)]
+    ends = [m.start() for m in sentence_end.finditer(cut)]
+    if ends and ends[-1] > len(cut) // 2:
+        return cut[:ends[-1]].rstrip()
+    return cut.rsplit(" ", 1)[0].rstrip(" ,;:") + "…"
+
+
+def clean_reply(text):
+    # The response box shows replies without markdown asterisks
+    return re.sub(r'\*+', '', text).strip()
+
+
+def first_sentence(text):
+    text = " ".join(text.split())
+    match = sentence_end.search(text)
+    return text[:match.start()] if match else text
+
+
+def merge_overlap(a, b):
+    """
+    If b continues a (a's tail equals b's head, as with neighbouring chunks), return the merged text.
+    """
+    longest = min(len(a), len(b)) - 1
+    for size in range(longest, min_overlap - 1, -1):
+        if a.endswith(b[:size]):
+            return a + b[size:]
+    return None
+
+
+def deduplicate(passages):
+    """
+    Merge chunks that overlap each other and drop passages contained in another.
+    passages: (text, score) pairs, best first; a merged passage keeps the better score and position.
+    Returns (passages, number merged or dropped).
+    """
+    kept = []
+    removed = 0
+    for text, score in passages:
+        text = text.strip()
+        for i, (other, other_score) in enumerate(kept):
+            merged = (other if text in other else text if other in text
+                      else merge_overlap(other, text) or merge_overlap(text, other))
+            if merged is not None:
+                kept[i] = (merged, other_score)
+                removed += 1
+                break
+        else:
+            kept.append((text, score))
+    return kept, removed
+
+
+def select_passages(passages, max_tokens, min_score=None):
+    """
+    Relevance filter, deduplication, then as many passages as fit in max_tokens (the last one truncated).
+    Scores of None (L2 indexes) are never filtered.
+    """
+    min_score = config.MIN_PASSAGE_SCORE if min_score is None else min_score
+    relevant = [(text, score) for text, score in passages if score is None or score >= min_score]
+    unique, merged = deduplicate(relevant)
+    selected, used = [], 0
+    for text, _ in unique:
+        remaining = max_tokens - used
+        if remaining < 40:
+            break
+        text = truncate_to_tokens(text, remaining)
+        selected.append(text)
+        used += count_tokens(text) + 1
+    stats = {"passages_in": len(passages), "below_score": len(passages) - len(relevant),
+             "merged": merged, "passages_used": len(selected)}
+    return selected, stats
+
+
+def compress_history(history, max_recent=None):
+    """
+    Split history into the recent turns sent verbatim (replies truncated) and a summary of older ones.
+    """
+    max_recent = recent_turns if max_recent is None else max_recent
+    history = list(history)
+    split = max(0, len(history) - max_recent)
+    older, recent = history[:split], history[split:]
+    recent = [(query, truncate_to_tokens(reply, reply_tokens)) for query, reply in recent]
+    summary = ""
+    if older:
+        lines = [f"- Patient: {first_sentence(query)} Doctor: {first_sentence(reply)}" for query, reply in older]
+        summary = truncate_to_tokens("\n".join(lines), summary_tokens)
+    return recent, summary
+
+
+def history_tokens(turns):
+    return sum(count_tokens(query) + count_tokens(reply) for query, reply in turns)
+
+
+def fit(sections, history, passages, budget, raw_tokens, label):
+    """
+    Fill the None slot in sections with passages so the prompt plus history stays within budget.
+    """
+    fixed = sum(count_tokens(part) for part in sections if part) + history_tokens(history)
+    if fixed > budget:
+        # System prompt, query, previous response and history alone don't fit; no passages are added
+        logger.warning(f"{label} prompt is over budget before any context: {fixed} estimated tokens "
+                       f"(budget {budget})")
+    selected, stats = select_passages(passages, budget - fixed)
+    context = "\n\n".join(selected) if selected else NO_CONTEXT
+    prompt = "".join(context if part is None else part for part in sections)
+    report = dict(stats, total=count_tokens(prompt) + history_tokens(history), context=count_tokens(context),
+                  history=history_tokens(history), budget=budget, unbudgeted=raw_tokens)
+    saved = report["unbudgeted"] - report["total"]
+    telemetry.PROMPT_TOKENS.observe(report["total"], kind=label.lower().replace("-", ""))
+    telemetry.annotate(prompt_tokens=report["total"], passages_used=report["passages_used"])
+    logger.info(f"🧮 {label} prompt: {report['total']} tokens (budget {budget}, unbudgeted {raw_tokens}, "
+                f"saved {saved}); context {report['context']}, history {report['history']}; "
+                f"{report['passages_used']}/{report['passages_in']} passages used, "
+                f"{report['below_score']} below score, {report['merged']} merged")
+    return prompt, report
+
+
+def unbudgeted_tokens(prompt_parts, passages, history):
+    # What the prompt cost before budgeting: every passage and the last two turns verbatim
+    return (sum(count_tokens(part) for part in prompt_parts) + sum(count_tokens(text) for text, _ in passages)
+            + history_tokens(list(history)[-2:]))
+
+
+def build_consultation_prompt(user_query, passages, history=(), budget=None):
+    """
+    Returns (prompt, chat_history for the LLM, token report).
+    passages: (text, similarity) pairs from rag_utils.retrieve_passages().
+    """
+    budget = budget or config.PROMPT_TOKEN_BUDGET
+    recent, summary = compress_history(history)
+    earlier = f"Earlier in this consultation:\n{summary}\n\n" if summary else ""
+    sections = [
+        f"\n{system_prompt}\n\n",
+        earlier,
+        "Relevant Medical Knowledge:\n", None, "\n\n",
+        f"Patient says: {user_query}\n\n",
+        "Now, based on the symptoms and knowledge provided, kindly suggest:\n"
+        "- Possible medical conditions\n"
+        "- Recommended diagnostic tests\n"
+        "- Suitable treatment or remedies\n"
+        "- Whether immediate medical attention is needed\n"
+        "Please avoid disclaimers.\n",
+    ]
+    raw = unbudgeted_tokens([system_prompt, user_query, sections[-1]], passages, history)
+    prompt, report = fit(sections, recent, passages, budget, raw, "Consultation")
+    return prompt, recent, report
+
+
+def build_followup_prompt(prev_response, new_query, passages, history=(), budget=None):
+    """
+    Like build_consultation_prompt(); the previous response is truncated, and the history turn
+    it came from is sent with only its question so the reply is not paid for twice.
+    """
+    budget = budget or config.PROMPT_TOKEN_BUDGET
+    history = list(history)
+    recent, summary = compress_history(history)
+    if history and clean_reply(history[-1][1])[:200] in clean_reply(prev_response or ""):
+        recent[-1] = (recent[-1][0], "(see Previous Response)")
+    previous = truncate_to_tokens(prev_response or "", int(budget * previous_response_share))
+    earlier = f"Earlier in this consultation:\n{summary}\n\n" if summary else ""
+    sections = [
+        f"\n{system_prompt}\n\n",
+        earlier,
+        f"Previous Response:\n{previous}\n\n",
+        f"User Follow-up:\n{new_query}\n\n",
+        "Additional Relevant Medical Knowledge:\n", None, "\n\n",
+        "Update your medical advice accordingly.\n",
+    ]
+    raw = unbudgeted_tokens([system_prompt, prev_response or "", new_query, sections[-1]], passages, history)
+    prompt, report = fit(sections, recent, passages, budget, raw, "Follow-up")
+    return prompt, recent, report
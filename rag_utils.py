@@ -1,27 +1,441 @@
-import faiss
-import pickle
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 import numpy as np
-from sentence_transformers import SentenceTransformer
+import config
+import bm25_index
+import index_factory
+import passage_store
+import telemetry
+from retrieval_cache import LRUCache, normalize_query
 
-# Load the same model
-embedder = SentenceTransformer("all-MiniLM-L6-v2")
+logger = logging.getLogger(__name__)
 
-# Load FAISS and Passages
-faiss_index = faiss.read_index(r"C:\Users\DELL\Desktop\embeddings\db_faiss\index.faiss")
-with open(r"C:\Users\DELL\Desktop\embeddings\db_faiss\index.pkl", "rb") as f:
-    passages = pickle.load(f)
 
-# Retrieval function
-def retrieve_context(user_query, top_k=3):
-    if not user_query.strip():
-        return "No additional medical context found."
+class Retriever:
+    """
+    Dense retrieval over the FAISS index and passage store.
+    Nothing is loaded until first use (or warm_up()), so importing this module is instant.
+    """
+
+    def __init__(self, db_folder=None, model_name=None, nprobe=None, ef_search=None, mmap=None, hybrid=None,
+                 reranker=None):
+        self.db_folder = db_folder or config.DB_FOLDER
+        self.model_name = model_name or config.EMBEDDING_MODEL
+        self.nprobe = config.NPROBE if nprobe is None else nprobe
+        self.ef_search = config.EF_SEARCH if ef_search is None else ef_search
+        self.mmap = config.MMAP_INDEX if mmap is None else mmap
+        self.hybrid = config.HYBRID_SEARCH if hybrid is None else hybrid
+        # Cross-encoder second stage (see reranker.py); pass False to disable it explicitly
+        if reranker is None and config.RERANK_ENABLED:
+            from reranker import Reranker
+            reranker = Reranker()
+        self.reranker = reranker or None
+
+        self._embedder = None
+        self._faiss_index = None
+        self._passages = None
+        self._metadata = None
+        self._bm25 = None
+        self._bm25_loaded = False  # the build may have no BM25 index, so None is a valid loaded value
+        self._lock = threading.Lock()
+        # One lock per component so a request needing the index doesn't wait for the model
+        self._locks = {"embedder": threading.Lock(), "faiss_index": threading.Lock(), "passages": threading.Lock(),
+                       "bm25": threading.Lock()}
+        # BM25 runs here while the query is encoded and searched in FAISS
+        self._lexical_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="bm25")
+        self._warm_up_thread = None
+        self.timings = {}  # component -> seconds it took to become ready
+
+        # Raw query embeddings by normalized text, and result ids by (text, top_k, index version)
+        self.embedding_cache = LRUCache(config.EMBEDDING_CACHE_SIZE, ttl=config.CACHE_TTL, name="embedding")
+        self.result_cache = LRUCache(config.RESULT_CACHE_SIZE, ttl=config.CACHE_TTL, name="result")
+        self.index_version = None
+        self._last_version_check = time.monotonic()
+
+    def _timed(self, name, loader):
+        start = time.perf_counter()
+        value = loader()
+        self.timings[name] = time.perf_counter() - start
+        logger.info(f"⏱ {name} ready in {self.timings[name]:.2f}s")
+        return value
+
+    def _load_embedder(self):
+        import embedding_backend
+        return embedding_backend.load_embedder(self.model_name)
+
+    def _index_file_version(self):
+        stat = os.stat(os.path.join(self.db_folder, "index.faiss"))
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _load_index(self):
+        self.index_version = self._index_file_version()
+        faiss_index = index_factory.read_index(os.path.join(self.db_folder, "index.faiss"), mmap=self.mmap)
+        index_factory.set_search_params(faiss_index, nprobe=self.nprobe, ef_search=self.ef_search)
+        return faiss_index
+
+    @property
+    def embedder(self):
+        if self._embedder is None:
+            with self._locks["embedder"]:
+                if self._embedder is None:
+                    self._embedder = self._timed("embedder", self._load_embedder)
+        return self._embedder
+
+    @property
+    def faiss_index(self):
+        if self._faiss_index is None:
+            with self._locks["faiss_index"]:
+                if self._faiss_index is None:
+                    self._faiss_index = self._timed("faiss_index", self._load_index)
+        return self._faiss_index
+
+    @property
+    def passages(self):
+        if self._passages is None:
+            with self._locks["passages"]:
+                if self._passages is None:
+                    self._passages = self._timed(
+                        "passages", lambda: passage_store.load_passages(self.db_folder)
+                    )
+        return self._passages
+
+    @property
+    def bm25(self):
+        """
+        The build's BM25 index, or None if it has none (hybrid search then falls back to dense only).
+        """
+        if not self._bm25_loaded:
+            with self._locks["bm25"]:
+                if not self._bm25_loaded:
+                    self._bm25 = self._timed("bm25", lambda: bm25_index.load(self.db_folder, mmap=self.mmap))
+                    self._bm25_loaded = True
+        return self._bm25
+
+    @property
+    def ready(self):
+        return None not in (self._embedder, self._faiss_index, self._passages)
+
+    def warm_up(self):
+        """
+        Load every component and run one throwaway query so the first real request
+        doesn't pay for model initialization. Returns the per-component timings.
+        """
+        start = time.perf_counter()
+        self.passages
+        self.faiss_index
+        if self.hybrid:
+            self.bm25
+        self.embedder
+        self._timed("first_encode", lambda: self.embedder.encode(["warm up"]))
+        if self.reranker:
+            self._timed("reranker", lambda: self.reranker.score("warm up", ["warm up"]))
+        self.timings["total"] = time.perf_counter() - start
+        parts = ", ".join(f"{k}={v:.2f}s" for k, v in self.timings.items() if k != "total")
+        logger.info(f"✅ Retriever warm-up finished in {self.timings['total']:.2f}s ({parts})")
+        return self.timings
+
+    def warm_up_in_background(self):
+        """
+        Start warm_up() on a daemon thread so the UI can start serving right away.
+        Requests that arrive earlier simply wait for the component they need.
+        """
+        with self._lock:
+            if self._warm_up_thread is None:
+                self._warm_up_thread = threading.Thread(target=self._safe_warm_up, name="retriever-warm-up",
+                                                        daemon=True)
+                self._warm_up_thread.start()
+        return self._warm_up_thread
+
+    def _safe_warm_up(self):
+        try:
+            self.warm_up()
+        except Exception as e:
+            logger.error(f"Retriever warm-up failed: {e}")
+
+    def reload(self):
+        """
+        Drop the loaded index and passages (the next request reloads them) and the
+        cached results that referred to them. Cached embeddings stay valid.
+        """
+        with self._locks["faiss_index"], self._locks["passages"], self._locks["bm25"]:
+            self._faiss_index = None
+            self._passages = None
+            self._metadata = None
+            self._bm25, self._bm25_loaded = None, False
+            self.result_cache.clear()
+        logger.info("♻️ Index changed on disk, reloading and clearing the retrieval cache")
+
+    def check_for_rebuild(self):
+        # Stat the index file at most every INDEX_CHECK_INTERVAL seconds
+        now = time.monotonic()
+        if self.index_version is None or now - self._last_version_check < config.INDEX_CHECK_INTERVAL:
+            return
+        self._last_version_check = now
+        try:
+            if self._index_file_version() != self.index_version:
+                self.reload()
+        except OSError:
+            pass
+
+    def cache_stats(self):
+        return {"embedding": self.embedding_cache.stats(), "result": self.result_cache.stats()}
+
+    def lookup_passage(self, idx):
+        idx = int(idx)
+        if idx < 0:  # FAISS pads missing results with -1
+            return None
+        return self.passages.get(idx)
+
+    def passage_metadata(self, idx):
+        """
+        Source, page range, entry title, section and offsets of a chunk, or None (fixed-size builds).
+        """
+        if self._metadata is None:
+            with self._locks["passages"]:
+                if self._metadata is None:
+                    self._metadata = passage_store.load_metadata(self.db_folder)
+        return self._metadata.get(int(idx))
+
+    def encode(self, texts):
+        embeddings = np.array(self.embedder.encode(texts)).astype(np.float32)
+        if index_factory.uses_inner_product(self.faiss_index):
+            embeddings = index_factory.normalize(embeddings)
+        return embeddings
+
+    def encode_cached(self, texts):
+        """
+        Like encode(), but each distinct text is only run through the model once
+        and then served from the embedding cache.
+        """
+        vectors = [self.embedding_cache.get(text) for text in texts]
+        missing = list(dict.fromkeys(text for text, v in zip(texts, vectors) if v is None))
+        if missing:
+            encoded = dict(zip(missing, np.array(self.embedder.encode(missing)).astype(np.float32)))
+            for text, vector in encoded.items():
+                self.embedding_cache.put(text, vector)
+            vectors = [encoded[text] if v is None else v for text, v in zip(texts, vectors)]
+        embeddings = np.vstack(vectors)
+        if index_factory.uses_inner_product(self.faiss_index):
+            embeddings = index_factory.normalize(embeddings)
+        return embeddings
+
+    def search_many(self, queries, top_k):
+        """
+        Encode all queries in one embedder call and search them in one FAISS call.
+        Returns (scores, ids), each of shape (len(queries), top_k).
+        """
+        return self.faiss_index.search(self.encode(list(queries)), top_k)
+
+    def format_context(self, ids):
+        return format_passages(self.lookup_passages([(idx, None) for idx in ids]))
+
+    def lookup_passages(self, hits):
+        # (id, score) hits -> (passage, score), skipping ids with no passage
+        found = ((self.lookup_passage(idx), score) for idx, score in hits)
+        return [(passage, score) for passage, score in found if passage is not None]
 
-    query_embedding = embedder.encode([user_query])
-    distances, indices = faiss_index.search(np.array(query_embedding).astype(np.float32), top_k)
+    def retrieve_passages_many(self, queries, top_k=None):
+        """
+        Like retrieve_many(), but returns each query's passages as (text, similarity) pairs, best first.
+        similarity is the cosine score for inner-product indexes and None for older L2 indexes.
+        With a reranker, RERANK_CANDIDATES passages are fetched and the reranker picks the top_k.
+        """
+        self.check_for_rebuild()
+        top_ks = list(top_k) if isinstance(top_k, (list, tuple)) else [top_k or config.TOP_K] * len(queries)
+        results = [[] for _ in queries]
+        todo = [i for i, query in enumerate(queries) if query.strip()]
+        if todo:
+            depths = [max(top_ks[i], config.RERANK_CANDIDATES) if self.reranker else top_ks[i] for i in todo]
+            found = self.search_hits([queries[i] for i in todo], depths)
+            for i, hits in zip(todo, found):
+                results[i] = self.lookup_passages(hits)
+                if self.reranker:
+                    with telemetry.span("retrieval.rerank", candidates=len(results[i])):
+                        results[i] = self.reranker.rerank(queries[i], results[i], top_ks[i])
+        return results
 
-    if indices is None or len(indices) == 0 or len(indices[0]) == 0:
+    def retrieve_many(self, queries, top_k=None):
+        """
+        Retrieve context for several queries with one encode and one search.
+        top_k may also be a list with one value per query; the search runs once at the largest.
+        """
+        results = self.retrieve_passages_many(queries, top_k)
+        return [format_passages(passages) if query.strip() else "No additional medical context found."
+                for query, passages in zip(queries, results)]
+
+    def search_hits(self, queries, top_ks):
+        """
+        (passage id, similarity) hits for each query, from the result cache where possible.
+        Cache misses are encoded (through the embedding cache) and searched together.
+        With hybrid search, BM25 runs on a worker thread meanwhile and the two rankings
+        are merged by reciprocal rank fusion; passages found only by BM25 have similarity None.
+        """
+        texts = [normalize_query(query) for query in queries]
+        keys = [(text, k, self.index_version) for text, k in zip(texts, top_ks)]
+        found = [self.result_cache.get(key) for key in keys]
+        misses = [i for i, hits in enumerate(found) if hits is None]
+        if misses:
+            depth = max(top_ks[i] for i in misses)
+            lexical = None
+            if self.hybrid and self.bm25 is not None:
+                depth = max(depth, config.HYBRID_CANDIDATES)
+                lexical = self._lexical_pool.submit(self.bm25.search_many, [texts[i] for i in misses], depth)
+            with telemetry.span("retrieval.encode", queries=len(misses)):
+                embeddings = self.encode_cached([texts[i] for i in misses])
+            with telemetry.span("retrieval.search", queries=len(misses), depth=depth):
+                scores, indices = self.faiss_index.search(embeddings, depth)
+            cosine = index_factory.uses_inner_product(self.faiss_index)
+            lexical_rows = [None] * len(misses)
+            if lexical:
+                # BM25 ran alongside encode + search; this is only the time left waiting for it
+                with telemetry.span("retrieval.bm25_wait"):
+                    lexical_rows = lexical.result()
+            for i, score_row, row, lexical_row in zip(misses, scores, indices, lexical_rows):
+                similarity = {int(idx): float(score) if cosine else None for idx, score in zip(row, score_row)}
+                if lexical_row is None:
+                    ids = [int(idx) for idx in row[:top_ks[i]]]
+                else:
+                    ids = bm25_index.reciprocal_rank_fusion([row, lexical_row[0]], top_ks[i], k=config.RRF_K)
+                hits = tuple((idx, similarity.get(idx)) for idx in ids)
+                # index_version is known now even if this was the first search
+                self.result_cache.put((texts[i], top_ks[i], self.index_version), hits)
+                found[i] = hits
+        return found
+
+    def search_ids(self, queries, top_ks):
+        """
+        Passage ids for each query (see search_hits()).
+        """
+        return [tuple(idx for idx, _ in hits) for hits in self.search_hits(queries, top_ks)]
+
+    def retrieve(self, user_query, top_k=None):
+        return self.retrieve_many([user_query], top_k)[0]
+
+
+def format_passages(passages):
+    if not passages:
         return "No relevant medical knowledge found."
+    return "\n\n".join(passage for passage, _ in passages)
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-query retrievals into one batched encode + search.
+    The worker takes the first waiting query, collects whatever else arrives within
+    `window_ms` (up to `max_batch`), runs them together and hands each caller its result.
+    """
+
+    def __init__(self, retriever, window_ms=None, max_batch=None):
+        self.retriever = retriever
+        self.window = (config.BATCH_WINDOW_MS if window_ms is None else window_ms) / 1000
+        self.max_batch = max_batch or config.BATCH_MAX_SIZE
+        self.stats = {"batches": 0, "queries": 0}
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, user_query, top_k=None):
+        future = Future()
+        # The caller's trace travels with the query, since the batch runs on the worker thread
+        self._queue.put((user_query, top_k or config.TOP_K, future, telemetry.current_trace()))
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="retrieval-batcher", daemon=True)
+                    self._thread.start()
+        return future
+
+    def retrieve_passages(self, user_query, top_k=None):
+        return self.submit(user_query, top_k).result()
+
+    def retrieve(self, user_query, top_k=None):
+        if not user_query.strip():
+            return "No additional medical context found."
+        return format_passages(self.retrieve_passages(user_query, top_k))
+
+    def close(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:  # close() while collecting: finish this batch, then stop
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+            try:
+                with telemetry.bind([trace for _, _, _, trace in batch]):
+                    results = self.retriever.retrieve_passages_many([q for q, _, _, _ in batch],
+                                                                    [k for _, k, _, _ in batch])
+            except Exception as e:
+                for _, _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            for (_, _, future, _), passages in zip(batch, results):
+                future.set_result(passages)
+            self.stats["batches"] += 1
+            self.stats["queries"] += len(batch)
+
+
+_default_retriever = None
+_default_batcher = None
+_default_lock = threading.Lock()
+
+
+def get_retriever():
+    global _default_retriever
+    if _default_retriever is None:
+        with _default_lock:
+            if _default_retriever is None:
+                _default_retriever = Retriever()
+    return _default_retriever
+
+
+def get_batcher():
+    global _default_batcher
+    if _default_batcher is None:
+        with _default_lock:
+            if _default_batcher is None:
+                _default_batcher = MicroBatcher(get_retriever())
+    return _default_batcher
+
+
+# Retrieval function
+def retrieve_context(user_query, top_k=None):
+    if config.BATCH_WINDOW_MS > 0:
+        return get_batcher().retrieve(user_query, top_k=top_k)
+    return get_retriever().retrieve(user_query, top_k=top_k)
+
+
+def retrieve_passages(user_query, top_k=None):
+    """
+    The query's passages as (text, similarity) pairs, best first (see Retriever.retrieve_passages_many()).
+    """
+    if config.BATCH_WINDOW_MS > 0:
+        return get_batcher().retrieve_passages(user_query, top_k=top_k)
+    return get_retriever().retrieve_passages_many([user_query], top_k=top_k)[0]
+
 
-    retrieved_passages = [passages[idx] for idx in indices[0] if idx < len(passages)]
-    combined_context = "\n\n".join(retrieved_passages)
-    return combined_context
+def retrieve_many(queries, top_k=None):
+    return get_retriever().retrieve_many(queries, top_k=top_k)
@@ -0,0 +1,183 @@
+# reranker.py
+#
+# Optional second retrieval stage (MEDIBOT_RERANK=1): the retriever fetches a
+# wider candidate pool and a small cross-encoder scores every (query, passage)
+# pair in one batched forward pass on CPU. To keep latency bounded:
+#   - adaptive depth: reranking is skipped when the best dense score is clearly
+#     ahead of the runner-up (the order is unlikely to change)
+#   - the number of candidates scored is capped by what fits in the latency
+#     budget, using a running estimate of the per-pair cost
+#   - if a forward pass still overruns the budget, the dense order is returned
+# Backends: "torch" (fp32), "int8" (dynamically quantized Linear layers) or
+# "onnx" (exported once to MODEL_CACHE_DIR, run with ONNX Runtime).
+
+import os
+import time
+import shutil
+import tempfile
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import numpy as np
+import config
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "int8", "onnx")
+
+# Weight of the newest measurement in the running per-pair cost estimate
+cost_smoothing = 0.2
+
+
+class Reranker:
+    """
+    Cross-encoder reranking with adaptive depth and a latency budget.
+    The model is loaded on first use (or warm_up()).
+    """
+
+    def __init__(self, model_name=None, backend=None, budget_ms=None, margin=None, max_length=None):
+        self.model_name = model_name or config.RERANK_MODEL
+        self.backend = backend or config.RERANK_BACKEND
+        if self.backend not in BACKENDS:
+            raise ValueError(f"Unknown rerank backend {self.backend!r}, expected one of {BACKENDS}")
+        self.budget = (config.RERANK_BUDGET_MS if budget_ms is None else budget_ms) / 1000
+        self.margin = config.RERANK_MARGIN if margin is None else margin
+        self.max_length = max_length or config.RERANK_MAX_LENGTH
+
+        self._tokenizer = None
+        self._model = None     # torch module, or an onnxruntime InferenceSession
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+        self.pair_cost = None  # seconds per scored pair, learned from past calls
+        self.stats = {"queries": 0, "reranked": 0, "skipped_margin": 0, "skipped_budget": 0,
+                      "timeouts": 0, "pairs": 0, "seconds": 0.0}
+
+    def _load(self):
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        if self.backend == "onnx":
+            return tokenizer, self._load_onnx(tokenizer)
+        import torch
+        from transformers import AutoModelForSequenceClassification
+        model = AutoModelForSequenceClassification.from_pretrained(self.model_name).eval()
+        if self.backend == "int8":
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return tokenizer, model
+
+    def _onnx_path(self):
+        return os.path.join(config.MODEL_CACHE_DIR, self.model_name.replace("/", "__") + ".onnx")
+
+    def _load_onnx(self, tokenizer):
+        import onnxruntime
+        path = self._onnx_path()
+        if not os.path.exists(path):
+            self._export_onnx(tokenizer, path)
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        return onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+    def _export_onnx(self, tokenizer, path):
+        import torch
+        from transformers import AutoModelForSequenceClassification
+        logger.info(f"📦 Exporting {self.model_name} to ONNX at {path}")
+        model = AutoModelForSequenceClassification.from_pretrained(self.model_name).eval()
+        sample = tokenizer(["query"], ["passage"], return_tensors="pt")
+        names = list(sample.keys())
+        axes = {name: {0: "batch", 1: "sequence"} for name in names}
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Exported to a scratch folder and moved into place together with any "<file>.data"
+        # weights sidecar, which newer exporters name after the output file
+        scratch = tempfile.mkdtemp(dir=os.path.dirname(path))
+        try:
+            target = os.path.join(scratch, os.path.basename(path))
+            torch.onnx.export(model, tuple(sample[name] for name in names), target,
+                              input_names=names, output_names=["logits"],
+                              dynamic_axes=dict(axes, logits={0: "batch"}), opset_version=14)
+            if os.path.exists(target + ".data"):
+                os.replace(target + ".data", path + ".data")
+            os.replace(target, path)
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    def warm_up(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    start = time.perf_counter()
+                    self._tokenizer, self._model = self._load()
+                    logger.info(f"⏱ reranker ({self.backend}) ready in {time.perf_counter() - start:.2f}s")
+        return self
+
+    def score(self, query, passages):
+        """
+        Cross-encoder relevance of each passage to the query, in one forward pass.
+        """
+        self.warm_up()
+        if self.backend == "onnx":
+            features = self._tokenizer([query] * len(passages), passages, padding=True, truncation=True,
+                                       max_length=self.max_length, return_tensors="np")
+            wanted = {i.name for i in self._model.get_inputs()}
+            logits = self._model.run(None, {k: v.astype(np.int64) for k, v in features.items() if k in wanted})[0]
+            return np.asarray(logits)[:, 0]
+        import torch
+        features = self._tokenizer([query] * len(passages), passages, padding=True, truncation=True,
+                                   max_length=self.max_length, return_tensors="pt")
+        with torch.inference_mode():
+            return self._model(**features).logits[:, 0].float().numpy()
+
+    def _depth(self, count, top_k):
+        # Candidates we can afford to score within the budget (all of them until a cost is known)
+        if self.pair_cost is None:
+            return count
+        return min(count, int(self.budget / self.pair_cost))
+
+    def rerank(self, query, candidates, top_k):
+        """
+        candidates: (passage, dense similarity) pairs, best first. Returns the top_k, reordered
+        by the cross-encoder when that is worthwhile and fits the budget, otherwise as given.
+        """
+        self.stats["queries"] += 1
+        if len(candidates) <= 1:
+            return candidates[:top_k]
+        scores = [score for _, score in candidates[:2]]
+        if None not in scores and scores[0] - scores[1] >= self.margin:
+            self.stats["skipped_margin"] += 1
+            return candidates[:top_k]
+
+        depth = self._depth(len(candidates), top_k)
+        if depth <= top_k and depth < len(candidates):
+            # Not even the top_k plus one more fit: reranking could not change what is returned
+            self.stats["skipped_budget"] += 1
+            return candidates[:top_k]
+
+        pool = candidates[:depth]
+        start = time.perf_counter()
+        future = self._pool.submit(self.score, query, [passage for passage, _ in pool])
+        try:
+            relevance = future.result(timeout=self.budget if self.pair_cost is not None else None)
+        except TimeoutError:
+            # The pass finishes in the background and still updates the cost estimate
+            future.add_done_callback(lambda _: self._record(len(pool), time.perf_counter() - start))
+            self.stats["timeouts"] += 1
+            logger.warning(f"🔀 Reranking {len(pool)} candidates exceeded {self.budget * 1000:.0f} ms, "
+                           f"using dense order")
+            return candidates[:top_k]
+        elapsed = time.perf_counter() - start
+        self._record(len(pool), elapsed)
+        self.stats["reranked"] += 1
+        self.stats["seconds"] += elapsed
+        order = np.argsort(-relevance, kind="stable")[:top_k]
+        logger.info(f"🔀 Reranked {len(pool)} candidates in {elapsed * 1000:.1f} ms")
+        return [pool[i] for i in order]
+
+    def _record(self, pairs, seconds):
+        self.stats["pairs"] += pairs
+        cost = seconds / pairs
+        self.pair_cost = cost if self.pair_cost is None else \
+            (1 - cost_smoothing) * self.pair_cost + cost_smoothing * cost
+
+    def metrics(self):
+        reranked = self.stats["reranked"]
+        return dict(self.stats, backend=self.backend,
+                    avg_added_ms=1000 * self.stats["seconds"] / reranked if reranked else 0.0,
+                    pair_cost_ms=1000 * self.pair_cost if self.pair_cost else None)
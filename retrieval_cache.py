@@ -0,0 +1,82 @@
+# retrieval_cache.py
+#
+# Small thread-safe LRU cache with optional TTL, used by rag_utils to skip the
+# encoder and FAISS search for repeated patient questions.
+
+import re
+import time
+import threading
+from collections import OrderedDict
+
+
+def normalize_query(text):
+    """
+    Cache key for a query: case-folded, whitespace collapsed, surrounding punctuation removed,
+    so "Headache and fever?" and "headache  and fever" share an entry.
+    """
+    text = re.sub(r"\s+", " ", text.casefold()).strip()
+    return text.strip(" .,!?;:'\"")
+
+
+class LRUCache:
+    """
+    Bounded mapping with least-recently-used eviction and an optional time-to-live.
+    Keeps hit/miss/eviction/expiration counters for monitoring.
+    """
+
+    def __init__(self, max_size, ttl=None, name="cache"):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.name = name
+        self._data = OrderedDict()  # key -> (value, stored_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, stored_at = entry
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
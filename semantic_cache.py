@@ -0,0 +1,259 @@
+# semantic_cache.py
+#
+# Opt-in cache of LLM answers for text-only consultations. A new patient query is
+# embedded with the retriever's MiniLM model and compared (cosine similarity) to
+# previously answered queries in a small FAISS index; above the threshold the
+# stored answer is returned without calling Groq. Entries are evicted by TTL and
+# least-recent use, and the cache is persisted to disk so it survives restarts:
+# each new entry or eviction is appended to a journal, and every
+# SEMANTIC_CACHE_COMPACT_EVERY journal records a background thread writes a
+# snapshot (index + entries) and starts a new journal, so storing an answer never
+# rewrites the whole cache. Queries that differ in negation ("I do / do not have
+# chest pain") never share an answer, however similar their embeddings.
+
+import os
+import json
+import time
+import base64
+import logging
+import threading
+import faiss
+import numpy as np
+import config
+import index_factory
+from retrieval_cache import normalize_query
+from emergency_triage import NEGATIONS, normalize_text
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "semantic_cache.faiss"
+ENTRIES_NAME = "semantic_cache.json"
+JOURNAL_NAME = "semantic_cache.journal.jsonl"
+
+
+def negation_count(query):
+    """
+    Negation cues in a query ("not", "no", "never", "don't", "can't", ...).
+    """
+    words = normalize_text(query).replace(",", " ").replace(".", " ").split()
+    return sum(1 for word in words if word in NEGATIONS or word.endswith("n't") or word == "cannot")
+
+
+def same_polarity(query, cached_query):
+    return negation_count(query) == negation_count(cached_query)
+
+
+class SemanticCache:
+    """
+    Maps patient queries to earlier LLM answers by embedding similarity.
+    """
+
+    def __init__(self, retriever, folder=None, threshold=None, max_entries=None, ttl=None, compact_every=None):
+        self.retriever = retriever
+        self.folder = folder or config.SEMANTIC_CACHE_DIR
+        self.threshold = config.SEMANTIC_CACHE_THRESHOLD if threshold is None else threshold
+        self.max_entries = max_entries or config.SEMANTIC_CACHE_SIZE
+        self.ttl = config.SEMANTIC_CACHE_TTL if ttl is None else ttl
+        self.compact_every = config.SEMANTIC_CACHE_COMPACT_EVERY if compact_every is None else compact_every
+
+        self._lock = threading.Lock()
+        self._index = None     # IDMap2(FlatIP), created on first store or load
+        self._entries = {}     # id -> {"query", "response", "created", "last_used", "latency"}
+        self._next_id = 0
+        self._journal = None   # append handle, opened on first write
+        self._journal_records = 0
+        self._compacting = False
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "latency_saved": 0.0, "lookup_time": 0.0,
+                      "negation_skips": 0}
+        self._load()
+
+    def _embed(self, query):
+        return index_factory.normalize(self.retriever.encode_cached([normalize_query(query)]))
+
+    def lookup(self, query):
+        """
+        Return a cached response for a semantically equivalent query, or None.
+        """
+        start = time.perf_counter()
+        embedding = self._embed(query)
+        with self._lock:
+            response = None
+            if self._index is not None and self._index.ntotal:
+                scores, ids = self._index.search(embedding, 1)
+                entry = self._entries.get(int(ids[0][0]))
+                if entry and scores[0][0] >= self.threshold and not self._expired(entry):
+                    if same_polarity(query, entry["query"]):
+                        entry["last_used"] = time.time()
+                        response = entry["response"]
+                        self.stats["latency_saved"] += entry["latency"]
+                    else:
+                        self.stats["negation_skips"] += 1
+            self.stats["hits" if response is not None else "misses"] += 1
+            self.stats["lookup_time"] += time.perf_counter() - start
+        if response is not None:
+            logger.info(f"💾 Semantic cache hit ({self.hit_rate():.0%} hit rate, "
+                        f"{self.stats['latency_saved']:.1f}s LLM time saved so far)")
+        return response
+
+    def store(self, query, response, latency):
+        """
+        Remember an answer; `latency` is how long the LLM call took (reported as time saved on hits).
+        """
+        embedding = self._embed(query)
+        with self._lock:
+            if self._index is None:
+                self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(embedding.shape[1]))
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(embedding, np.array([entry_id], dtype=np.int64))
+            now = time.time()
+            entry = {"query": query, "response": response, "created": now, "last_used": now, "latency": latency}
+            self._entries[entry_id] = entry
+            self._append({"id": entry_id, "entry": entry,
+                          "embedding": base64.b64encode(embedding.tobytes()).decode("ascii")})
+            self._evict()
+            compact = self._journal_records >= self.compact_every and not self._compacting
+            self._compacting = self._compacting or compact
+        if compact:
+            threading.Thread(target=self.compact, name="semantic-cache-compaction", daemon=True).start()
+
+    def _expired(self, entry):
+        return self.ttl and time.time() - entry["created"] > self.ttl
+
+    def _evict(self):
+        # Expired entries first, then least recently used beyond max_entries
+        doomed = [i for i, e in self._entries.items() if self._expired(e)]
+        overflow = len(self._entries) - len(doomed) - self.max_entries
+        if overflow > 0:
+            expired = set(doomed)
+            live = sorted((e["last_used"], i) for i, e in self._entries.items() if i not in expired)
+            doomed += [i for _, i in live[:overflow]]
+        if doomed:
+            self._index.remove_ids(np.array(doomed, dtype=np.int64))
+            for i in doomed:
+                del self._entries[i]
+            self._append({"evicted": doomed})
+            self.stats["evictions"] += len(doomed)
+
+    def _append(self, record):
+        # One journal line per change, under self._lock; O(1) whatever the cache size
+        if self._journal is None:
+            os.makedirs(self.folder, exist_ok=True)
+            self._journal = open(os.path.join(self.folder, JOURNAL_NAME), "a", encoding="utf-8")
+        self._journal.write(json.dumps(record) + "\n")
+        self._journal.flush()
+        self._journal_records += 1
+
+    def compact(self):
+        """
+        Write a snapshot of the cache and start a new journal. The state is captured
+        under the lock; the files are written outside it, so lookups and stores continue.
+        """
+        journal_file = os.path.join(self.folder, JOURNAL_NAME)
+        try:
+            with self._lock:
+                if self._index is None:
+                    return
+                index_bytes = faiss.serialize_index(self._index)
+                snapshot = {"next_id": self._next_id, "entries": {i: dict(e) for i, e in self._entries.items()}}
+                # Changes from now on go to a new journal; the old one is kept until the snapshot is in place
+                if self._journal is not None:
+                    self._journal.close()
+                    self._journal = None
+                if os.path.exists(journal_file):
+                    os.replace(journal_file, journal_file + ".old")
+                self._journal_records = 0
+
+            index_file = os.path.join(self.folder, INDEX_NAME)
+            entries_file = os.path.join(self.folder, ENTRIES_NAME)
+            with open(index_file + ".tmp", "wb") as f:
+                f.write(index_bytes.tobytes())
+            with open(entries_file + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(snapshot, f)
+            os.replace(index_file + ".tmp", index_file)
+            os.replace(entries_file + ".tmp", entries_file)
+            if os.path.exists(journal_file + ".old"):
+                os.remove(journal_file + ".old")
+        except Exception as e:
+            logger.error(f"Could not write semantic cache snapshot, keeping the journal: {e}")
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def _load(self):
+        index_file = os.path.join(self.folder, INDEX_NAME)
+        entries_file = os.path.join(self.folder, ENTRIES_NAME)
+        journal_file = os.path.join(self.folder, JOURNAL_NAME)
+        try:
+            if os.path.exists(index_file) and os.path.exists(entries_file):
+                self._index = faiss.read_index(index_file)
+                with open(entries_file, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self._entries = {int(i): e for i, e in data["entries"].items()}
+                self._next_id = data["next_id"]
+            # A journal left by an interrupted compaction, then the current one
+            replayed = sum(self._replay(path) for path in (journal_file + ".old", journal_file))
+            if self._entries or replayed:
+                logger.info(f"💾 Loaded {len(self._entries)} semantic cache entries")
+        except Exception as e:
+            logger.error(f"Could not load semantic cache, starting empty: {e}")
+            self._index, self._entries, self._next_id = None, {}, 0
+        if os.path.exists(journal_file + ".old"):
+            # A compaction was interrupted: fold both journals into a snapshot before writing more
+            self.compact()
+
+    def _replay(self, path):
+        if not os.path.exists(path):
+            return 0
+        records = 0
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # a line cut short by a crash ends the journal
+                records += 1
+                if "evicted" in record:
+                    gone = [i for i in record["evicted"] if i in self._entries]
+                    if gone:
+                        self._index.remove_ids(np.array(gone, dtype=np.int64))
+                        for i in gone:
+                            del self._entries[i]
+                elif record["id"] not in self._entries:
+                    embedding = np.frombuffer(base64.b64decode(record["embedding"]), dtype=np.float32)
+                    if self._index is None:
+                        self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(len(embedding)))
+                    self._index.add_with_ids(embedding.reshape(1, -1), np.array([record["id"]], dtype=np.int64))
+                    self._entries[record["id"]] = record["entry"]
+                    self._next_id = max(self._next_id, record["id"] + 1)
+        self._journal_records += records
+        return records
+
+    def hit_rate(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+    def metrics(self):
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return dict(self.stats, entries=len(self._entries), hit_rate=self.hit_rate(),
+                        avg_lookup_ms=1000 * self.stats["lookup_time"] / lookups if lookups else 0.0)
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_semantic_cache():
+    """
+    Process-wide cache, or None when MEDIBOT_SEMANTIC_CACHE is not enabled.
+    """
+    global _default_cache
+    if not config.SEMANTIC_CACHE_ENABLED:
+        return None
+    if _default_cache is None:
+        with _default_lock:
+            if _default_cache is None:
+                from rag_utils import get_retriever
+                _default_cache = SemanticCache(get_retriever())
+    return _default_cache
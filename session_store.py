@@ -0,0 +1,157 @@
+# session_store.py
+#
+# Per-browser-session consultation state for gradio_app.py. Each Gradio session
+# (request.session_hash) gets its own bounded chat history and conversation log,
+# so concurrent patients never see each other's turns and clearing one
+# consultation leaves the others alone. Sessions idle for longer than
+# SESSION_IDLE_TIMEOUT are evicted, and the store never holds more than
+# MAX_SESSIONS sessions (least recently active go first). History files written
+# for the download button are removed when their session closes or is evicted.
+
+import os
+import time
+import atexit
+import logging
+import threading
+from collections import deque, OrderedDict
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class ConsultationSession:
+    """
+    History of one patient's consultation, kept as ring buffers.
+    """
+
+    def __init__(self, session_id, max_turns=None, max_log_entries=None):
+        self.session_id = session_id
+        self.history = deque(maxlen=max_turns or config.MAX_HISTORY_TURNS)       # (query, reply) for the LLM
+        self.log = deque(maxlen=max_log_entries or config.MAX_LOG_ENTRIES)       # text for the download
+        self.downloads = []                                                      # history files written
+        self.created = time.monotonic()
+        self.last_active = self.created
+        self.lock = threading.Lock()
+
+    def add_turn(self, query, reply, label="User"):
+        with self.lock:
+            self.history.append((query, reply))
+            self.log.append(f"{label}: {query}\nDoctor: {reply}\n")
+            self.last_active = time.monotonic()
+
+    def recent_turns(self):
+        # A list copy, safe to slice and to use while other requests of the session add turns
+        with self.lock:
+            return list(self.history)
+
+    def transcript(self):
+        with self.lock:
+            return "\n".join(self.log)
+
+    def clear(self):
+        with self.lock:
+            self.history.clear()
+            self.log.clear()
+
+    def add_download(self, path):
+        with self.lock:
+            self.downloads.append(path)
+
+    def remove_downloads(self):
+        with self.lock:
+            paths, self.downloads = self.downloads, []
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def size_bytes(self):
+        with self.lock:
+            return (sum(len(q) + len(r) for q, r in self.history)
+                    + sum(len(entry) for entry in self.log))
+
+
+class SessionStore:
+    """
+    Thread-safe map of session id -> ConsultationSession with idle and size-based eviction.
+    """
+
+    def __init__(self, idle_timeout=None, max_sessions=None, max_turns=None, max_log_entries=None):
+        self.idle_timeout = config.SESSION_IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+        self.max_sessions = max_sessions or config.MAX_SESSIONS
+        self.max_turns = max_turns
+        self.max_log_entries = max_log_entries
+        self._sessions = OrderedDict()  # least recently used first
+        self._lock = threading.Lock()
+        self.stats = {"created": 0, "expired": 0, "evicted": 0, "closed": 0}
+
+    def get(self, session_id):
+        """
+        The session for this id, created on first use. Also evicts idle sessions.
+        """
+        with self._lock:
+            self._evict_idle()
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = ConsultationSession(session_id, self.max_turns, self.max_log_entries)
+                self._sessions[session_id] = session
+                self.stats["created"] += 1
+                while len(self._sessions) > self.max_sessions:
+                    _, oldest = self._sessions.popitem(last=False)
+                    oldest.remove_downloads()
+                    self.stats["evicted"] += 1
+                    logger.info(f"Session limit reached, evicted {oldest.session_id}")
+            self._sessions.move_to_end(session_id)
+            session.last_active = time.monotonic()
+            return session
+
+    def close(self, session_id):
+        # Called when the browser tab disconnects
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is not None:
+                session.remove_downloads()
+                self.stats["closed"] += 1
+
+    def close_all(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.remove_downloads()
+
+    def _evict_idle(self):
+        if not self.idle_timeout:
+            return
+        cutoff = time.monotonic() - self.idle_timeout
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.last_active > cutoff:
+                break
+            del self._sessions[session_id]
+            session.remove_downloads()
+            self.stats["expired"] += 1
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def metrics(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            return dict(self.stats, active=len(sessions),
+                        history_bytes=sum(s.size_bytes() for s in sessions))
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def get_session_store():
+    global _default_store
+    if _default_store is None:
+        with _default_lock:
+            if _default_store is None:
+                _default_store = SessionStore()
+                atexit.register(_default_store.close_all)
+    return _default_store
@@ -0,0 +1,337 @@
+# telemetry.py
+#
+# Metrics, per-request traces and an on-demand profiler for the consultation pipeline:
+#   - counters and histograms kept in process and rendered in the Prometheus text
+#     format at /metrics (metrics_router() is mounted next to the Gradio app)
+#   - one Trace per request: named spans with start/end offsets and attributes.
+#     span() attaches to the current request's trace through a context variable,
+#     so stages deep in the call tree (retrieval encode/search, TTS) are recorded
+#     without passing the trace around; asyncio.to_thread and new tasks inherit it,
+#     and the retrieval micro-batcher binds every trace in its batch. The latest
+#     TRACE_BUFFER finished traces are at /traces (and logged as JSON at DEBUG level)
+#   - a sampling profiler that snapshots all thread stacks every PROFILE_INTERVAL_MS
+#     and aggregates them as collapsed stacks (flamegraph.pl, speedscope), started
+#     and stopped at runtime
+# Every span also feeds the medibot_stage_seconds histogram, traced or not.
+
+import os
+import sys
+import json
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from bisect import bisect_left
+from collections import Counter as Tally, deque
+from contextlib import contextmanager
+import config
+
+logger = logging.getLogger(__name__)
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (64, 128, 256, 512, 768, 1024, 1536, 2048, 4096)
+BYTE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    """
+    Monotonic count per label combination.
+    """
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """
+    Cumulative bucket counts, sum and count per label combination.
+    """
+
+    def __init__(self, name, description, buckets, labels=()):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self.labels = tuple(labels)
+        self._values = {}  # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def snapshot(self, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            entry = self._values.get(key)
+            return {"count": entry[2], "sum": entry[1]} if entry else {"count": 0, "sum": 0.0}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += bucket
+                    lines.append(f"{self.name}_bucket{_label_text(self.labels, key, [('le', bound)])} {cumulative}")
+                lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {total}")
+                lines.append(f"{self.name}_count{_label_text(self.labels, key)} {count}")
+        return lines
+
+
+REQUESTS = Counter("medibot_requests_total", "Consultation requests handled.", ("kind",))
+EVENTS = Counter("medibot_events_total", "Notable pipeline events, e.g. emergency warnings and cache hits.",
+                 ("event",))
+REQUEST_SECONDS = Histogram("medibot_request_seconds", "End-to-end request latency.", SECONDS_BUCKETS, ("kind",))
+STAGE_SECONDS = Histogram("medibot_stage_seconds", "Latency of each pipeline stage.", SECONDS_BUCKETS, ("stage",))
+PROMPT_TOKENS = Histogram("medibot_prompt_tokens", "Estimated tokens per LLM prompt, history included.",
+                          TOKEN_BUCKETS, ("kind",))
+PAYLOAD_BYTES = Histogram("medibot_payload_bytes", "Size of uploaded images, transcribed audio and synthesized "
+                          "speech.", BYTE_BUCKETS, ("payload",))
+
+METRICS = [REQUESTS, EVENTS, REQUEST_SECONDS, STAGE_SECONDS, PROMPT_TOKENS, PAYLOAD_BYTES]
+
+
+def render_metrics():
+    return "\n".join(line for metric in METRICS for line in metric.render()) + "\n"
+
+
+class Trace:
+    """
+    Spans and attributes of one request.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.end = None
+        self.spans = []       # {"name", "start_ms", "end_ms", "thread", **attributes}
+        self.attributes = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, name, start, end, attributes=None):
+        span = {"name": name, "start_ms": round((start - self.start) * 1000, 2),
+                "end_ms": round((end - self.start) * 1000, 2), "thread": threading.current_thread().name}
+        span.update(attributes or {})
+        with self._lock:
+            self.spans.append(span)
+
+    def annotate(self, **attributes):
+        with self._lock:
+            self.attributes.update(attributes)
+
+    def to_dict(self):
+        with self._lock:
+            return {"trace_id": self.trace_id, "name": self.name, "started_at": self.started_at,
+                    "duration_ms": round(((self.end or time.perf_counter()) - self.start) * 1000, 2),
+                    "attributes": dict(self.attributes), "spans": sorted(self.spans, key=lambda s: s["start_ms"])}
+
+
+_current = contextvars.ContextVar("medibot_traces", default=())
+_recent = deque(maxlen=config.TRACE_BUFFER)
+_recent_lock = threading.Lock()
+
+
+def start_trace(name):
+    """
+    Begin a request's trace and make it current for this task and what it starts.
+    """
+    trace = Trace(name)
+    _current.set((trace,))
+    REQUESTS.inc(kind=name)
+    return trace
+
+
+def finish_trace(trace):
+    trace.end = time.perf_counter()
+    REQUEST_SECONDS.observe(trace.end - trace.start, kind=trace.name)
+    record = trace.to_dict()
+    with _recent_lock:
+        _recent.append(record)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"🧵 Trace {json.dumps(record, ensure_ascii=False)}")
+    return record
+
+
+def current_trace():
+    traces = _current.get()
+    return traces[0] if len(traces) == 1 else None
+
+
+def recent_traces():
+    with _recent_lock:
+        return list(_recent)
+
+
+@contextmanager
+def bind(traces):
+    """
+    Make spans recorded in this block belong to all of `traces`, e.g. the requests of one batch.
+    """
+    token = _current.set(tuple(trace for trace in traces if trace is not None))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def record_span(name, start, end, attributes=None, traces=None):
+    STAGE_SECONDS.observe(end - start, stage=name)
+    for trace in _current.get() if traces is None else traces:
+        trace.add_span(name, start, end, attributes)
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Time a block as stage `name`; attributes may be added to the yielded dict inside it.
+    """
+    start = time.perf_counter()
+    try:
+        yield attributes
+    finally:
+        record_span(name, start, time.perf_counter(), attributes)
+
+
+def annotate(**attributes):
+    for trace in _current.get():
+        trace.annotate(**attributes)
+
+
+class SamplingProfiler:
+    """
+    Samples every thread's stack at a fixed interval and counts identical stacks.
+    """
+
+    def __init__(self, interval_ms=None):
+        self.interval = (interval_ms or config.PROFILE_INTERVAL_MS) / 1000
+        self.samples = Tally()
+        self.started = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return False
+            self.samples = Tally()
+            self.started = time.time()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+        logger.info(f"🔬 Profiler started, sampling every {self.interval * 1000:.0f} ms")
+        return True
+
+    def stop(self):
+        """
+        Stop sampling and return the collapsed stacks collected since start().
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+            logger.info(f"🔬 Profiler stopped after {time.time() - self.started:.1f}s, "
+                        f"{sum(self.samples.values())} samples")
+        return self.collapsed()
+
+    def collapsed(self):
+        # "thread;outer;...;inner count" per line, hottest first
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.samples[";".join(reversed(stack))] += 1
+
+
+_profiler = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler():
+    global _profiler
+    if _profiler is None:
+        with _profiler_lock:
+            if _profiler is None:
+                _profiler = SamplingProfiler()
+    return _profiler
+
+
+def metrics_router():
+    """
+    FastAPI routes: /metrics (Prometheus), /traces (recent request traces) and, when
+    PROFILER_ENDPOINTS is on, /profiler/start and /profiler/stop (returns collapsed stacks).
+    """
+    from fastapi import APIRouter
+    from fastapi.responses import PlainTextResponse
+    router = APIRouter()
+
+    @router.get("/metrics", response_class=PlainTextResponse)
+    def metrics():
+        return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+    @router.get("/traces")
+    def traces(limit: int = 20):
+        return recent_traces()[-limit:]
+
+    if config.PROFILER_ENDPOINTS:
+        @router.post("/profiler/start")
+        def start_profiler():
+            return {"started": get_profiler().start(), "interval_ms": get_profiler().interval * 1000}
+
+        @router.post("/profiler/stop", response_class=PlainTextResponse)
+        def stop_profiler():
+            return PlainTextResponse(get_profiler().stop())
+
+    return router
@@ -0,0 +1,11 @@
+# tokens.py
+#
+# Token estimate shared by the indexer (chunk sizes) and prompt assembly (the
+# prompt budget), kept apart so building the index doesn't depend on either.
+
+
+def count_tokens(text):
+    """
+    Token estimate used for budgeting: about 4 characters per token for English text.
+    """
+    return (len(text) + 3) // 4
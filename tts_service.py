@@ -0,0 +1,268 @@
+# tts_service.py
+#
+# Text-to-speech for the doctor's replies behind one interface:
+#   - pluggable engines: "gtts" (Google TTS, needs network), "pyttsx3" (local
+#     offline engine, espeak/SAPI/NSSpeech) and "tone" (a deterministic beep
+#     whose length follows the text, for tests and benchmarks without any engine)
+#   - a content-addressed clip cache on disk: text is split into sentences and
+#     each one is stored under the hash of engine + cleaned sentence, so repeated
+#     phrases such as the emergency warning are synthesized once. Concurrent
+#     requests for the same clip wait for one synthesis, and the least recently
+#     used clips are removed beyond TTS_CACHE_MAX_MB
+#   - files for callers that need a path get a unique name per request and are
+#     removed after TTS_OUTPUT_TTL seconds
+# Nothing is played on the server; the audio is returned to the caller.
+
+import io
+import os
+import re
+import time
+import wave
+import atexit
+import hashlib
+import logging
+import tempfile
+import threading
+from concurrent.futures import Future
+import numpy as np
+import config
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_PREFIX = "medibot_tts_"
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?:])\s+|\n+')
+
+
+def clean_for_speech(input_text):
+    # Clean markdown-style asterisks (*, **) used for bullets and bold
+    return re.sub(r'\*+', '', input_text).strip()
+
+
+def gtts_engine(text):
+    from gtts import gTTS
+    buffer = io.BytesIO()
+    gTTS(text=text, lang='en').write_to_fp(buffer)
+    return buffer.getvalue()
+
+
+_pyttsx3_lock = threading.Lock()
+
+
+def pyttsx3_engine(text):
+    # pyttsx3 can only save to a file and is not thread-safe
+    import pyttsx3
+    with _pyttsx3_lock:
+        engine = pyttsx3.init()
+        fd, path = tempfile.mkstemp(prefix=OUTPUT_PREFIX, suffix=".wav")
+        os.close(fd)
+        try:
+            engine.save_to_file(text, path)
+            engine.runAndWait()
+            with open(path, "rb") as f:
+                return f.read()
+        finally:
+            os.remove(path)
+
+
+def tone_engine(text, rate=16000):
+    # ~60 ms per character, pitch derived from the text so different sentences sound different
+    seconds = min(0.06 * len(text), 10.0)
+    pitch = 300 + int(hashlib.sha256(text.encode()).hexdigest()[:4], 16) % 400
+    t = np.arange(int(seconds * rate)) / rate
+    pcm = (0.2 * np.sin(2 * np.pi * pitch * t) * 32767).astype(np.int16)
+    out = io.BytesIO()
+    with wave.open(out, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(pcm.tobytes())
+    return out.getvalue()
+
+
+def join_mp3(clips):
+    # MP3 is a sequence of self-contained frames, so clips play back to back when concatenated
+    return b"".join(clips)
+
+
+def join_wav(clips):
+    with wave.open(io.BytesIO(clips[0])) as first:
+        params = first.getparams()
+    out = io.BytesIO()
+    with wave.open(out, "wb") as joined:
+        joined.setparams(params)
+        for clip in clips:
+            with wave.open(io.BytesIO(clip)) as wav:
+                joined.writeframes(wav.readframes(wav.getnframes()))
+    return out.getvalue()
+
+
+# name -> (synthesize(text) -> bytes, file extension, join(clips) -> bytes)
+ENGINES = {
+    "gtts": (gtts_engine, "mp3", join_mp3),
+    "pyttsx3": (pyttsx3_engine, "wav", join_wav),
+    "tone": (tone_engine, "wav", join_wav),
+}
+
+
+class TTSService:
+    """
+    Cached speech synthesis with a pluggable engine.
+    """
+
+    def __init__(self, engine=None, cache_dir=None, max_cache_mb=None, output_ttl=None):
+        self.engine_name = engine or config.TTS_ENGINE
+        if self.engine_name not in ENGINES:
+            raise ValueError(f"Unknown TTS engine {self.engine_name!r}, expected one of {tuple(ENGINES)}")
+        self.engine, self.extension, self.join = ENGINES[self.engine_name]
+        self.cache_dir = cache_dir or config.TTS_CACHE_DIR
+        self.max_cache_bytes = (config.TTS_CACHE_MAX_MB if max_cache_mb is None else max_cache_mb) * 1024 * 1024
+        self.output_ttl = config.TTS_OUTPUT_TTL if output_ttl is None else output_ttl
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._inflight = {}  # key -> Future of the clip being synthesized
+        self._outputs = {}   # path -> created (time.time())
+        self._cache_bytes = sum(os.path.getsize(path) for path in self._clip_paths())
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "synth_seconds": 0.0}
+
+    def _clip_paths(self):
+        for name in os.listdir(self.cache_dir):
+            if name.endswith("." + self.extension):
+                yield os.path.join(self.cache_dir, name)
+
+    def key(self, text):
+        normalized = " ".join(clean_for_speech(text).split())
+        return hashlib.sha256(f"{self.engine_name}\n{normalized}".encode()).hexdigest()
+
+    def _clip_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.{self.extension}")
+
+    def synthesize(self, text):
+        """
+        Audio bytes for text, one cached clip per sentence joined in order.
+        """
+        sentences = [s for s in (clean_for_speech(p) for p in SENTENCE_BOUNDARY.split(text)) if s]
+        if not sentences:
+            return b""
+        clips = [self.clip(sentence) for sentence in sentences]
+        audio = clips[0] if len(clips) == 1 else self.join(clips)
+        telemetry.PAYLOAD_BYTES.observe(len(audio), payload="speech")
+        return audio
+
+    def clip(self, text):
+        """
+        Audio bytes for one sentence, from the cache when it has been spoken before.
+        """
+        text = " ".join(clean_for_speech(text).split())
+        key = self.key(text)
+        path = self._clip_path(key)
+        with self._lock:
+            owner = key not in self._inflight
+            if owner:
+                try:
+                    with open(path, "rb") as f:
+                        audio = f.read()
+                    os.utime(path)  # recently used, for eviction
+                    self.stats["hits"] += 1
+                    return audio
+                except FileNotFoundError:
+                    self._inflight[key] = Future()
+                    self.stats["misses"] += 1
+            else:
+                self.stats["hits"] += 1
+            future = self._inflight[key]
+        if not owner:
+            # Someone else is synthesizing this clip right now
+            return future.result()
+
+        try:
+            start = time.perf_counter()
+            audio = self.engine(text)
+            elapsed = time.perf_counter() - start
+            self._store(path, audio)
+            future.set_result(audio)
+            with self._lock:
+                self.stats["synth_seconds"] += elapsed
+            logger.info(f"🔊 Synthesized {len(text)} chars with {self.engine_name} in {elapsed * 1000:.0f} ms")
+            return audio
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _store(self, path, audio):
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(audio)
+        os.replace(tmp, path)
+        with self._lock:
+            self._cache_bytes += len(audio)
+            over = self._cache_bytes > self.max_cache_bytes
+        if over:
+            self._evict()
+
+    def _evict(self):
+        # Drop least recently used clips until the cache is back to 90% of its limit
+        clips = sorted(self._clip_paths(), key=lambda p: os.stat(p).st_mtime)
+        total = sum(os.path.getsize(p) for p in clips)
+        for clip in clips:
+            if total <= 0.9 * self.max_cache_bytes:
+                break
+            size = os.path.getsize(clip)
+            os.remove(clip)
+            total -= size
+            with self._lock:
+                self.stats["evictions"] += 1
+        with self._lock:
+            self._cache_bytes = total
+
+    def synthesize_to_file(self, text, folder=None):
+        """
+        Write the audio to a new file unique to this call and return its path.
+        Files are removed after output_ttl seconds (checked on later calls) or at exit.
+        """
+        self.cleanup_outputs()
+        audio = self.synthesize(text)
+        fd, path = tempfile.mkstemp(prefix=OUTPUT_PREFIX, suffix="." + self.extension, dir=folder)
+        with os.fdopen(fd, "wb") as f:
+            f.write(audio)
+        with self._lock:
+            self._outputs[path] = time.time()
+        return path
+
+    def cleanup_outputs(self, max_age=None):
+        max_age = self.output_ttl if max_age is None else max_age
+        now = time.time()
+        with self._lock:
+            expired = [path for path, created in self._outputs.items() if now - created >= max_age]
+            for path in expired:
+                del self._outputs[path]
+        for path in expired:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def metrics(self):
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return dict(self.stats, engine=self.engine_name, cache_mb=self._cache_bytes / (1024 * 1024),
+                        hit_rate=self.stats["hits"] / lookups if lookups else 0.0, outputs=len(self._outputs))
+
+
+_default_service = None
+_default_lock = threading.Lock()
+
+
+def get_tts_service():
+    global _default_service
+    if _default_service is None:
+        with _default_lock:
+            if _default_service is None:
+                _default_service = TTSService()
+                atexit.register(_default_service.cleanup_outputs, 0)
+    return _default_service
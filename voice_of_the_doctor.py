@@ -1,26 +1,25 @@
 import os
+import logging
 import subprocess
 import platform
-from gtts import gTTS
-import re
+from tts_service import clean_for_speech, gtts_engine, get_tts_service
 
-def text_to_speech_with_gtts(input_text, output_filepath):
+logger = logging.getLogger(__name__)
+
+def synthesize_with_gtts(input_text):
     """
-    Cleans input text of markdown formatting and asterisks,
-    prints it, then uses gTTS to convert to speech.
+    Convert text to MP3 bytes with gTTS, without caching, writing or playing anything.
     """
-    # Clean markdown-style asterisks (*, **) used for bullets and bold
-    clean_text = re.sub(r'\*+', '', input_text)
-
-    # Print for debugging
-    print("\n🧼 Cleaned text sent to TTS:\n")
-    print(clean_text)
-    print("\n" + "-" * 60 + "\n")
+    return gtts_engine(clean_for_speech(input_text))
 
-    # Generate TTS
-    tts = gTTS(text=clean_text.strip(), lang='en')
-    tts.save(output_filepath)
+def synthesize_speech(input_text):
+    """
+    Convert text to audio bytes with the configured TTS engine, reusing cached sentence clips.
+    """
+    return get_tts_service().synthesize(input_text)
 
+def play_audio(output_filepath):
+    # Local playback for command-line use; the server returns audio to the browser instead
     os_name = platform.system()
     try:
         if os_name == "Darwin":
@@ -30,4 +29,21 @@ def text_to_speech_with_gtts(input_text, output_filepath):
         elif os_name == "Linux":
             subprocess.run(['mpg123', output_filepath])
     except Exception as e:
-        print(f"An error occurred while trying to play the audio: {e}")
+        logger.error(f"An error occurred while trying to play the audio: {e}")
+
+def text_to_speech_with_gtts(input_text, output_filepath=None, play=False):
+    """
+    Cleans input text of markdown formatting and asterisks and converts it to speech.
+    Without output_filepath the audio goes to a new file unique to this call, removed
+    again after TTS_OUTPUT_TTL seconds. Returns the file path; play=True also plays it locally.
+    """
+    service = get_tts_service()
+    if output_filepath is None:
+        output_filepath = service.synthesize_to_file(input_text)
+    else:
+        with open(output_filepath, "wb") as f:
+            f.write(service.synthesize(input_text))
+
+    if play and os.path.getsize(output_filepath):
+        play_audio(output_filepath)
+    return output_filepath
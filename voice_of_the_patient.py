@@ -1,23 +1,29 @@
 import os
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
 import speech_recognition as sr
-from pydub import AudioSegment
-from io import BytesIO
-from groq import Groq
+import audio_frontend
+import telemetry
+import config
+from groq_client import get_client_manager
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
-
 # Setup logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logging.basicConfig(level=config.LOG_LEVEL, format='%(asctime)s - %(levelname)s - %(message)s')
 
 def record_audio(file_path, timeout=20, phrase_time_limit=None):
     """
-    Record audio from microphone and save it as an MP3 file.
+    Record audio from microphone and save it as a 16 kHz mono WAV file.
+    Any other extension in file_path is replaced with .wav; returns the path written, or None on error.
     """
+    root, extension = os.path.splitext(file_path)
+    if extension.lower() != ".wav":
+        logging.warning(f"Recordings are saved as WAV, writing {root}.wav instead of {file_path}")
+        file_path = root + ".wav"
     recognizer = sr.Recognizer()
 
     try:
@@ -30,36 +36,85 @@ def record_audio(file_path, timeout=20, phrase_time_limit=None):
             audio_data = recognizer.listen(source, timeout=timeout, phrase_time_limit=phrase_time_limit)
             logging.info("Recording complete.")
 
-            # Convert recorded audio to MP3
-            wav_data = audio_data.get_wav_data()
-            audio_segment = AudioSegment.from_wav(BytesIO(wav_data))
-            audio_segment.export(file_path, format="mp3", bitrate="128k")
+            # Whisper works at 16 kHz mono, so there is nothing to gain from keeping more
+            with open(file_path, "wb") as f:
+                f.write(audio_data.get_wav_data(convert_rate=audio_frontend.SAMPLE_RATE, convert_width=2))
 
             logging.info(f"Audio saved to {file_path}")
+            return file_path
 
     except Exception as e:
         logging.error(f"An error occurred: {e}")
 
+def _create_transcription(client, **kwargs):
+    return client.audio.transcriptions.create(**kwargs)
+
+def _uploads(audio_filepath):
+    """
+    (file name, bytes) per speech segment of the recording, prepared in memory.
+    Falls back to the whole file if it can't be decoded here.
+    """
+    # Read the bytes up front so a retried upload sends the whole segment again
+    with open(audio_filepath, "rb") as audio_file:
+        audio_bytes = audio_file.read()
+    try:
+        with telemetry.span("audio_preprocessing", bytes_in=len(audio_bytes)) as attributes:
+            segments = audio_frontend.prepare(audio_bytes).segments
+            attributes.update(segments=len(segments), bytes_out=sum(len(data) for _, data in segments))
+        telemetry.PAYLOAD_BYTES.observe(attributes["bytes_out"], payload="audio")
+        return segments
+    except Exception as e:
+        logging.warning(f"Audio preprocessing failed ({e}), uploading the original file")
+        return [(os.path.basename(audio_filepath), audio_bytes)]
+
+def _remove(audio_filepath):
+    if os.path.exists(audio_filepath):
+        os.remove(audio_filepath)
+        logging.info(f"Deleted temporary file: {audio_filepath}")
+
 def transcribe_with_groq(audio_filepath, stt_model="whisper-large-v3"):
     """
-    Transcribe audio file using Groq's Whisper model.
+    Transcribe audio file using Groq's Whisper model; segments of long recordings are transcribed concurrently.
     """
-    client = Groq(api_key=GROQ_API_KEY)
+    try:
+        uploads = _uploads(audio_filepath)
+        if not uploads:
+            logging.info("No speech detected, skipping transcription")
+            return ""
+        manager = get_client_manager()
+
+        def transcribe(upload):
+            return manager.call(_create_transcription, model=stt_model, file=upload, language="en").text
 
+        with ThreadPoolExecutor(max_workers=len(uploads)) as pool:
+            return " ".join(text.strip() for text in pool.map(transcribe, uploads)).strip()
+
+    except Exception as e:
+        logging.error(f"Error during transcription: {e}")
+        return ""
+
+    finally:
+        _remove(audio_filepath)
+
+async def transcribe_with_groq_async(audio_filepath, stt_model="whisper-large-v3"):
+    """
+    Async version of transcribe_with_groq.
+    """
     try:
-        with open(audio_filepath, "rb") as audio_file:
-            transcription = client.audio.transcriptions.create(
-                model=stt_model,
-                file=audio_file,
-                language="en"
-            )
-        return transcription.text
+        uploads = await asyncio.to_thread(_uploads, audio_filepath)
+        if not uploads:
+            logging.info("No speech detected, skipping transcription")
+            return ""
+        manager = get_client_manager()
+        transcriptions = await asyncio.gather(*(
+            manager.acall(_create_transcription, model=stt_model, file=upload, language="en")
+            for upload in uploads
+        ))
+        return " ".join(transcription.text.strip() for transcription in transcriptions).strip()
 
     except Exception as e:
         logging.error(f"Error during transcription: {e}")
         return ""
 
     finally:
-        if os.path.exists(audio_filepath):
-            os.remove(audio_filepath)
-            logging.info(f"Deleted temporary file: {audio_filepath}")
+        _remove(audio_filepath)